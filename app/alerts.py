@@ -0,0 +1,248 @@
+# app/alerts.py
+# Alert rules: metric thresholds evaluated for the whole fleet in one pass
+
+import logging
+import math
+import os
+import time
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .db import DB, get_alert_rules
+from .history import METRICS
+
+logger = logging.getLogger(__name__)
+
+ALERT_INTERVAL = int(os.getenv("ALERT_INTERVAL", 5))
+# A router's newest sample is only evaluated while it is younger than this
+# many poll intervals; a DOWN router keeps its alerts as they are
+STALE_INTERVALS = 3
+# op -> sign: the condition is sign * (value - threshold) > 0
+OPS = {">": 1.0, "<": -1.0}
+
+
+def parse_rule(data: Mapping) -> dict:
+    """Rule from an API request body. Raises ValueError."""
+    if not isinstance(data, Mapping):
+        raise ValueError("rule must be a JSON object")
+    name = data.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("name is required")
+    metric = data.get("metric")
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of: {', '.join(METRICS)}")
+    op = data.get("op", ">")
+    if op not in OPS:
+        raise ValueError("op must be '>' or '<'")
+
+    try:
+        threshold = float(data["threshold"])
+        clear = data.get("clear_threshold")
+        clear = threshold if clear is None or clear == "" else float(clear)
+        duration = int(data.get("duration") or 0)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("threshold is required; threshold, clear_threshold and duration must be numbers")
+    if not math.isfinite(threshold) or not math.isfinite(clear):
+        raise ValueError("thresholds must be finite numbers")
+    if OPS[op] * (threshold - clear) < 0:
+        raise ValueError("clear_threshold must be on the non-alerting side of threshold")
+    if duration < 0:
+        raise ValueError("duration must not be negative")
+
+    router = data.get("router") or None
+    group_name = data.get("group_name") or None
+    if not all(v is None or isinstance(v, str) for v in (router, group_name)):
+        raise ValueError("router and group_name must be strings")
+
+    return {
+        "name": name.strip(),
+        "metric": metric,
+        "op": op,
+        "threshold": threshold,
+        "clear_threshold": clear,
+        "duration": duration,
+        "router": router,
+        "group_name": group_name,
+        "enabled": 1 if data.get("enabled", True) else 0,
+    }
+
+
+def _carry(arr: np.ndarray, old: Sequence, new: Sequence, axis: int, fill) -> np.ndarray:
+    """`arr` re-indexed along `axis` from keys `old` to keys `new`; new keys get `fill`."""
+    pos = {k: i for i, k in enumerate(old)}
+    src = np.fromiter((pos.get(k, -1) for k in new), dtype=np.int64, count=len(new))
+    shape = list(arr.shape)
+    shape[axis] = len(new)
+    out = np.full(shape, fill, dtype=arr.dtype)
+    hit = src >= 0
+    if hit.any():
+        dst_idx = [slice(None)] * arr.ndim
+        src_idx = [slice(None)] * arr.ndim
+        dst_idx[axis] = np.flatnonzero(hit)
+        src_idx[axis] = src[hit]
+        out[tuple(dst_idx)] = arr[tuple(src_idx)]
+    return out
+
+
+class AlertEngine:
+    """
+    Enabled rules are compiled into arrays (metric column, sign,
+    threshold, clear threshold, duration) and kept against the router
+    list as (rules x routers) matrices: scope, breach start time and
+    active flag. A cycle is a handful of array operations over the
+    newest sample of every router, however many rules and routers
+    there are; Python only runs for alerts that fire or clear.
+    """
+
+    def __init__(self, metrics: Sequence[str] = METRICS):
+        self.metrics = tuple(metrics)
+        self.rules: List[dict] = []
+        self.names: List[str] = []
+        self._groups: List[Optional[str]] = []
+        self._max_age = np.empty(0)
+        self._rule_keys: List[tuple] = []
+        self._column = np.empty(0, dtype=np.int64)
+        self._sign = np.empty(0)
+        self._threshold = np.empty(0)
+        self._clear = np.empty(0)
+        self._duration = np.empty(0)
+        self._scope = np.zeros((0, 0), dtype=bool)
+        self._since = np.empty((0, 0))
+        self._active = np.zeros((0, 0), dtype=bool)
+        self.evaluations = 0
+        self.fired = 0
+        self.last_duration = 0.0
+
+    # =========================
+    # Rules and routers
+    # =========================
+
+    def set_rules(self, rules: Sequence[Mapping]) -> None:
+        """
+        Compile the enabled rules. Alerts of unchanged rules stay active;
+        a rule whose definition changed starts over.
+        """
+        rules = [dict(r) for r in rules if r.get("enabled", 1) and r.get("metric") in self.metrics]
+        keys = [(r.get("id"), r["metric"], r["op"], r["threshold"], r.get("clear_threshold"),
+                 r.get("duration"), r.get("router"), r.get("group_name")) for r in rules]
+
+        self._since = _carry(self._since, self._rule_keys, keys, 0, np.nan)
+        self._active = _carry(self._active, self._rule_keys, keys, 0, False)
+        self.rules, self._rule_keys = rules, keys
+
+        self._column = np.array([self.metrics.index(r["metric"]) for r in rules], dtype=np.int64)
+        self._sign = np.array([OPS.get(r["op"], 1.0) for r in rules])
+        self._threshold = np.array([r["threshold"] for r in rules], dtype=np.float64)
+        self._clear = np.array(
+            [r["threshold"] if r.get("clear_threshold") is None else r["clear_threshold"] for r in rules],
+            dtype=np.float64,
+        )
+        self._duration = np.array([r.get("duration") or 0 for r in rules], dtype=np.float64)
+        self._build_scope()
+
+    def set_routers(self, routers: Mapping[str, object], default_interval: float) -> None:
+        """Follow the router list; only does work when names or groups changed."""
+        names = list(routers)
+        groups = [getattr(r, "group_name", None) for r in routers.values()]
+        if names == self.names and groups == self._groups:
+            return
+        self._since = _carry(self._since, self.names, names, 1, np.nan)
+        self._active = _carry(self._active, self.names, names, 1, False)
+        self.names, self._groups = names, groups
+        self._max_age = STALE_INTERVALS * np.array(
+            [getattr(r, "poll_interval", None) or default_interval for r in routers.values()],
+            dtype=np.float64,
+        )
+        self._build_scope()
+
+    def _build_scope(self) -> None:
+        names = np.array(self.names, dtype=object)
+        groups = np.array(self._groups, dtype=object)
+        scope = np.ones((len(self.rules), len(names)), dtype=bool)
+        for i, rule in enumerate(self.rules):
+            if rule.get("router"):
+                scope[i] &= names == rule["router"]
+            if rule.get("group_name"):
+                scope[i] &= groups == rule["group_name"]
+        self._scope = scope
+
+    # =========================
+    # Evaluation
+    # =========================
+
+    def evaluate(self, ts: np.ndarray, values: np.ndarray,
+                 now: Optional[float] = None) -> List[Tuple[dict, str, List[Tuple[str, float]]]]:
+        """
+        One cycle over the newest sample of every router in `names` order:
+        `ts` (routers,) and `values` (routers x metrics).
+        Returns (rule, "fire" | "clear", [(router, value), ...]) per rule
+        that changed.
+        """
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        if not self.rules or not self.names:
+            return []
+
+        fresh = now - ts <= self._max_age
+        current = np.where(fresh[:, None], values, np.nan)[:, self._column].T  # rules x routers
+        known = ~np.isnan(current)
+
+        with np.errstate(invalid="ignore"):
+            breach = self._sign[:, None] * (current - self._threshold[:, None]) > 0
+            cleared = self._sign[:, None] * (current - self._clear[:, None]) <= 0
+        breach &= self._scope
+        cleared &= self._scope
+
+        # Start of the current breach; reset once a sample is back under the
+        # threshold, kept while there is no fresh sample
+        self._since = np.where(
+            breach,
+            np.where(np.isnan(self._since), now, self._since),
+            np.where(known, np.nan, self._since),
+        )
+        fire = breach & ~self._active & (now - self._since >= self._duration[:, None])
+        clear = self._active & cleared
+        self._active = (self._active | fire) & ~clear
+
+        events = self._events(fire, "fire", current) + self._events(clear, "clear", current)
+        self.evaluations += 1
+        self.fired += int(np.count_nonzero(fire))
+        self.last_duration = time.perf_counter() - started
+        return events
+
+    def _events(self, mask: np.ndarray, kind: str, current: np.ndarray) -> list:
+        rule_idx, router_idx = np.nonzero(mask)
+        events = []
+        for i in np.unique(rule_idx):
+            cols = router_idx[rule_idx == i]
+            items = [(self.names[j], float(current[i, j])) for j in cols]
+            events.append((self.rules[i], kind, items))
+        return events
+
+    def active(self) -> Dict[str, List[str]]:
+        """Rule name -> routers it is currently active for."""
+        result = {}
+        for i, j in zip(*np.nonzero(self._active)):
+            result.setdefault(self.rules[i]["name"], []).append(self.names[j])
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "rules": len(self.rules),
+            "routers": len(self.names),
+            "active": int(np.count_nonzero(self._active)),
+            "evaluations": self.evaluations,
+            "fired": self.fired,
+            "last_evaluation_ms": round(self.last_duration * 1000, 3),
+        }
+
+
+async def reload_rules() -> None:
+    """Re-read the rules from the DB; called on startup and after every change."""
+    rules = await DB.run(get_alert_rules)
+    ALERTS.set_rules(rules)
+    logger.info("Alert rules loaded: %d enabled of %d", len(ALERTS.rules), len(rules))
+
+
+ALERTS = AlertEngine()
@@ -0,0 +1,418 @@
+# app/archive.py
+# Long-term metric archive: Gorilla-compressed columnar segments, read through mmap
+
+import asyncio
+import logging
+import mmap
+import os
+import shutil
+import sqlite3
+import struct
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from . import history
+from .history import METRICS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", Path(__file__).resolve().parent / "archive"))
+# One segment per router per window (seconds)
+SEGMENT_SECONDS = 86400
+# Samples per block: the unit a range query decodes (1024 x 5 s ≈ 85 min)
+BLOCK_SAMPLES = 1024
+ARCHIVE_RETENTION_DAYS = float(os.getenv("ARCHIVE_RETENTION_DAYS", 365))
+ARCHIVE_COMPACT_INTERVAL = 3600  # seconds between compaction runs
+# A window is sealed once it ended this long ago (late samples still land in SQLite)
+ARCHIVE_GRACE = 300
+
+MAGIC = b"RMAR"
+VERSION = 1
+# magic, version, reserved, metric count, window start, window end, block count
+FILE_HEADER = struct.Struct(">4sBxHqqI")
+# first ts, last ts, sample count, offset of the block's streams
+BLOCK_HEADER = struct.Struct(">qqIQ")
+STREAM_LENGTH = struct.Struct(">I")
+
+
+# =========================
+# Bit streams
+# =========================
+
+class BitWriter:
+    __slots__ = ("out", "_acc", "_bits")
+
+    def __init__(self):
+        self.out = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value: int, nbits: int) -> None:
+        self._acc = (self._acc << nbits) | value
+        self._bits += nbits
+        if self._bits >= 64:
+            keep = self._bits & 7
+            self.out += (self._acc >> keep).to_bytes((self._bits - keep) >> 3, "big")
+            self._acc &= (1 << keep) - 1
+            self._bits = keep
+
+    def getvalue(self) -> bytes:
+        """Flush, padding the last byte with zero bits."""
+        if self._bits:
+            pad = -self._bits & 7
+            self.out += (self._acc << pad).to_bytes((self._bits + pad) >> 3, "big")
+            self._acc = self._bits = 0
+        return bytes(self.out)
+
+
+class BitReader:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data: bytes):
+        # Padding: a read of up to 64 bits may look 9 bytes ahead
+        self.data = bytes(data) + b"\x00" * 9
+        self.pos = 0
+
+    def bit(self) -> int:
+        pos = self.pos
+        self.pos = pos + 1
+        return (self.data[pos >> 3] >> (7 - (pos & 7))) & 1
+
+    def read(self, nbits: int) -> int:
+        pos = self.pos
+        self.pos = pos + nbits
+        start = pos >> 3
+        chunk = int.from_bytes(self.data[start:start + 9], "big")
+        return (chunk >> (72 - (pos & 7) - nbits)) & ((1 << nbits) - 1)
+
+
+# =========================
+# Timestamps: delta-of-delta
+# =========================
+
+# (prefix, prefix bits, value bits): dod in [-(2^(bits-1) - 1), 2^(bits-1)]
+_DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+
+def encode_timestamps(ts: Sequence[int]) -> bytes:
+    """Everything after the first timestamp (kept in the block header)."""
+    w = BitWriter()
+    prev, delta = ts[0], 0
+    for t in ts[1:]:
+        new_delta = t - prev
+        dod = new_delta - delta
+        prev, delta = t, new_delta
+        if dod == 0:
+            w.write(0, 1)
+            continue
+        for prefix, plen, bits in _DOD_BUCKETS:
+            bias = (1 << (bits - 1)) - 1
+            if -bias <= dod <= bias + 1:
+                w.write(prefix, plen)
+                w.write(dod + bias, bits)
+                break
+        else:
+            w.write(0b1111, 4)
+            w.write(dod & 0xFFFFFFFF, 32)
+    return w.getvalue()
+
+
+def decode_timestamps(data: bytes, first: int, count: int) -> List[int]:
+    r = BitReader(data)
+    out = [first]
+    prev, delta = first, 0
+    for _ in range(count - 1):
+        if not r.bit():
+            dod = 0
+        elif not r.bit():
+            dod = r.read(7) - 63
+        elif not r.bit():
+            dod = r.read(9) - 255
+        elif not r.bit():
+            dod = r.read(12) - 2047
+        else:
+            dod = r.read(32)
+            if dod >= 1 << 31:
+                dod -= 1 << 32
+        delta += dod
+        prev += delta
+        out.append(prev)
+    return out
+
+
+# =========================
+# Values: XOR of IEEE-754 bits
+# =========================
+
+def encode_floats(values: np.ndarray) -> bytes:
+    """
+    Gorilla value compression: XOR with the previous value, store only
+    the meaningful bits, reuse the previous leading/trailing window when
+    it fits. Missing values are NaN and compress like any other.
+    """
+    words = np.ascontiguousarray(values, dtype=np.float64).view(np.uint64).tolist()
+    w = BitWriter()
+    prev = words[0]
+    w.write(prev, 64)
+    lead, trail = -1, -1
+    for word in words[1:]:
+        x = word ^ prev
+        prev = word
+        if x == 0:
+            w.write(0, 1)
+            continue
+        new_lead = min(64 - x.bit_length(), 31)
+        new_trail = (x & -x).bit_length() - 1
+        if lead >= 0 and new_lead >= lead and new_trail >= trail:
+            w.write(0b10, 2)
+            w.write(x >> trail, 64 - lead - trail)
+        else:
+            lead, trail = new_lead, new_trail
+            size = 64 - lead - trail
+            w.write(0b11, 2)
+            w.write(lead, 5)
+            w.write(size & 63, 6)  # 64 is stored as 0
+            w.write(x >> trail, size)
+    return w.getvalue()
+
+
+def decode_floats(data: bytes, count: int) -> np.ndarray:
+    r = BitReader(data)
+    prev = r.read(64)
+    words = [prev]
+    lead = trail = 0
+    for _ in range(count - 1):
+        if r.bit():
+            if r.bit():
+                lead = r.read(5)
+                size = r.read(6) or 64
+                trail = 64 - lead - size
+            prev ^= r.read(64 - lead - trail) << trail
+        words.append(prev)
+    return np.array(words, dtype=np.uint64).view(np.float64)
+
+
+# =========================
+# Segment files
+# =========================
+
+def segment_path(router: str, window_start: int) -> Path:
+    day = time.strftime("%Y-%m-%d", time.gmtime(window_start))
+    return ARCHIVE_DIR / day / f"{quote(router, safe='')}.seg"
+
+
+def write_segment(path: Path, window_start: int, window_end: int,
+                  ts: Sequence[int], columns: Dict[str, np.ndarray]) -> int:
+    """
+    Layout: file header, metric names, block index, then per block the
+    timestamp stream followed by one value stream per metric. Blocks of
+    BLOCK_SAMPLES let a range query skip everything outside the range,
+    per-metric streams let it skip the metrics it does not need.
+    Written to a temp file and renamed, so readers never see half a segment.
+    """
+    metrics = list(columns)
+    names = b"".join(len(m.encode()).to_bytes(1, "big") + m.encode() for m in metrics)
+    n_blocks = (len(ts) + BLOCK_SAMPLES - 1) // BLOCK_SAMPLES
+
+    blocks: List[Tuple[int, int, int, List[bytes]]] = []
+    for b in range(n_blocks):
+        lo, hi = b * BLOCK_SAMPLES, min((b + 1) * BLOCK_SAMPLES, len(ts))
+        streams = [encode_timestamps(ts[lo:hi])]
+        streams += [encode_floats(columns[m][lo:hi]) for m in metrics]
+        blocks.append((ts[lo], ts[hi - 1], hi - lo, streams))
+
+    index_size = n_blocks * (BLOCK_HEADER.size + STREAM_LENGTH.size * (1 + len(metrics)))
+    offset = FILE_HEADER.size + len(names) + index_size
+
+    header = bytearray(FILE_HEADER.pack(MAGIC, VERSION, len(metrics), window_start, window_end, n_blocks))
+    header += names
+    body = bytearray()
+    for t_first, t_last, count, streams in blocks:
+        header += BLOCK_HEADER.pack(t_first, t_last, count, offset + len(body))
+        for stream in streams:
+            header += STREAM_LENGTH.pack(len(stream))
+            body += stream
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(body)
+    os.replace(tmp, path)
+    return len(header) + len(body)
+
+
+class Segment:
+    """A sealed segment opened through mmap; only the header is parsed up front."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse_header(self) -> None:
+        mm = self._mm
+        magic, version, n_metrics, self.window_start, self.window_end, n_blocks = FILE_HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path}: not an archive segment")
+
+        pos = FILE_HEADER.size
+        self.metrics: List[str] = []
+        for _ in range(n_metrics):
+            size = mm[pos]
+            self.metrics.append(mm[pos + 1:pos + 1 + size].decode())
+            pos += 1 + size
+
+        # (first ts, last ts, count, [(offset, length) of ts stream + each metric])
+        self.blocks: List[Tuple[int, int, int, List[Tuple[int, int]]]] = []
+        for _ in range(n_blocks):
+            t_first, t_last, count, offset = BLOCK_HEADER.unpack_from(mm, pos)
+            pos += BLOCK_HEADER.size
+            streams = []
+            for _ in range(1 + n_metrics):
+                (length,) = STREAM_LENGTH.unpack_from(mm, pos)
+                pos += STREAM_LENGTH.size
+                streams.append((offset, length))
+                offset += length
+            self.blocks.append((t_first, t_last, count, streams))
+
+    def read(self, start: float, end: float,
+             metrics: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Samples with start <= ts <= end; decodes only the overlapping blocks and requested metrics."""
+        wanted = [m for m in (metrics or self.metrics) if m in self.metrics]
+        ts_parts: List[np.ndarray] = []
+        value_parts: Dict[str, List[np.ndarray]] = {m: [] for m in wanted}
+
+        for t_first, t_last, count, streams in self.blocks:
+            if t_last < start or t_first > end:
+                continue
+            offset, length = streams[0]
+            ts = np.array(decode_timestamps(self._mm[offset:offset + length], t_first, count), dtype=np.int64)
+            mask = (ts >= start) & (ts <= end)
+            ts_parts.append(ts[mask])
+            for m in wanted:
+                offset, length = streams[1 + self.metrics.index(m)]
+                value_parts[m].append(decode_floats(self._mm[offset:offset + length], count)[mask])
+
+        ts = np.concatenate(ts_parts) if ts_parts else np.empty(0, dtype=np.int64)
+        values = {
+            m: np.concatenate(parts) if parts else np.empty(0)
+            for m, parts in value_parts.items()
+        }
+        return ts, values
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __enter__(self) -> "Segment":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def query(router: str, start: float, end: float,
+          metrics: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """A router's archived samples in [start, end] across all segments that overlap it."""
+    metrics = [m for m in (metrics or METRICS) if m in METRICS]
+    ts_parts = []
+    value_parts: Dict[str, List[np.ndarray]] = {m: [] for m in metrics}
+
+    window = int(start) // SEGMENT_SECONDS * SEGMENT_SECONDS
+    while window <= end:
+        path = segment_path(router, window)
+        if path.exists():
+            with Segment(path) as segment:
+                ts, values = segment.read(start, end, metrics)
+            ts_parts.append(ts)
+            for m in metrics:
+                value_parts[m].append(values.get(m, np.full(len(ts), np.nan)))
+        window += SEGMENT_SECONDS
+
+    ts = np.concatenate(ts_parts) if ts_parts else np.empty(0, dtype=np.int64)
+    return ts, {m: np.concatenate(p) if p else np.empty(0) for m, p in value_parts.items()}
+
+
+# =========================
+# Compaction
+# =========================
+
+def compact(now: Optional[float] = None) -> int:
+    """
+    Seal finished windows from the raw SQLite history into segments,
+    router by router (windows that already have a segment are skipped),
+    and delete segments past ARCHIVE_RETENTION_DAYS. Runs in a thread.
+    Returns the number of segments written.
+    """
+    now = time.time() if now is None else now
+    if not history.HISTORY_DB_PATH.exists():
+        return 0
+
+    sealed_before = int(now - ARCHIVE_GRACE) // SEGMENT_SECONDS * SEGMENT_SECONDS
+    # First window entirely inside raw retention: an earlier one may already
+    # have lost rows to expiry and would be sealed truncated, for good
+    raw_cutoff = int(now - history.RAW_RETENTION_DAYS * 86400)
+    oldest = -(-raw_cutoff // SEGMENT_SECONDS) * SEGMENT_SECONDS
+    written = 0
+
+    conn = sqlite3.connect(history.HISTORY_DB_PATH, timeout=30)
+    try:
+        try:
+            # The hourly rollup is small and has every router that ever reported
+            routers = [r for (r,) in conn.execute("SELECT DISTINCT router FROM samples_1h")]
+        except sqlite3.OperationalError:
+            return 0
+
+        cols = ", ".join(METRICS)
+        for router in routers:
+            for window in range(oldest, sealed_before, SEGMENT_SECONDS):
+                path = segment_path(router, window)
+                if path.exists():
+                    continue
+                rows = conn.execute(
+                    f"SELECT ts, {cols} FROM samples_raw WHERE router = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                    (router, window, window + SEGMENT_SECONDS),
+                ).fetchall()
+                if not rows:
+                    continue
+                data = np.array(rows, dtype=np.float64)  # None -> nan
+                columns = {m: data[:, 1 + i] for i, m in enumerate(METRICS)}
+                write_segment(path, window, window + SEGMENT_SECONDS, [int(t) for t in data[:, 0]], columns)
+                written += 1
+    finally:
+        conn.close()
+
+    _expire(now)
+    return written
+
+
+def _expire(now: float) -> None:
+    if not ARCHIVE_DIR.exists():
+        return
+    cutoff = time.strftime("%Y-%m-%d", time.gmtime(now - ARCHIVE_RETENTION_DAYS * 86400))
+    for day in ARCHIVE_DIR.iterdir():
+        if day.is_dir() and day.name < cutoff:
+            shutil.rmtree(day, ignore_errors=True)
+
+
+async def compaction_loop(shutdown_event: asyncio.Event) -> None:
+    while not shutdown_event.is_set():
+        try:
+            written = await asyncio.to_thread(compact)
+            if written:
+                logger.info("Archive: sealed %d segments", written)
+        except Exception as e:
+            logger.exception("Archive compaction failed: %s", e)
+        try:
+            await asyncio.wait_for(shutdown_event.wait(), timeout=ARCHIVE_COMPACT_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
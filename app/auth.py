@@ -0,0 +1,134 @@
+# app/auth.py
+# Password hashing off the event loop and login throttling
+
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Optional
+
+import bcrypt
+
+# bcrypt releases the GIL, so threads hash in parallel without blocking the loop
+PASSWORD_THREADS = int(os.getenv("PASSWORD_THREADS", 2))
+# Hash jobs allowed to wait for a thread; beyond that logins are turned away
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", 16))
+
+# Failed logins allowed per window, per client IP and per username
+LOGIN_WINDOW = int(os.getenv("LOGIN_WINDOW", 900))
+LOGIN_MAX_FAILURES_IP = int(os.getenv("LOGIN_MAX_FAILURES_IP", 20))
+LOGIN_MAX_FAILURES_USER = int(os.getenv("LOGIN_MAX_FAILURES_USER", 5))
+# Keys tracked at most; the oldest are forgotten first
+LOGIN_MAX_KEYS = 10000
+
+
+class PasswordPoolBusy(Exception):
+    """More hash jobs are waiting than PASSWORD_MAX_PENDING."""
+
+
+class PasswordHasher:
+    """
+    bcrypt on a small thread pool. A semaphore bounds how many jobs can
+    wait, so a burst of logins gets a quick "busy" instead of a queue
+    that grows without limit.
+    """
+
+    def __init__(self, threads: int = PASSWORD_THREADS, max_pending: int = PASSWORD_MAX_PENDING):
+        self.threads = threads
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(threads + max_pending)
+        self.jobs = 0
+        self.rejected = 0
+        self._times: deque = deque(maxlen=1000)
+
+    async def _run(self, fn, *args):
+        if self._slots.locked():
+            self.rejected += 1
+            raise PasswordPoolBusy()
+        async with self._slots:
+            started = time.monotonic()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+            finally:
+                self.jobs += 1
+                self._times.append(time.monotonic() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(_verify, password, password_hash)
+
+    def stats(self) -> dict:
+        times = sorted(self._times)
+        return {
+            "threads": self.threads,
+            "jobs": self.jobs,
+            "rejected": self.rejected,
+            "time_p95_ms": round(times[int(len(times) * 0.95)] * 1000, 1) if times else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+
+def _verify(password: str, password_hash: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode(), password_hash.encode())
+    except ValueError:
+        # Not a bcrypt hash
+        return False
+
+
+class LoginThrottle:
+    """Failed logins per key ("ip:..." / "user:...") in a sliding LOGIN_WINDOW."""
+
+    def __init__(self, window: int = LOGIN_WINDOW):
+        self.window = window
+        self._failures: Dict[str, Deque[float]] = {}
+        self.blocked = 0
+
+    def _recent(self, key: str, now: float) -> Deque[float]:
+        times = self._failures.get(key)
+        if times is None:
+            return deque()
+        while times and now - times[0] > self.window:
+            times.popleft()
+        if not times:
+            del self._failures[key]
+        return times
+
+    def retry_after(self, ip: str, username: str) -> Optional[int]:
+        """Seconds until the next attempt is allowed, None if it is allowed now."""
+        now = time.monotonic()
+        waits = []
+        for key, limit in ((f"ip:{ip}", LOGIN_MAX_FAILURES_IP), (f"user:{username}", LOGIN_MAX_FAILURES_USER)):
+            times = self._recent(key, now)
+            if len(times) >= limit:
+                waits.append(times[-limit] + self.window - now)
+        if not waits:
+            return None
+        self.blocked += 1
+        return max(1, int(max(waits)))
+
+    def failed(self, ip: str, username: str) -> None:
+        now = time.monotonic()
+        for key in (f"ip:{ip}", f"user:{username}"):
+            self._failures.setdefault(key, deque()).append(now)
+        while len(self._failures) > LOGIN_MAX_KEYS:
+            del self._failures[next(iter(self._failures))]
+
+    def succeeded(self, username: str) -> None:
+        self._failures.pop(f"user:{username}", None)
+
+    def stats(self) -> dict:
+        return {"tracked_keys": len(self._failures), "blocked": self.blocked}
+
+
+PASSWORDS = PasswordHasher()
+LOGIN_THROTTLE = LoginThrottle()
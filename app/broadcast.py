@@ -0,0 +1,407 @@
+# app/broadcast.py
+# /ws/status fan-out: encode once, one bounded queue and sender task per client
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, FrozenSet, List, Mapping, Optional, Set, Tuple
+
+from starlette.websockets import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# Messages a client may have waiting before it is switched to a full resync
+BROADCAST_QUEUE_SIZE = int(os.getenv("BROADCAST_QUEUE_SIZE", 16))
+# A client that has been behind for this long is disconnected (seconds)
+BROADCAST_MAX_LAG = float(os.getenv("BROADCAST_MAX_LAG", 30))
+# Close code for clients dropped for lagging (1013 = try again later)
+LAG_CLOSE_CODE = 1013
+
+# Subscription limits
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_NAMES = 5000
+
+
+def encode(message: dict) -> str:
+    """Same encoding as WebSocket.send_json, done once for all clients."""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+# =========================
+# Subscriptions
+# =========================
+
+class Subscription:
+    """
+    Routers a client wants to see: explicit names, a name prefix or a
+    search term (case-insensitive substring, like the dashboard search),
+    optionally narrowed to one page of the matching routers sorted by name.
+    An empty subscription means the whole fleet.
+    """
+
+    __slots__ = ("names", "prefix", "search", "page", "page_size", "key")
+
+    def __init__(self, names: Optional[FrozenSet[str]] = None, prefix: str = "",
+                 search: str = "", page: Optional[int] = None, page_size: int = PAGE_SIZE):
+        self.names = names
+        self.prefix = prefix.lower()
+        self.search = search.lower()
+        self.page = page
+        self.page_size = page_size
+        # Clients with equal keys share one group (one encoding per message)
+        self.key = (
+            tuple(sorted(names)) if names is not None else None,
+            self.prefix, self.search, page, page_size if page is not None else None,
+        )
+
+    @classmethod
+    def parse(cls, data: Mapping) -> "Subscription":
+        """From a subscribe message or query params. Raises ValueError."""
+        names = data.get("names")
+        if isinstance(names, str):
+            names = [n for n in names.split(",") if n]
+        if names is not None:
+            if not isinstance(names, list) or len(names) > MAX_NAMES or not all(isinstance(n, str) for n in names):
+                raise ValueError("names must be a list of router names")
+            names = frozenset(names)
+
+        prefix = data.get("prefix") or ""
+        search = data.get("search") or ""
+        if not isinstance(prefix, str) or not isinstance(search, str):
+            raise ValueError("prefix and search must be strings")
+
+        page = data.get("page")
+        page_size = data.get("page_size") or PAGE_SIZE
+        if page is not None:
+            page, page_size = int(page), int(page_size)
+            if page < 0 or not 1 <= page_size <= MAX_PAGE_SIZE:
+                raise ValueError("bad page")
+
+        return cls(names, prefix, search, page, page_size)
+
+    @property
+    def paged(self) -> bool:
+        return self.page is not None
+
+    def matches(self, name: str) -> bool:
+        if self.names is not None and name not in self.names:
+            return False
+        lowered = name.lower()
+        if self.prefix and not lowered.startswith(self.prefix):
+            return False
+        if self.search and self.search not in lowered:
+            return False
+        return True
+
+    def page_names(self, ordered: List[str]) -> FrozenSet[str]:
+        matching = [name for name in ordered if self.matches(name)]
+        start = self.page * self.page_size
+        return frozenset(matching[start:start + self.page_size])
+
+
+ALL = Subscription()
+
+
+class _Group:
+    """Clients with the same subscription."""
+
+    __slots__ = ("sub", "clients", "prev", "names", "full")
+
+    def __init__(self, sub: Subscription, seq: int):
+        self.sub = sub
+        self.clients: Set["_Client"] = set()
+        # seq of the last delta sent to this group: the next one carries it as `prev`
+        self.prev = seq
+        # Current page (paged subscriptions only)
+        self.names: Optional[FrozenSet[str]] = None
+        self.full: Optional[Tuple[int, str]] = None
+
+    def matches(self, name: str) -> bool:
+        if self.sub.paged:
+            return self.names is not None and name in self.names
+        return self.sub.matches(name)
+
+
+# =========================
+# Clients
+# =========================
+
+class _Client:
+    __slots__ = ("ws", "group", "queue", "task", "resync", "behind_since", "sending")
+
+    def __init__(self, ws: WebSocket, group: _Group):
+        self.ws = ws
+        self.group = group
+        # Encoded messages; None only wakes the sender up for a resync
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=BROADCAST_QUEUE_SIZE)
+        self.task: Optional[asyncio.Task] = None
+        self.resync = False
+        self.behind_since: Optional[float] = None
+        self.sending = False
+
+    @property
+    def busy(self) -> bool:
+        return self.sending or self.resync or not self.queue.empty()
+
+
+class Broadcaster:
+    """
+    Every message is serialized once per subscription group; each client
+    gets it through its own bounded queue, drained by its own sender task,
+    so `publish` never waits on a socket and a slow browser only delays itself.
+
+    Deltas only make sense in order, so a client whose queue overflows
+    does not get the older ones at all: its queue is dropped and it is
+    sent the latest full state instead. A client that stays behind for
+    BROADCAST_MAX_LAG is disconnected (the dashboard reconnects).
+
+    A delta goes to a group only if it touches one of the group's routers.
+    It carries `prev`, the seq of the group's previous delta: a client at
+    seq >= prev has missed nothing, otherwise it resyncs.
+    """
+
+    def __init__(self, snapshot: Callable[[], dict]):
+        # Full state at the current seq
+        self._snapshot = snapshot
+        self._clients: Dict[WebSocket, _Client] = {}
+        self._groups: Dict[tuple, _Group] = {}
+        self._seq = 0
+        self.published = 0
+        self.resyncs = 0
+        self.dropped = 0
+        self.lagged_out = 0
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    # =========================
+    # Clients
+    # =========================
+
+    def add(self, ws: WebSocket, sub: Subscription = ALL) -> None:
+        """Start streaming to an accepted socket; the full state goes first."""
+        client = _Client(ws, self._join(sub))
+        client.group.clients.add(client)
+        self._clients[ws] = client
+        self._request_full(client)
+        client.task = asyncio.create_task(self._send_loop(client))
+
+    def remove(self, ws: WebSocket) -> None:
+        client = self._clients.pop(ws, None)
+        if client is None:
+            return
+        self._leave(client)
+        if client.task is not None:
+            client.task.cancel()
+
+    def subscribe(self, ws: WebSocket, sub: Subscription) -> None:
+        """Switch a client to another subset; it gets that subset's full state."""
+        client = self._clients.get(ws)
+        if client is None or client.group.sub.key == sub.key:
+            return
+        self._leave(client)
+        client.group = self._join(sub)
+        client.group.clients.add(client)
+        self._request_full(client)
+
+    def send_error(self, ws: WebSocket, message: str) -> None:
+        """
+        Queue an error reply for the client; it goes out through the
+        client's sender task, which is the only one writing to its socket.
+        Not sent if the client's queue is full (it is about to resync).
+        """
+        client = self._clients.get(ws)
+        if client is None:
+            return
+        try:
+            client.queue.put_nowait(encode({"type": "error", "message": message}))
+        except asyncio.QueueFull:
+            pass
+
+    def resync(self, ws: WebSocket) -> None:
+        """Client saw a gap in seq: drop what is queued, send the full state."""
+        client = self._clients.get(ws)
+        if client is not None:
+            self.resyncs += 1
+            self._request_full(client)
+
+    async def close(self, code: int = 1001) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._groups.clear()
+        for client in clients:
+            if client.task is not None:
+                client.task.cancel()
+            try:
+                await asyncio.wait_for(client.ws.close(code=code), timeout=1)
+            except Exception as e:
+                logger.debug("WS close error: %s", e)
+
+    def _join(self, sub: Subscription) -> _Group:
+        group = self._groups.get(sub.key)
+        if group is None:
+            group = self._groups[sub.key] = _Group(sub, self._seq)
+        return group
+
+    def _leave(self, client: _Client) -> None:
+        group = client.group
+        group.clients.discard(client)
+        if not group.clients:
+            self._groups.pop(group.sub.key, None)
+
+    # =========================
+    # Publishing
+    # =========================
+
+    def publish(self, message: dict) -> None:
+        """
+        Queue a delta for every client that watches a changed router; a delta
+        without routers (only other keys, e.g. "registry") goes to everyone.
+        Never blocks.
+        """
+        seq = self._seq = message.get("seq", self._seq)
+        if not self._clients:
+            return
+
+        # Every client, not only those this delta is for: a stuck client
+        # whose routers are quiet must still be dropped after BROADCAST_MAX_LAG
+        self.check_lag()
+
+        routers = message["routers"]
+        extra = {k: v for k, v in message.items() if k not in ("type", "seq", "routers")}
+        ordered: Optional[List[str]] = None
+
+        for group in list(self._groups.values()):
+            if group.sub.paged:
+                if ordered is None:
+                    ordered = sorted(self._snapshot()["routers"])
+                names = group.sub.page_names(ordered)
+                if group.names is not None and names != group.names:
+                    # Routers moved on or off the page: start the page over
+                    group.names = names
+                    for client in list(group.clients):
+                        self._request_full(client)
+                    continue
+                group.names = names
+
+            part = {name: fields for name, fields in routers.items() if group.matches(name)}
+            if not part and routers:
+                continue
+
+            text = encode({"type": "delta", "seq": seq, "prev": group.prev, **extra, "routers": part})
+            group.prev = seq
+            self.published += 1
+
+            for client in list(group.clients):
+                if client.resync:
+                    # The full state it is about to get already includes this delta
+                    continue
+                try:
+                    client.queue.put_nowait(text)
+                except asyncio.QueueFull:
+                    self.dropped += client.queue.qsize()
+                    self.resyncs += 1
+                    self._request_full(client)
+
+    def check_lag(self) -> None:
+        """
+        Note when busy clients fell behind, drop those behind for longer than
+        BROADCAST_MAX_LAG. Runs on every publish and, with nothing to
+        publish, once per broadcast interval.
+        """
+        now = time.monotonic()
+        for client in list(self._clients.values()):
+            if client.busy and client.behind_since is None:
+                client.behind_since = now
+            if client.behind_since is not None and now - client.behind_since > BROADCAST_MAX_LAG:
+                self._lagged_out(client)
+
+    def _full_text(self, group: _Group) -> str:
+        """The group's full state, encoded once per seq however many clients need it."""
+        if group.full is None or group.full[0] != self._seq:
+            message = self._snapshot()
+            self._seq = message.get("seq", self._seq)
+            routers = message["routers"]
+            if group.sub.paged:
+                group.names = group.sub.page_names(sorted(routers))
+            if group.sub.key != ALL.key:
+                routers = {name: status for name, status in routers.items() if group.matches(name)}
+            message["routers"] = routers
+            group.full = (self._seq, encode(message))
+        return group.full[1]
+
+    @staticmethod
+    def _request_full(client: _Client) -> None:
+        while not client.queue.empty():
+            client.queue.get_nowait()
+        client.resync = True
+        client.queue.put_nowait(None)
+
+    def _lagged_out(self, client: _Client) -> None:
+        logger.warning(
+            "Dropping /ws/status client %s: behind for more than %.0fs",
+            client.ws.client, BROADCAST_MAX_LAG,
+        )
+        self.lagged_out += 1
+        self.remove(client.ws)
+        asyncio.create_task(self._close_quietly(client.ws, LAG_CLOSE_CODE))
+
+    @staticmethod
+    async def _close_quietly(ws: WebSocket, code: int) -> None:
+        try:
+            await asyncio.wait_for(ws.close(code=code), timeout=5)
+        except Exception:
+            pass
+
+    # =========================
+    # Sender
+    # =========================
+
+    async def _send_loop(self, client: _Client) -> None:
+        try:
+            while True:
+                text = await client.queue.get()
+                if client.resync:
+                    client.resync = False
+                    text = self._full_text(client.group)
+                elif text is None:
+                    continue
+
+                client.sending = True
+                try:
+                    await client.ws.send_text(text)
+                finally:
+                    client.sending = False
+
+                if not client.busy:
+                    client.behind_since = None
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug("WS send failed for %s: %s", client.ws.client, e)
+            if self._clients.get(client.ws) is client:
+                del self._clients[client.ws]
+                self._leave(client)
+
+    # =========================
+    # Introspection
+    # =========================
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        clients = list(self._clients.values())
+        return {
+            "clients": len(clients),
+            "groups": len(self._groups),
+            "seq": self._seq,
+            "published": self.published,
+            "queued": sum(c.queue.qsize() for c in clients),
+            "behind": sum(1 for c in clients if c.behind_since is not None),
+            "max_lag_s": round(max((now - c.behind_since for c in clients if c.behind_since is not None), default=0.0), 1),
+            "resyncs": self.resyncs,
+            "dropped": self.dropped,
+            "lagged_out": self.lagged_out,
+        }
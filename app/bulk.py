@@ -0,0 +1,189 @@
+# app/bulk.py
+# Bulk router import (CSV / JSON upload) and streamed export
+
+import asyncio
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, List, Mapping, Tuple
+
+from .crypto import decrypt_password
+from .db import DB, get_routers_page
+
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", 5000))
+IMPORT_MAX_BYTES = 5 * 1024 * 1024
+# Invalid rows reported back at most
+IMPORT_MAX_ERRORS = 100
+# Routers read from the DB per exported chunk
+EXPORT_CHUNK = 500
+EXPORT_FORMATS = {"csv": "text/csv", "json": "application/json"}
+EXPORT_FIELDS = ("name", "host", "username", "port", "enabled", "poll_interval", "group_name")
+
+_TRUE = {"1", "true", "yes", "on"}
+_FALSE = {"0", "false", "no", "off"}
+
+
+# =========================
+# Import
+# =========================
+
+def parse_file(data: bytes, filename: str = "") -> List[Mapping]:
+    """
+    Uploaded file -> raw rows. JSON: an array of objects; anything else
+    is read as CSV with a header line. Raises ValueError.
+    """
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("file must be UTF-8")
+
+    if filename.lower().endswith(".json") or text.lstrip().startswith("["):
+        try:
+            items = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON: {e}")
+        if not isinstance(items, list):
+            raise ValueError("JSON must be an array of router objects")
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or "name" not in reader.fieldnames:
+            raise ValueError("CSV needs a header line with at least name, host, username, password")
+        items = list(reader)
+
+    if not items:
+        raise ValueError("no routers in file")
+    if len(items) > IMPORT_MAX_ROWS:
+        raise ValueError(f"at most {IMPORT_MAX_ROWS} routers per import")
+    return items
+
+
+def _text(data: Mapping, key: str, required: bool = True, strip: bool = True):
+    value = data.get(key)
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"{key} is required")
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{key} must be a string")
+    value = value.strip() if strip else value
+    if required and not value:
+        raise ValueError(f"{key} is required")
+    return value or None
+
+
+def _int(data: Mapping, key: str, default, low: int, high: int = None):
+    value = data.get(key)
+    if value is None or value == "":
+        return default
+    try:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a whole number")
+    if value < low or (high is not None and value > high):
+        raise ValueError(f"{key} must be between {low} and {high}" if high else f"{key} must be {low} or more")
+    return value
+
+
+def parse_router(data: Mapping) -> dict:
+    """One router from an import file, password in plain text. Raises ValueError."""
+    if not isinstance(data, Mapping):
+        raise ValueError("router must be an object")
+
+    enabled = data.get("enabled", 1)
+    if isinstance(enabled, str) and enabled.strip().lower() in _TRUE | _FALSE | {""}:
+        enabled = enabled.strip().lower() not in _FALSE
+    elif enabled is None or isinstance(enabled, bool) or enabled in (0, 1):
+        enabled = enabled is None or bool(enabled)
+    else:
+        raise ValueError("enabled must be 0/1 or true/false")
+
+    return {
+        "name": _text(data, "name"),
+        "host": _text(data, "host"),
+        "username": _text(data, "username"),
+        "password": _text(data, "password", strip=False),
+        "port": _int(data, "port", 8728, 1, 65535),
+        "enabled": 1 if enabled else 0,
+        "poll_interval": _int(data, "poll_interval", None, 1),
+        "group_name": _text(data, "group_name", required=False),
+    }
+
+
+def validate_rows(items: List[Mapping]) -> Tuple[List[dict], List[dict]]:
+    """
+    Parsed routers and errors as [{"row", "name", "error"}] (rows count
+    from 1, the CSV header not included). Names must be unique in the file.
+    """
+    rows, errors, seen = [], [], set()
+    for i, item in enumerate(items, 1):
+        try:
+            row = parse_router(item)
+            if row["name"] in seen:
+                raise ValueError("duplicate name in file")
+        except ValueError as e:
+            name = item.get("name") if isinstance(item, Mapping) else None
+            errors.append({"row": i, "name": name, "error": str(e)})
+            continue
+        seen.add(row["name"])
+        rows.append(row)
+    return rows, errors
+
+
+# =========================
+# Export
+# =========================
+
+async def _export_chunks(passwords: bool) -> AsyncIterator[List[dict]]:
+    """The whole table in name order, EXPORT_CHUNK routers at a time."""
+    after = ""
+    while True:
+        rows = await DB.run(get_routers_page, after, EXPORT_CHUNK)
+        if not rows:
+            return
+        after = rows[-1]["name"]
+        if passwords:
+            rows = await asyncio.to_thread(_decrypt_rows, rows)
+        else:
+            for row in rows:
+                del row["password"]
+        yield rows
+
+
+def _decrypt_rows(rows: List[dict]) -> List[dict]:
+    for row in rows:
+        row["password"] = decrypt_password(row["password"])
+    return rows
+
+
+async def export_routers(fmt: str, passwords: bool = False) -> AsyncIterator[str]:
+    """
+    The fleet as CSV or a JSON array, in the import format (re-importable
+    as is when `passwords` is set). Produced chunk by chunk, never held
+    whole in memory.
+    """
+    fields = EXPORT_FIELDS + (("password",) if passwords else ())
+    if fmt == "json":
+        first = True
+        async for rows in _export_chunks(passwords):
+            parts = []
+            for row in rows:
+                parts.append(("[\n" if first else ",\n") + json.dumps({f: row[f] for f in fields}))
+                first = False
+            yield "".join(parts)
+        yield "[]\n" if first else "\n]\n"
+        return
+
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fields, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    async for rows in _export_chunks(passwords):
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        # No routers: just the header
+        yield buf.getvalue()
@@ -1,9 +1,28 @@
 # app/db.py
+import asyncio
+import os
 import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import bcrypt
 
 DB_PATH = Path(__file__).resolve().parent / "routers.db"
+# Threads (and so long-lived connections) serving DB calls from async code
+DB_THREADS = int(os.getenv("DB_THREADS", 2))
+DB_BUSY_TIMEOUT = 5  # seconds a writer waits for the lock
+# Compiled statements kept per connection; every query here is a constant string
+DB_CACHED_STATEMENTS = 256
+
+# Columns added to `routers` after the first release: name -> type
+ROUTER_COLUMNS = {
+    "poll_interval": "INTEGER",
+    "group_name": "TEXT",
+}
+
+ALERT_RULE_COLUMNS = ("name", "metric", "op", "threshold", "clear_threshold",
+                      "duration", "router", "group_name", "enabled")
 
 
 def get_connection():
@@ -14,111 +33,267 @@ def init_db():
     conn = get_connection()
     with open(Path(__file__).parent / "models.sql", encoding="utf-8") as f:
         conn.executescript(f.read())
+    _migrate(conn)
+    # WAL is stored in the file: readers no longer wait for a writer
+    conn.execute("PRAGMA journal_mode=WAL")
     conn.close()
 
 
-def get_routers():
-    conn = get_connection()
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
+def _migrate(conn):
+    """CREATE TABLE IF NOT EXISTS keeps old tables as they are - add the missing columns."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(routers)")}
+    for name, col_type in ROUTER_COLUMNS.items():
+        if name not in columns:
+            conn.execute(f"ALTER TABLE routers ADD COLUMN {name} {col_type}")
+    conn.commit()
 
-    cur.execute(
-        """
-        SELECT name, host, username, password, port
+
+# =========================
+# Connection pool
+# =========================
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+
+def connection() -> sqlite3.Connection:
+    """
+    The calling thread's long-lived connection, opened on first use.
+    The functions below run on DB threads (see Database), so the pool
+    is one connection per DB thread and SQLite's statement cache of
+    each connection stays warm. Writes use `with conn:` (commit/rollback).
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(
+            DB_PATH,
+            timeout=DB_BUSY_TIMEOUT,
+            cached_statements=DB_CACHED_STATEMENTS,
+            check_same_thread=False,  # only so that close_connections() can close it
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+def close_connections() -> None:
+    with _connections_lock:
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+
+
+class Database:
+    """
+    Async access to the functions of this module: they run on a few
+    dedicated threads, never on the event loop and never competing
+    with router I/O or asyncio.to_thread jobs.
+    """
+
+    def __init__(self, threads: int = DB_THREADS):
+        self.threads = threads
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="db")
+        self.jobs = 0
+        self.queued = 0
+        self._times: deque = deque(maxlen=1000)
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        submitted = time.monotonic()
+        self.queued += 1
+        try:
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self.queued -= 1
+            self.jobs += 1
+            self._times.append(time.monotonic() - submitted)
+
+    def stats(self) -> dict:
+        times = sorted(self._times)
+        return {
+            "threads": self.threads,
+            "connections": len(_connections),
+            "queued": self.queued,
+            "jobs": self.jobs,
+            "call_p95_ms": round(times[int(len(times) * 0.95)] * 1000, 1) if times else 0.0,
+            "call_max_ms": round(times[-1] * 1000, 1) if times else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        close_connections()
+
+
+DB = Database()
+
+
+ROUTER_FIELDS = ("name", "host", "username", "password", "port", "enabled", "poll_interval", "group_name")
+_ROUTER_FIELDS = ", ".join(ROUTER_FIELDS)
+_INSERT_ROUTER = f"INSERT INTO routers ({_ROUTER_FIELDS}) VALUES ({', '.join('?' for _ in ROUTER_FIELDS)})"
+_UPSERT_ROUTER = _INSERT_ROUTER + " ON CONFLICT(name) DO UPDATE SET " + ", ".join(
+    f"{f}=excluded.{f}" for f in ROUTER_FIELDS if f != "name")
+
+def get_routers():
+    rows = connection().execute(
+        f"""
+        SELECT {_ROUTER_FIELDS}
         FROM routers
         WHERE enabled = 1
         ORDER BY name
         """
-    )
+    ).fetchall()
 
-    rows = cur.fetchall()
-    conn.close()
+    return [dict(row) for row in rows]
+
+def get_router_row(name: str):
+    """One enabled router as stored (password encrypted), None if missing or disabled."""
+    row = connection().execute(
+        f"SELECT {_ROUTER_FIELDS} FROM routers WHERE name = ? AND enabled = 1", (name,)
+    ).fetchone()
+    return dict(row) if row else None
+
+# --- routers ---
+def add_router(name, host, username, password, port, enabled, poll_interval, group_name):
+    """`password` is already encrypted. False if the name is taken."""
+    conn = connection()
+    try:
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO routers (name, host, username, password, port, enabled, poll_interval, group_name)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (name, host, username, password, port, enabled, poll_interval, group_name),
+            )
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+def update_router(name, host, username, password, port, enabled, poll_interval, group_name):
+    conn = connection()
+    with conn:
+        conn.execute(
+            """
+            UPDATE routers
+            SET host=?, username=?, password=?, port=?, enabled=?, poll_interval=?, group_name=?
+            WHERE name=?
+            """,
+            (host, username, password, port, enabled, poll_interval, group_name, name),
+        )
 
+def delete_router(name):
+    conn = connection()
+    with conn:
+        conn.execute("DELETE FROM routers WHERE name=?", (name,))
+
+def import_routers(rows, replace=False):
+    """
+    Insert many routers (passwords already encrypted) in one transaction;
+    with `replace`, existing names are updated instead.
+    Returns (added, updated, conflicts); if names exist and `replace` is
+    off, nothing is written and they come back as `conflicts`.
+    """
+    conn = connection()
+    with conn:
+        # Taken before the check, so no router can appear in between
+        conn.execute("BEGIN IMMEDIATE")
+        existing = {row[0] for row in conn.execute("SELECT name FROM routers")}
+        conflicts = [r["name"] for r in rows if r["name"] in existing]
+        if conflicts and not replace:
+            return 0, 0, conflicts
+        conn.executemany(
+            _UPSERT_ROUTER if replace else _INSERT_ROUTER,
+            [tuple(r[f] for f in ROUTER_FIELDS) for r in rows],
+        )
+    return len(rows) - len(conflicts), len(conflicts), []
+
+def get_routers_page(after: str, limit: int):
+    """Up to `limit` routers (disabled ones too) named after `after`, as stored."""
+    rows = connection().execute(
+        f"SELECT {_ROUTER_FIELDS} FROM routers WHERE name > ? ORDER BY name LIMIT ?", (after, limit)
+    ).fetchall()
     return [dict(row) for row in rows]
 
+# --- alert rules ---
+_SELECT_RULES = f"SELECT id, {', '.join(ALERT_RULE_COLUMNS)} FROM alert_rules ORDER BY id"
+_INSERT_RULE = (f"INSERT INTO alert_rules ({', '.join(ALERT_RULE_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in ALERT_RULE_COLUMNS)})")
+_UPDATE_RULE = f"UPDATE alert_rules SET {', '.join(c + '=?' for c in ALERT_RULE_COLUMNS)} WHERE id=?"
+
+def get_alert_rules():
+    return [dict(row) for row in connection().execute(_SELECT_RULES).fetchall()]
+
+def add_alert_rule(rule: dict) -> int:
+    """Insert a validated rule, returns its id"""
+    conn = connection()
+    with conn:
+        cur = conn.execute(_INSERT_RULE, tuple(rule[c] for c in ALERT_RULE_COLUMNS))
+    return cur.lastrowid
+
+def update_alert_rule(rule_id: int, rule: dict) -> bool:
+    conn = connection()
+    with conn:
+        cur = conn.execute(_UPDATE_RULE, (*(rule[c] for c in ALERT_RULE_COLUMNS), rule_id))
+    return cur.rowcount > 0
+
+def delete_alert_rule(rule_id: int) -> bool:
+    conn = connection()
+    with conn:
+        cur = conn.execute("DELETE FROM alert_rules WHERE id=?", (rule_id,))
+    return cur.rowcount > 0
+
 # --- users ---
-def add_user(username: str, password: str, role: str = "viewer"):
-    password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-    conn = get_connection()
+def add_user(username: str, password_hash: str, role: str = "viewer"):
+    """`password_hash` comes from auth.PASSWORDS.hash()"""
+    conn = connection()
     try:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-            (username, password_hash, role)
-        )
-        conn.commit()
+        with conn:
+            conn.execute(
+                "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+                (username, password_hash, role)
+            )
         return True  # **success**
     except sqlite3.IntegrityError:
         return False  # **user exist**
     except Exception as e:
         return e  # **another error**
-    finally:
-        conn.close()
-
-# def add_user(username: str, password: str, role: str = "viewer"):
-#     password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-#     conn = get_connection()
-#     cur = conn.cursor()
-#     cur.execute(
-#         "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-#         (username, password_hash, role)
-#     )
-#     conn.commit()
-#     conn.close()
 
 def get_user(username: str):
-    conn = get_connection()
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username = ?", (username,))
-    row = cur.fetchone()
-    conn.close()
+    row = connection().execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
     return dict(row) if row else None
 
-def verify_password(password: str, password_hash: str) -> bool:
-    return bcrypt.checkpw(password.encode(), password_hash.encode())
-
 # --- users ---
 def list_users():
     """Returns all users with username and role"""
-    conn = get_connection()
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute("SELECT username, role FROM users ORDER BY username")
-    rows = cur.fetchall()
-    conn.close()
+    rows = connection().execute("SELECT username, role FROM users ORDER BY username").fetchall()
     return [dict(row) for row in rows]
 
 def update_user_role(username: str, role: str):
     """Update the user role"""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET role=? WHERE username=?", (role, username))
-    conn.commit()
-    conn.close()
+    conn = connection()
+    with conn:
+        conn.execute("UPDATE users SET role=? WHERE username=?", (role, username))
 
-def update_user_password(username: str, password: str):
-    """Update the user's password"""
-    password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET password_hash=? WHERE username=?", (password_hash, username))
-    conn.commit()
-    conn.close()
+def update_user_password(username: str, password_hash: str):
+    """Update the user's password (already hashed)"""
+    conn = connection()
+    with conn:
+        conn.execute("UPDATE users SET password_hash=? WHERE username=?", (password_hash, username))
 
 def delete_user(username: str):
     """Delete a user"""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM users WHERE username=?", (username,))
-    conn.commit()
-    conn.close()
+    conn = connection()
+    with conn:
+        conn.execute("DELETE FROM users WHERE username=?", (username,))
 
 def users_count():
     """Number of users"""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM users")
-    count = cur.fetchone()[0]
-    conn.close()
-    return count
+    return connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
@@ -0,0 +1,146 @@
+# app/downsample.py
+# Downsampling of metric series for charts: LTTB and min/max/avg buckets
+
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from . import archive, history
+from .history import METRICS
+
+MAX_POINTS = 5000
+
+
+def lttb(t: np.ndarray, y: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last point and,
+    in every bucket between, the point forming the largest triangle with
+    the previously kept point and the average of the next bucket.
+    The choice inside a bucket is one vectorized step; only the walk
+    over buckets (≈ n) is a Python loop. NaN points are dropped first.
+    """
+    keep = ~np.isnan(y)
+    t, y = t[keep].astype(np.float64), y[keep]
+    size = len(t)
+    if n >= size or n < 3:
+        return t, y
+
+    # Bucket edges for the points between the first and the last one:
+    # 1 + floor(i * (size - 2) / (n - 2)), in integers so that no edge
+    # lands one point off through float rounding
+    edges = 1 + np.arange(n - 1, dtype=np.int64) * (size - 2) // (n - 2)
+    # Average of every bucket, for "the next bucket" of each step
+    sums_t = np.add.reduceat(t[1:size - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:size - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_t = np.append(sums_t / counts, t[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs(
+            (t[a] - avg_t[i + 1]) * (y[lo:hi] - y[a])
+            - (t[a] - t[lo:hi]) * (avg_y[i + 1] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+
+    return t[out], y[out]
+
+
+def minmax_buckets(t: np.ndarray, y: np.ndarray, start: float, end: float, n: int) -> Dict[str, np.ndarray]:
+    """
+    `n` equal-time buckets over [start, end]: min / max / avg / count
+    per bucket in one pass of ufunc.reduceat. Empty buckets are left out.
+    """
+    keep = ~np.isnan(y)
+    t, y = t[keep], y[keep]
+    empty = np.empty(0)
+    if not len(t):
+        return {"t": empty, "min": empty, "max": empty, "avg": empty, "count": np.empty(0, dtype=np.int64)}
+
+    width = (end - start) / n
+    bucket = np.clip(((t - start) // width).astype(np.int64), 0, n - 1)
+    # Samples are sorted by time, so every bucket is one contiguous run
+    firsts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    counts = np.diff(np.append(firsts, len(y)))
+    return {
+        "t": start + bucket[firsts] * width,
+        "min": np.minimum.reduceat(y, firsts),
+        "max": np.maximum.reduceat(y, firsts),
+        "avg": np.add.reduceat(y, firsts) / counts,
+        "count": counts,
+    }
+
+
+def load_samples(router: str, start: float, end: float,
+                 metrics: Iterable[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    A router's raw samples over [start, end]: the SQLite history for the
+    recent part, archive segments for anything older than its first row.
+    """
+    metrics = [m for m in metrics if m in METRICS]
+    rows: List[tuple] = []
+    if history.HISTORY_DB_PATH.exists():
+        conn = sqlite3.connect(history.HISTORY_DB_PATH, timeout=30)
+        try:
+            rows = conn.execute(
+                f"SELECT ts, {', '.join(metrics)} FROM samples_raw "
+                f"WHERE router = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                (router, int(start), int(end)),
+            ).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        finally:
+            conn.close()
+
+    data = np.array(rows, dtype=np.float64).reshape(-1, 1 + len(metrics))
+    recent_t = data[:, 0]
+    archive_end = recent_t[0] - 1 if len(recent_t) else end
+
+    old_t, old_values = archive.query(router, start, archive_end, metrics)
+    t = np.concatenate([old_t.astype(np.float64), recent_t])
+    values = {
+        m: np.concatenate([old_values[m], data[:, 1 + i]])
+        for i, m in enumerate(metrics)
+    }
+    return t, values
+
+
+def downsample(router: str, start: float, end: float, points: int,
+               metrics: Optional[Iterable[str]] = None, mode: str = "lttb") -> dict:
+    """Series for charts, at most `points` per metric."""
+    metrics = [m for m in (metrics or METRICS) if m in METRICS]
+    points = max(3, min(int(points), MAX_POINTS))
+    t, values = load_samples(router, start, end, metrics)
+
+    series = {}
+    for m in metrics:
+        if mode == "minmax":
+            buckets = minmax_buckets(t, values[m], start, end, points)
+            series[m] = {k: _json(v) for k, v in buckets.items()}
+        else:
+            st, sy = lttb(t, values[m], points)
+            series[m] = {"t": _json(st), "v": _json(sy)}
+
+    return {
+        "router": router,
+        "start": start,
+        "end": end,
+        "mode": mode,
+        "samples": int(len(t)),
+        "series": series,
+    }
+
+
+def _json(values: np.ndarray) -> list:
+    values = np.asarray(values)
+    if values.dtype.kind in "iu":
+        return values.tolist()
+    values = np.round(values.astype(np.float64), 3)
+    return np.where(np.isnan(values), None, values).tolist()
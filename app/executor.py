@@ -0,0 +1,136 @@
+# app/executor.py
+# Dedicated thread pool for blocking router I/O
+
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+ROUTER_IO_THREADS = int(os.getenv("ROUTER_IO_THREADS", 64))
+# A job that could not get a thread for this long is given up (seconds)
+ROUTER_QUEUE_TIMEOUT = float(os.getenv("ROUTER_QUEUE_TIMEOUT", 60))
+
+
+class QueueClock:
+    """Time one caller spent queued for a free thread: finished waits + the current one."""
+
+    __slots__ = ("total", "_since")
+
+    def __init__(self):
+        self.total = 0.0
+        self._since: Optional[float] = None
+
+    def start_wait(self) -> None:
+        self._since = time.monotonic()
+
+    def stop_wait(self) -> None:
+        if self._since is not None:
+            self.total += time.monotonic() - self._since
+            self._since = None
+
+    def waited(self) -> float:
+        if self._since is None:
+            return self.total
+        return self.total + time.monotonic() - self._since
+
+
+class RouterExecutor:
+    """
+    Thread pool used only for router I/O (librouteros transport),
+    so polling never competes with DB calls for the default executor.
+    Keeps queue depth and wait-time numbers for sizing it.
+    """
+
+    def __init__(self, max_workers: int = ROUTER_IO_THREADS):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="router-io")
+        self.queued = 0
+        self.running = 0
+        self.peak_queued = 0
+        self.jobs = 0
+        self._waits: deque = deque(maxlen=1000)
+
+    async def run(self, fn, *args, clock: Optional[QueueClock] = None):
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+        submitted = time.monotonic()
+
+        def job():
+            loop.call_soon_threadsafe(started.set)
+            return fn(*args)
+
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        if clock is not None:
+            clock.start_wait()
+
+        future = loop.run_in_executor(self._pool, job)
+        waiter = asyncio.ensure_future(started.wait())
+        try:
+            await asyncio.wait({future, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            # Not started yet → the job never runs
+            future.cancel()
+            raise
+        finally:
+            waiter.cancel()
+            self.queued -= 1
+            self._waits.append(time.monotonic() - submitted)
+            if clock is not None:
+                clock.stop_wait()
+
+        self.running += 1
+        self.jobs += 1
+        try:
+            return await future
+        finally:
+            self.running -= 1
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "threads": self.max_workers,
+            "running": self.running,
+            "queued": self.queued,
+            "peak_queued": self.peak_queued,
+            "jobs": self.jobs,
+            "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_p95_ms": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+            "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def wait_for_running(aw, timeout: float, clock: QueueClock):
+    """
+    asyncio.wait_for, except that time spent queued for a router I/O
+    thread does not count against `timeout` (up to ROUTER_QUEUE_TIMEOUT).
+    """
+    task = asyncio.ensure_future(aw)
+    start = time.monotonic()
+    base = clock.waited()
+    try:
+        while True:
+            queued = clock.waited() - base
+            remaining = timeout - (time.monotonic() - start - queued)
+            if remaining <= 0 or queued >= ROUTER_QUEUE_TIMEOUT:
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+                raise asyncio.TimeoutError()
+
+            done, _ = await asyncio.wait({task}, timeout=remaining)
+            if done:
+                return task.result()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+ROUTER_EXECUTOR = RouterExecutor()
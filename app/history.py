@@ -0,0 +1,333 @@
+# app/history.py
+# Metric history in SQLite: raw samples + 1-minute / 1-hour rollups
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DB_PATH = Path(os.getenv("HISTORY_DB_PATH", Path(__file__).resolve().parent / "history.db"))
+
+# Numeric status fields that are kept
+METRICS = ("cpu_load", "temperature", "voltage", "free_memory", "free_hdd", "rx_bps", "tx_bps")
+
+# Retention per table (days)
+RAW_RETENTION_DAYS = float(os.getenv("HISTORY_RAW_DAYS", 2))
+MINUTE_RETENTION_DAYS = float(os.getenv("HISTORY_1M_DAYS", 30))
+HOUR_RETENTION_DAYS = float(os.getenv("HISTORY_1H_DAYS", 730))
+
+HISTORY_BATCH = 500           # samples per transaction at most
+HISTORY_FLUSH_INTERVAL = 1.0  # a partial batch waits at most this long (seconds)
+HISTORY_QUEUE_SIZE = 100_000  # samples waiting for the writer; more are dropped
+EXPIRE_INTERVAL = 3600        # how often old rows are deleted (seconds)
+
+# name -> (table, bucket seconds, retention seconds); raw has no bucket
+TABLES = {
+    "raw": ("samples_raw", None, RAW_RETENTION_DAYS * 86400),
+    "1m": ("samples_1m", 60, MINUTE_RETENTION_DAYS * 86400),
+    "1h": ("samples_1h", 3600, HOUR_RETENTION_DAYS * 86400),
+}
+# Widest range each resolution is picked for automatically; points per range stay in the thousands
+AUTO_RESOLUTION = (("raw", 6 * 3600), ("1m", 7 * 86400), ("1h", float("inf")))
+
+Sample = Tuple[str, int, Tuple[Optional[float], ...]]
+
+
+# =========================
+# Schema / statements
+# =========================
+
+def _schema() -> str:
+    raw_cols = ", ".join(f"{m} REAL" for m in METRICS)
+    rollup_cols = ", ".join(
+        f"{m}_n INTEGER NOT NULL DEFAULT 0, {m}_sum REAL, {m}_min REAL, {m}_max REAL" for m in METRICS
+    )
+    return f"""
+        CREATE TABLE IF NOT EXISTS samples_raw (
+            router TEXT NOT NULL, ts INTEGER NOT NULL, {raw_cols},
+            PRIMARY KEY (router, ts)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS samples_1m (
+            router TEXT NOT NULL, ts INTEGER NOT NULL, {rollup_cols},
+            PRIMARY KEY (router, ts)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS samples_1h (
+            router TEXT NOT NULL, ts INTEGER NOT NULL, {rollup_cols},
+            PRIMARY KEY (router, ts)
+        ) WITHOUT ROWID;
+    """
+
+
+def _insert_raw_sql() -> str:
+    cols = ", ".join(METRICS)
+    marks = ", ".join("?" for _ in METRICS)
+    # A second sample in the same second is dropped, not folded into the rollups twice
+    return f"INSERT OR IGNORE INTO samples_raw (router, ts, {cols}) VALUES (?, ?, {marks})"
+
+
+def _upsert_rollup_sql(table: str) -> str:
+    """
+    One sample folded into its bucket: count/sum/min/max per metric.
+    NULL values (metric not reported) leave the metric's aggregate as it is.
+    """
+    cols, values, updates = [], [], []
+    for m in METRICS:
+        cols += [f"{m}_n", f"{m}_sum", f"{m}_min", f"{m}_max"]
+        values += ["(? IS NOT NULL)", "?", "?", "?"]
+        updates += [
+            f"{m}_n = {m}_n + excluded.{m}_n",
+            f"{m}_sum = COALESCE({m}_sum, 0) + COALESCE(excluded.{m}_sum, 0)",
+            f"{m}_min = MIN(COALESCE({m}_min, excluded.{m}_min), COALESCE(excluded.{m}_min, {m}_min))",
+            f"{m}_max = MAX(COALESCE({m}_max, excluded.{m}_max), COALESCE(excluded.{m}_max, {m}_max))",
+        ]
+    return (
+        f"INSERT INTO {table} (router, ts, {', '.join(cols)}) "
+        f"VALUES (?, ?, {', '.join(values)}) "
+        f"ON CONFLICT (router, ts) DO UPDATE SET {', '.join(updates)}"
+    )
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(HISTORY_DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def sample_from_status(status: dict) -> Tuple[Optional[float], ...]:
+    """Metric values of one poll, in METRICS order (None if not reported)."""
+    values = []
+    for m in METRICS:
+        v = status.get(m)
+        values.append(float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else None)
+    return tuple(values)
+
+
+# =========================
+# Writer
+# =========================
+
+class HistoryStore:
+    """
+    Every poll is queued with `record` (never blocks the poller); one
+    writer task batches the queue into a single transaction that inserts
+    the raw rows and folds them into the 1m / 1h rollups. All writes go
+    through one thread and one connection, reads use their own
+    connections (WAL lets them run next to the writer).
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-writer")
+        self._conn: Optional[sqlite3.Connection] = None
+        # Samples taken off the queue but not handed to the writer thread yet
+        self._batch: List[Sample] = []
+        self._last_expire = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    # --- Lifecycle ---
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=HISTORY_QUEUE_SIZE)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write what is still queued, then close."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        batch, self._batch = self._drain(self._batch), []
+        while batch:
+            await self._write(batch)
+            batch = self._drain([])
+        await asyncio.get_running_loop().run_in_executor(self._pool, self._close)
+
+    def record(self, router: str, status: dict, ts: Optional[float] = None) -> None:
+        if self._queue is None:
+            return
+        sample = (router, int(ts if ts is not None else time.time()), sample_from_status(status))
+        try:
+            self._queue.put_nowait(sample)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    # --- Writer task ---
+
+    async def _run(self) -> None:
+        while True:
+            batch = self._batch = [await self._queue.get()]
+            deadline = time.monotonic() + HISTORY_FLUSH_INTERVAL
+            while len(batch) < HISTORY_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            self._drain(batch)
+            self._batch = []
+
+            try:
+                await self._write(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("History write of %d samples failed: %s", len(batch), e)
+
+    def _drain(self, batch: List[Sample]) -> List[Sample]:
+        while len(batch) < HISTORY_BATCH and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _write(self, batch: List[Sample]) -> None:
+        expire = time.monotonic() - self._last_expire >= EXPIRE_INTERVAL
+        if expire:
+            self._last_expire = time.monotonic()
+        await asyncio.get_running_loop().run_in_executor(self._pool, self._write_sync, batch, expire)
+        self.written += len(batch)
+        self.batches += 1
+
+    # --- Writer thread ---
+
+    def _write_sync(self, batch: List[Sample], expire: bool) -> None:
+        if self._conn is None:
+            self._conn = _connect()
+            self._conn.executescript(_schema())
+
+        insert_raw = _insert_raw_sql()
+        with self._conn:
+            # Only samples whose raw row was inserted are folded, so the
+            # rollups count exactly what the raw table holds
+            inserted = [
+                (router, ts, values) for router, ts, values in batch
+                if self._conn.execute(insert_raw, (router, ts, *values)).rowcount == 1
+            ]
+            for key in ("1m", "1h"):
+                table, bucket, _ = TABLES[key]
+                self._conn.executemany(_upsert_rollup_sql(table), [
+                    (router, ts - ts % bucket, *_rollup_args(values))
+                    for router, ts, values in inserted
+                ])
+
+        if expire:
+            self._expire_sync()
+
+    def _expire_sync(self) -> None:
+        """Drop rows past retention, router by router so the primary key is used."""
+        now = int(time.time())
+        with self._conn:
+            for table, _, retention in TABLES.values():
+                cutoff = now - int(retention)
+                routers = [r for (r,) in self._conn.execute(f"SELECT DISTINCT router FROM {table}")]
+                for router in routers:
+                    self._conn.execute(f"DELETE FROM {table} WHERE router = ? AND ts < ?", (router, cutoff))
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+        }
+
+
+def _rollup_args(values: Sequence[Optional[float]]) -> List[Optional[float]]:
+    args = []
+    for v in values:
+        args += [v, v, v, v]
+    return args
+
+
+# =========================
+# Queries
+# =========================
+
+def pick_resolution(start: float, end: float) -> str:
+    span = end - start
+    for name, widest in AUTO_RESOLUTION:
+        if span <= widest:
+            return name
+    return "1h"
+
+
+def query_series(router: str, start: float, end: float,
+                 resolution: Optional[str] = None,
+                 metrics: Optional[Iterable[str]] = None) -> dict:
+    """
+    One router's series for [start, end] (unix seconds), column-oriented
+    for charts. Rollups give avg/min/max per bucket, raw gives values.
+    The resolution is picked from the range width if not given.
+    """
+    resolution = resolution or pick_resolution(start, end)
+    if resolution not in TABLES:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    metrics = [m for m in (metrics or METRICS) if m in METRICS]
+    table, bucket, _ = TABLES[resolution]
+
+    if bucket is None:
+        columns = metrics
+    else:
+        columns = []
+        for m in metrics:
+            columns += [f"{m}_sum / NULLIF({m}_n, 0)", f"{m}_min", f"{m}_max"]
+    select = ", ".join(["ts"] + columns) if columns else "ts"
+
+    if not HISTORY_DB_PATH.exists():
+        rows = []
+    else:
+        conn = sqlite3.connect(HISTORY_DB_PATH, timeout=30)
+        try:
+            rows = conn.execute(
+                f"SELECT {select} FROM {table} WHERE router = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                (router, int(start), int(end)),
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # No sample written yet: tables do not exist
+            rows = []
+        finally:
+            conn.close()
+
+    result = {
+        "router": router,
+        "resolution": resolution,
+        "step": bucket,
+        "t": [row[0] for row in rows],
+    }
+    if bucket is None:
+        result["values"] = {m: [row[1 + i] for row in rows] for i, m in enumerate(metrics)}
+    else:
+        result["avg"] = {m: [row[1 + 3 * i] for row in rows] for i, m in enumerate(metrics)}
+        result["min"] = {m: [row[2 + 3 * i] for row in rows] for i, m in enumerate(metrics)}
+        result["max"] = {m: [row[3 + 3 * i] for row in rows] for i, m in enumerate(metrics)}
+    return result
+
+
+async def get_series(router: str, start: float, end: float,
+                     resolution: Optional[str] = None,
+                     metrics: Optional[Iterable[str]] = None) -> dict:
+    return await asyncio.to_thread(query_series, router, start, end, resolution, metrics)
+
+
+HISTORY = HistoryStore()
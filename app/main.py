@@ -2,6 +2,7 @@
 # FastAPI entry point, lifespan
 
 import asyncio
+import json
 import os
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -14,10 +15,15 @@ from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.websockets import WebSocketDisconnect
 
-from .state import update_status_periodically, connected_websockets, router_manager
+from .state import update_status_periodically, broadcaster, router_manager
 from .notifications import start_telegram_worker, stop_telegram_worker
 from .pages import WS_TOKENS, register_pages
-from .db import init_db
+from .auth import PASSWORDS
+from .db import DB, init_db
+from .executor import ROUTER_EXECUTOR
+from .history import HISTORY
+from .archive import compaction_loop
+from .broadcast import ALL, Subscription
 
 
 
@@ -43,11 +49,16 @@ async def lifespan(app: App) -> AsyncIterator[None]:
 
     init_db()
     await router_manager.load()
+    HISTORY.start()
 
     task = asyncio.create_task(
         update_status_periodically(app.state.shutdown_event)
     )
     app.state.background_tasks.append(task)
+    # Seal old history into archive segments
+    app.state.background_tasks.append(
+        asyncio.create_task(compaction_loop(app.state.shutdown_event))
+    )
     # Start Telegram Worker
     start_telegram_worker()
 
@@ -57,19 +68,17 @@ async def lifespan(app: App) -> AsyncIterator[None]:
         # ===== SHUTDOWN =====
         app.state.shutdown_event.set()
 
-        for ws in list(connected_websockets):
-            try:
-                await ws.close(code=1001)
-            except Exception as e:
-                print(f"WS close error: {e}")
-
-        connected_websockets.clear()
+        await broadcaster.close(code=1001)
 
         for task in app.state.background_tasks:
             task.cancel()
 
         await asyncio.gather(*app.state.background_tasks, return_exceptions=True)
         await router_manager.shutdown()
+        ROUTER_EXECUTOR.shutdown()
+        await HISTORY.stop()
+        DB.shutdown()
+        PASSWORDS.shutdown()
         # Stop Telegram Worker
         await stop_telegram_worker()
 
@@ -108,14 +117,34 @@ async def ws_status(ws: WebSocket):
 
     user, _ = entry  # validated
 
+    # Optional initial subset: ?names=a,b | prefix= | search= | page=&page_size=
+    try:
+        sub = Subscription.parse(ws.query_params)
+    except ValueError:
+        sub = ALL
+
     await ws.accept()
-    connected_websockets.add(ws)
+
+    # Full state first, then deltas; sending happens in the broadcaster
+    broadcaster.add(ws, sub)
 
     try:
         while True:
-            await ws.receive_text()
+            try:
+                message = json.loads(await ws.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+            if message.get("type") == "resync":
+                broadcaster.resync(ws)
+            elif message.get("type") == "subscribe":
+                try:
+                    broadcaster.subscribe(ws, Subscription.parse(message))
+                except (TypeError, ValueError):
+                    broadcaster.send_error(ws, "invalid subscription")
     except WebSocketDisconnect:
         pass
     finally:
-        connected_websockets.discard(ws)
+        broadcaster.remove(ws)
 
@@ -1,9 +1,67 @@
+import os
 import re
 import time
+import asyncio
+import logging
 import ipaddress
+from typing import Dict, Optional, Tuple
 from librouteros import connect
-from librouteros.exceptions import TrapError
-
+from librouteros.exceptions import ConnectionClosed, TrapError
+from librouteros.protocol import cast_to_api
+
+from .executor import ROUTER_EXECUTOR, QueueClock
+from .routeros import RouterOSClient
+
+logger = logging.getLogger(__name__)
+
+# "asyncio" - native client (app/routeros.py), "librouteros" - blocking client in threads
+ROUTEROS_TRANSPORT = os.getenv("ROUTEROS_TRANSPORT", "asyncio").strip().lower()
+
+# --- Timeouts (seconds), enforced on the socket ---
+CONNECT_TIMEOUT = float(os.getenv("ROUTER_CONNECT_TIMEOUT", 3))
+READ_TIMEOUT = float(os.getenv("ROUTER_READ_TIMEOUT", 4))
+
+# --- Circuit breaker ---
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 3))      # failed polls in a row → open
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", 30))          # open → half-open after (seconds)
+# router name -> CircuitBreaker
+ROUTER_BREAKERS: Dict[str, "CircuitBreaker"] = {}
+
+# --- Counters shared by all connections of a router ---
+# router name -> connections opened (for statistics, if we have some unstable router)
+ROUTER_RECONNECTS: Dict[str, int] = {}
+# Round trips sent / avoided by the poll cache (totals)
+ROUND_TRIPS = {"sent": 0, "saved": 0}
+
+# --- WAN counters between polls ---
+# router name -> (iface, rx-byte, tx-byte, monotonic time, rx bps, tx bps)
+WAN_COUNTERS: Dict[str, Tuple[str, int, int, float, Optional[int], Optional[int]]] = {}
+# Polls closer than this keep the previous baseline and report the last
+# computed rate again (a rate over so short a span would be mostly noise)
+MIN_RATE_INTERVAL = 0.5
+
+# --- Tiered collection ---
+# Slow-changing facts are re-read only when their TTL (seconds) expires.
+# The fast tier (cpu, memory, health, WAN rate) is collected every poll;
+# board and version come with /system/resource, which is read every poll anyway.
+TIER_TTLS = {
+    "services": int(os.getenv("TIER_TTL_SERVICES", 600)),   # webfig proto/port
+    "wan_ip": int(os.getenv("TIER_TTL_WAN_IP", 300)),       # external IPv4
+}
+# router name -> TierCache
+ROUTER_TIERS: Dict[str, "TierCache"] = {}
+
+# --- Columns requested per path (.proplist) ---
+RESOURCE_PROPS = (
+    "uptime", "board-name", "version",
+    "cpu-frequency", "cpu-load",
+    "free-memory", "total-memory", "free-hdd-space", "total-hdd-space",
+    "temperature", "voltage",
+)
+# v7 rows are name/value pairs, v6 is one row with named columns
+HEALTH_PROPS = ("name", "value", "temperature", "voltage")
+ROUTE_PROPS = ("dst-address", "routing-table", "gateway", "interface", "immediate-gw")
+COUNTER_PROPS = ("name", "rx-byte", "tx-byte")
 
 
 def is_private_ipv4(ip: str) -> bool:
@@ -51,6 +109,259 @@ def format_uptime(uptime_str: str) -> str:
 
     return " ".join(parts)
 
+def query_words(where: Optional[dict] = None, props=None) -> Tuple[str, ...]:
+    """
+    Server-side filter and projection words for a print command.
+
+    where: {"name": "ether1"} -> ?name=ether1, conditions are AND-ed;
+           a tuple value matches any of its items: {"name": ("www", "www-ssl")}.
+    props: only these columns cross the wire (=.proplist=).
+    """
+    words = []
+    for key, value in (where or {}).items():
+        if isinstance(value, tuple):
+            words.extend(f"?{key}={cast_to_api(v)}" for v in value)
+            # OR the alternatives together
+            words.extend("?#|" for _ in value[1:])
+        else:
+            words.append(f"?{key}={cast_to_api(value)}")
+    if props:
+        words.append("=.proplist=" + ",".join(props))
+    return tuple(words)
+
+
+def uptime_seconds(uptime_str: str) -> int:
+    """RouterOS uptime ("1w2d3h4m5s") in seconds."""
+    units = {"w": 604800, "d": 86400, "h": 3600, "m": 60, "s": 1}
+    return sum(
+        int(val) * units[unit]
+        for val, unit in re.findall(r'(\d+)([wdhms])', (uptime_str or "").lower())
+    )
+
+
+class TierCache:
+    """
+    Per-router values of the slow tiers with their expiry time.
+    A reboot (uptime going backwards) drops every tier,
+    a changed default route drops the WAN IP tier.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[float, object]] = {}
+        self.uptime: Optional[int] = None
+        self.default_route: Optional[tuple] = None
+
+    def get(self, tier: str, now: Optional[float] = None):
+        entry = self._values.get(tier)
+        now = time.monotonic() if now is None else now
+        if entry is None or entry[0] <= now:
+            return None
+        return entry[1]
+
+    def put(self, tier: str, value, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        self._values[tier] = (now + TIER_TTLS[tier], value)
+
+    def invalidate(self, *tiers: str) -> None:
+        for tier in tiers or list(self._values):
+            self._values.pop(tier, None)
+
+    def observe_uptime(self, seconds: int) -> bool:
+        """Returns True if the router rebooted since the previous poll."""
+        rebooted = self.uptime is not None and seconds < self.uptime
+        self.uptime = seconds
+        if rebooted:
+            self.invalidate()
+        return rebooted
+
+    def observe_default_route(self, route: Optional[dict]) -> bool:
+        """Returns True if the default route differs from the previous poll."""
+        key = None
+        if route:
+            key = (route.get("gateway"), route.get("interface"), route.get("immediate-gw"))
+        changed = self.default_route is not None and key != self.default_route
+        self.default_route = key
+        if changed:
+            self.invalidate("wan_ip")
+        return changed
+
+
+class CircuitBreaker:
+    """
+    closed    - polls go through
+    open      - polls are rejected without touching the network
+    half-open - after BREAKER_RESET one probe poll is let through;
+                success closes the breaker, failure opens it again
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0  # polls skipped while open (total)
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+def counter_delta(prev: int, curr: int) -> Optional[int]:
+    """
+    Bytes passed between two readings of an interface counter.
+    None if the counter was reset (reboot, /interface reset-counters).
+    """
+    if curr >= prev:
+        return curr - prev
+    # 32-bit counter wrapped (older RouterOS, some switch chips)
+    if prev < 2 ** 32 and prev >= 2 ** 31:
+        return curr + 2 ** 32 - prev
+    return None
+
+
+def wan_rate(key: str, iface: str, rx: int, tx: int, now: Optional[float] = None):
+    """
+    rx/tx bits per second since the previous poll of this router.
+    Returns (None, None) on the first reading, after an interface change
+    or a counter reset - the new reading becomes the baseline.
+    A poll within MIN_RATE_INTERVAL of the baseline returns the last rate.
+    """
+    now = time.monotonic() if now is None else now
+    prev = WAN_COUNTERS.get(key)
+
+    if prev and prev[0] == iface and now - prev[3] < MIN_RATE_INTERVAL:
+        return prev[4], prev[5]
+
+    rates = (None, None)
+    if prev and prev[0] == iface:
+        _, prev_rx, prev_tx, prev_ts, _, _ = prev
+        elapsed = now - prev_ts
+        rx_delta = counter_delta(prev_rx, rx)
+        tx_delta = counter_delta(prev_tx, tx)
+        if rx_delta is not None and tx_delta is not None and elapsed > 0:
+            rates = (int(rx_delta * 8 / elapsed), int(tx_delta * 8 / elapsed))
+
+    WAN_COUNTERS[key] = (iface, rx, tx, now, *rates)
+    return rates
+
+
+def reset_router_state(key: str) -> None:
+    """
+    The router behind `key` may have changed (new host or credentials):
+    drop what was learned from the old one - tiers, WAN baseline, breaker.
+    """
+    ROUTER_TIERS.pop(key, None)
+    WAN_COUNTERS.pop(key, None)
+    ROUTER_BREAKERS.pop(key, None)
+
+
+def forget_router(key: str) -> None:
+    """Router removed: drop all of its shared state."""
+    reset_router_state(key)
+    ROUTER_RECONNECTS.pop(key, None)
+
+
+def format_wan(data):
+    """(iface, "rx/tx" kbps string) for the dashboard."""
+    if not data:
+        return None, None
+    if data["rx_kbps"] is None:
+        return data["iface"], None
+    # speed = f"rx: {data['rx_kbps']} kbps / tx: {data['tx_kbps']} kbps"
+    return data["iface"], f"{data['rx_kbps']}/{data['tx_kbps']}"
+
+
+class PollCache:
+    """
+    Responses of one status collection, keyed by command + words.
+    Concurrent requests for the same key share one round trip.
+    """
+
+    def __init__(self):
+        self._responses: Dict[tuple, asyncio.Future] = {}
+        self.fetched = 0
+        self.saved = 0
+
+    async def get(self, key, fetch):
+        future = self._responses.get(key)
+        if future is not None:
+            self.saved += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._responses[key] = future
+        self.fetched += 1
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved: waiters (if any) re-raise it themselves
+            raise
+        future.set_result(result)
+        return result
+
+
+class ThreadedApi:
+    """
+    librouteros connection behind the same interface as RouterOSClient.
+    Blocking calls run on ROUTER_EXECUTOR, one at a time (the socket is not shared-safe).
+    """
+
+    def __init__(self, api, clock: Optional[QueueClock] = None):
+        self._api = api
+        self._lock = asyncio.Lock()
+        self._clock = clock
+        self.closed = False
+
+    @classmethod
+    async def connect(cls, host, username, password, port=8728, clock: Optional[QueueClock] = None):
+        def _connect():
+            api = connect(
+                host=host,
+                username=username,
+                password=password,
+                port=port,
+                timeout=CONNECT_TIMEOUT,
+            )
+            # socket timeout from now on bounds every read
+            api.protocol.transport.sock.settimeout(READ_TIMEOUT)
+            return api
+
+        return cls(await ROUTER_EXECUTOR.run(_connect, clock=clock), clock=clock)
+
+    async def call(self, command, *words):
+        async with self._lock:
+            return await ROUTER_EXECUTOR.run(
+                lambda: list(self._api.rawCmd(command, *words)),
+                clock=self._clock,
+            )
+
+    def close(self):
+        self.closed = True
+        self._api.close()
+
+
 class RouterAPI:
     def __init__(self, host, username, password, port=8728, name=None):
         self.host = host
@@ -59,30 +370,66 @@ class RouterAPI:
         self.port = port
         self.api = None
         self.name = name
-        self.reconnects = 0
-
-    def connect(self):
-        """Synchronous connection. Called internally to_thread."""
+        self._connect_lock = asyncio.Lock()
+        # Time spent waiting for a router I/O thread (librouteros transport)
+        self.io_clock = QueueClock()
+        # Set only while get_status runs
+        self._poll_cache: Optional[PollCache] = None
+
+    @property
+    def key(self):
+        """Key of the per-router state shared by all connections (tiers, counters, breaker)."""
+        return self.name or self.host
+
+    @property
+    def reconnects(self) -> int:
+        return ROUTER_RECONNECTS.get(self.key, 0)
+
+    @property
+    def connected(self) -> bool:
+        return self.api is not None and not self.api.closed
+
+    async def connect(self):
         try:
-            self.api = connect(
-                host=self.host,
-                username=self.username,
-                password=self.password,
-                port=self.port,
-            )
+            if ROUTEROS_TRANSPORT == "librouteros":
+                self.api = await ThreadedApi.connect(
+                    host=self.host,
+                    username=self.username,
+                    password=self.password,
+                    port=self.port,
+                    clock=self.io_clock,
+                )
+            else:
+                self.api = await RouterOSClient.connect(
+                    host=self.host,
+                    username=self.username,
+                    password=self.password,
+                    port=self.port,
+                    timeout=READ_TIMEOUT,
+                    connect_timeout=CONNECT_TIMEOUT,
+                )
         except Exception:
             self.api = None
 
-    def ensure_connected(self):
-        if self.api is None:
-            # Increase the reconnection counter, for statistics (if we have some unstable router)
-            self.reconnects += 1
-            self.connect()
+    async def ensure_connected(self):
+        async with self._connect_lock:
+            if self.api is not None and self.api.closed:
+                # Dropped by the router or the network
+                self.close()
+            if self.api is None:
+                await self.connect()
 
-    def close(self):
-        """Carefully close the connection."""
+    def close(self, lost: bool = True):
+        """
+        Carefully close the connection.
+        `lost`: an established connection failed; it is counted as a reconnect
+        (for statistics, if we have some unstable router). Connections retired
+        by the pool (idle, shutdown) are not.
+        """
         try:
             if self.api is not None:
+                if lost:
+                    ROUTER_RECONNECTS[self.key] = self.reconnects + 1
                 try:
                     self.api.close()
                 except Exception:
@@ -90,13 +437,73 @@ class RouterAPI:
         finally:
             self.api = None
 
-    def get_temperature_and_voltage(self):
+    async def _call(self, command, *words):
+        api = self.api
+        if api is None:
+            raise ConnectionClosed("Not connected")
+
+        cache = self._poll_cache
+        if cache is not None and command.endswith("/print"):
+            return await cache.get((command, *words), lambda: api.call(command, *words))
+        return await api.call(command, *words)
+
+    async def _print(self, *path, where=None, props=None):
+        """Rows of `/<path>/print`, filtered and projected on the router (see query_words)."""
+        return await self._call("/" + "/".join(path) + "/print", *query_words(where, props))
+
+    async def _first(self, *path, where=None, props=None):
+        rows = await self._print(*path, where=where, props=props)
+        return rows[0] if rows else None
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        key = self.key
+        breaker = ROUTER_BREAKERS.get(key)
+        if breaker is None:
+            breaker = ROUTER_BREAKERS[key] = CircuitBreaker()
+        return breaker
+
+    @property
+    def tiers(self) -> TierCache:
+        key = self.key
+        tiers = ROUTER_TIERS.get(key)
+        if tiers is None:
+            tiers = ROUTER_TIERS[key] = TierCache()
+        return tiers
+
+    async def _tier(self, tier, collect):
+        """Value of a slow tier: cached until its TTL expires, None is never cached."""
+        value = self.tiers.get(tier)
+        if value is None:
+            value = await collect()
+            if value is not None:
+                self.tiers.put(tier, value)
+        return value
+
+    async def _default_route(self):
+        """Default route of the main table (first match) or None."""
+        routes = await self._print("ip", "route", where={"dst-address": "0.0.0.0/0"}, props=ROUTE_PROPS)
+        for r in routes:
+            if r.get("dst-address") == "0.0.0.0/0" and r.get("routing-table") in (None, "main"):
+                # Take the first one that suits you
+                return r
+        return None
+
+    async def ping(self) -> bool:
+        """Cheap liveness check of an idle connection."""
+        try:
+            await self._call("/system/identity/print")
+            return True
+        except Exception:
+            return False
+
+    async def get_temperature_and_voltage(self):
         temperature = None
         voltage = None
 
         # New v7: /system/health
         try:
-            for item in self.api.path("system", "health"):
+            for item in await self._print("system", "health", props=HEALTH_PROPS):
                 name = str(item.get("name", "")).lower()
                 value = item.get("value")
                 try:
@@ -114,7 +521,7 @@ class RouterAPI:
 
         # Old v6
         try:
-            health = next(iter(self.api.path("system", "health")), None)
+            health = await self._first("system", "health", props=HEALTH_PROPS)
             if health:
                 if "voltage" in health:
                     try:
@@ -133,7 +540,7 @@ class RouterAPI:
 
         # Fallback — /system/resource
         try:
-            resource = next(iter(self.api.path("system", "resource")), None)
+            resource = await self._first("system", "resource", props=RESOURCE_PROPS)
             if resource:
                 if "voltage" in resource:
                     try:
@@ -150,14 +557,14 @@ class RouterAPI:
 
         return temperature, voltage
 
-    def get_external_ipv4(self):
-        self.ensure_connected()
+    async def get_external_ipv4(self):
+        await self.ensure_connected()
         if not self.api:
             return None
 
         # 1. Trying to take an IP from /ip cloud (RouterOS 6/7)
         try:
-            cloud = next(iter(self.api.path("ip", "cloud")), None)
+            cloud = await self._first("ip", "cloud", props=("public-address",))
             if cloud:
                 ip = cloud.get("public-address")
                 # MikroTik sometimes returns 0.0.0.0 while undecided
@@ -170,12 +577,7 @@ class RouterAPI:
         # 2. Fallback: trying to determine default route + interfaces
         try:
             # 2.1 Looking for default route in main
-            default_route = None
-            for r in self.api.path("ip", "route"):
-                if r.get("dst-address") == "0.0.0.0/0" and r.get("routing-table") in (None, "main"):
-                    # Take the first one that suits you
-                    default_route = r
-                    break
+            default_route = await self._default_route()
 
             if not default_route:
                 return None
@@ -192,7 +594,12 @@ class RouterAPI:
 
             # 2.2 PPPoE WAN
             try:
-                for ppp in self.api.path("interface", "pppoe-client"):
+                ppps = await self._print(
+                    "interface", "pppoe-client",
+                    where={"name": iface} if iface else None,
+                    props=("name", "running", "address"),
+                )
+                for ppp in ppps:
                     # if iface is known — filter
                     if iface and ppp.get("name") != iface:
                         continue
@@ -205,7 +612,12 @@ class RouterAPI:
 
             # 2.3 LTE WAN
             try:
-                for lte in self.api.path("interface", "lte"):
+                ltes = await self._print(
+                    "interface", "lte",
+                    where={"name": iface} if iface else None,
+                    props=("name", "running", "address"),
+                )
+                for lte in ltes:
                     if iface and lte.get("name") != iface:
                         continue
                     if lte.get("running"):
@@ -217,7 +629,12 @@ class RouterAPI:
 
             # 2.4 DHCP client
             try:
-                for dhcp in self.api.path("ip", "dhcp-client"):
+                dhcps = await self._print(
+                    "ip", "dhcp-client",
+                    where={"interface": iface} if iface else None,
+                    props=("interface", "status-address"),
+                )
+                for dhcp in dhcps:
                     if iface and dhcp.get("interface") != iface:
                         continue
                     ip = dhcp.get("status-address")
@@ -229,7 +646,12 @@ class RouterAPI:
             # 2.5 Static IP / VLAN WAN — classic /ip address
             try:
                 if iface:
-                    for addr in self.api.path("ip", "address"):
+                    addrs = await self._print(
+                        "ip", "address",
+                        where={"interface": iface},
+                        props=("interface", "address"),
+                    )
+                    for addr in addrs:
                         if addr.get("interface") == iface:
                             ip = addr.get("address", "").split("/")[0]
                             if ip and ip != "0.0.0.0":
@@ -249,12 +671,17 @@ class RouterAPI:
         except Exception:
             return None
 
-    def _resolve_iface_via_arp(self, gateway):
+    async def _resolve_iface_via_arp(self, gateway):
         if not gateway or gateway.replace(".", "").isdigit() is False:
             return None
 
         try:
-            for arp in self.api.path("ip", "arp"):
+            arps = await self._print(
+                "ip", "arp",
+                where={"address": gateway},
+                props=("address", "interface"),
+            )
+            for arp in arps:
                 if arp.get("address") == gateway:
                     return arp.get("interface")
         except:
@@ -262,7 +689,7 @@ class RouterAPI:
 
         return None
 
-    def _get_interface_stats(self, iface):
+    async def _get_interface_stats(self, iface):
         """
                 Returns rx-byte, tx-byte for the interface.
                 Searches in several places: interface, ethernet, switch.
@@ -274,7 +701,7 @@ class RouterAPI:
             return int(str(v).replace(" ", ""))
 
         # 1. /interface
-        for i in self.api.path("interface"):
+        for i in await self._print("interface", where={"name": iface}, props=COUNTER_PROPS):
             if i.get("name") == iface:
                 rx = clean(i.get("rx-byte"))
                 tx = clean(i.get("tx-byte"))
@@ -283,7 +710,7 @@ class RouterAPI:
 
         # 2. /interface ethernet
         try:
-            for i in self.api.path("interface", "ethernet"):
+            for i in await self._print("interface", "ethernet", where={"name": iface}, props=COUNTER_PROPS):
                 if i.get("name") == iface:
                     rx = clean(i.get("rx-byte"))
                     tx = clean(i.get("tx-byte"))
@@ -294,7 +721,7 @@ class RouterAPI:
 
         # 3. /interface ethernet switch (some CRS)
         try:
-            for i in self.api.path("interface", "ethernet", "switch"):
+            for i in await self._print("interface", "ethernet", "switch", where={"name": iface}, props=COUNTER_PROPS):
                 if i.get("name") == iface:
                     rx = clean(i.get("rx-byte"))
                     tx = clean(i.get("tx-byte"))
@@ -305,18 +732,14 @@ class RouterAPI:
 
         return None, None
 
-    def get_wan_rxtx(self):
-        self.ensure_connected()
+    async def get_wan_rxtx(self):
+        await self.ensure_connected()
         if not self.api:
             return None
 
         try:
             # 1. Find default route
-            default_route = None
-            for r in self.api.path("ip", "route"):
-                if r.get("dst-address") == "0.0.0.0/0" and r.get("routing-table") in (None, "main"):
-                    default_route = r
-                    break
+            default_route = await self._default_route()
 
             if not default_route:
                 return None
@@ -330,7 +753,7 @@ class RouterAPI:
 
             # If the interface is empty, try ARP
             if not iface:
-                iface = self._resolve_iface_via_arp(gateway)
+                iface = await self._resolve_iface_via_arp(gateway)
 
             # If the interface is strange (*D) - try immediate-gw
             if not iface or iface.startswith("*"):
@@ -341,21 +764,20 @@ class RouterAPI:
             if not iface:
                 return None
 
-            # 2. Get the first counters
-            rx1, tx1 = self._get_interface_stats(iface)
-            if rx1 is None:
+            # 2. Get the counters (one reading per poll)
+            rx, tx = await self._get_interface_stats(iface)
+            if rx is None:
                 return None
 
-            time.sleep(1)
-
-            # 3. Get the second counters
-            rx2, tx2 = self._get_interface_stats(iface)
-            if rx2 is None:
-                return None
-
-            # 4. Calculate the speed
-            rx_bps = (rx2 - rx1) * 8
-            tx_bps = (tx2 - tx1) * 8
+            # 3. Speed from the previous poll's counters
+            rx_bps, tx_bps = wan_rate(self.key, iface, rx, tx)
+            if rx_bps is None:
+                return {
+                    "iface": iface,
+                    "rx_bps": None, "tx_bps": None,
+                    "rx_kbps": None, "tx_kbps": None,
+                    "rx_mbps": None, "tx_mbps": None,
+                }
 
             return {
                 "iface": iface,
@@ -370,18 +792,11 @@ class RouterAPI:
         except Exception:
             return None
 
-    def get_wan_info(self):
-        data = self.get_wan_rxtx()
-        if not data:
-            return None, None
-
-        iface = data["iface"]
-        # speed = f"rx: {data['rx_kbps']} kbps / tx: {data['tx_kbps']} kbps"
-        speed = f"{data['rx_kbps']}/{data['tx_kbps']}"
-        return iface, speed
+    async def get_wan_info(self):
+        return format_wan(await self.get_wan_rxtx())
 
 
-    def get_logs(self, count=100):
+    async def get_logs(self, count=100):
         """
         Returns a list of dictionaries in a SINGLE format:
         {
@@ -395,13 +810,13 @@ class RouterAPI:
         result = []
 
         try:
-            self.ensure_connected()
+            await self.ensure_connected()
             if not self.api:
                 return []
 
             # --- MEMORY LOG ---
             try:
-                logs = list(self.api(cmd="/log/print"))
+                logs = await self._print("log", props=("time", "topics", "message"))
                 if isinstance(logs, list) and logs:
                     for item in logs[-count:]:
                         if not isinstance(item, dict):
@@ -426,7 +841,7 @@ class RouterAPI:
 
             # --- DISK LOG ---
             try:
-                files = list(self.api(cmd="/file/print"))
+                files = await self._print("file", props=("name",))
                 log_files = [
                     f for f in files
                     if isinstance(f, dict)
@@ -441,9 +856,10 @@ class RouterAPI:
                 if not name:
                     return []
 
-                content = self.api(
-                    cmd="/file/get",
-                    **{"numbers": name, "value-name": "contents"}
+                content = await self._call(
+                    "/file/get",
+                    f"=numbers={name}",
+                    "=value-name=contents",
                 )
 
                 if isinstance(content, list) and content:
@@ -483,13 +899,17 @@ class RouterAPI:
             return []
 
 
-    def get_webfig_port(self):
-        self.ensure_connected()
+    async def get_webfig_port(self):
+        await self.ensure_connected()
         if not self.api:
             return None
 
         try:
-            services = list(self.api(cmd="/ip/service/print"))
+            services = await self._print(
+                "ip", "service",
+                where={"name": ("www", "www-ssl")},
+                props=("name", "port"),
+            )
             for s in services:
                 if s.get("name") == "www":
                     return ("http", int(s.get("port", 80)))
@@ -500,7 +920,38 @@ class RouterAPI:
             return None
 
 
-    def get_status(self):
+    async def get_status(self):
+        """
+        One status collection: every RouterOS path is fetched at most once
+        and shared by all derived metrics (see PollCache).
+        While the circuit breaker is open the router is not contacted at all.
+        """
+        breaker = self.breaker
+        if not breaker.allow():
+            return {"status": "No", "breaker": breaker.state}
+
+        cache = self._poll_cache = PollCache()
+        try:
+            status = await self._collect_status()
+        except asyncio.CancelledError:
+            # Outer timeout (wait_for) gave up on this poll
+            breaker.record_failure()
+            raise
+        else:
+            if status.get("status") == "Yes":
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            status["breaker"] = breaker.state
+            return status
+        finally:
+            self._poll_cache = None
+            ROUND_TRIPS["sent"] += cache.fetched
+            ROUND_TRIPS["saved"] += cache.saved
+            logger.debug("Router %s: %s round trips, %s saved by poll cache",
+                         self.key, cache.fetched, cache.saved)
+
+    async def _collect_status(self):
         """
         New version:
         - Any incompleteness of data → error
@@ -510,13 +961,13 @@ class RouterAPI:
         - Never returns a partially empty status
         """
 
-        self.ensure_connected()
+        await self.ensure_connected()
         if not self.api:
             return {"status": "No"}
 
         try:
             # --- 1. Get system/resource ---
-            resource = next(iter(self.api.path("system", "resource")), None)
+            resource = await self._first("system", "resource", props=RESOURCE_PROPS)
 
             # If RouterOS returns empty dict or None → this is error
             if not resource or not isinstance(resource, dict) or len(resource) < 3:
@@ -524,16 +975,24 @@ class RouterAPI:
                 return {"status": "No"}
 
             # --- 2. Critical fields ---
-            board = resource.get("board-name")
-            version = resource.get("version")
             uptime_raw = resource.get("uptime")
 
             # If key fields are missing → RouterOS API is in bad state
-            if not board or not version or not uptime_raw:
+            if not uptime_raw:
+                self.close()
+                return {"status": "No"}
+
+            # Reboot → slow tiers and WAN counters are stale
+            if self.tiers.observe_uptime(uptime_seconds(uptime_raw)):
+                WAN_COUNTERS.pop(self.key, None)
+
+            # --- 3. Board / version ---
+            board, version = resource.get("board-name"), resource.get("version")
+            if not board or not version:
                 self.close()
                 return {"status": "No"}
 
-            # --- 3. CPU / Memory / HDD ---
+            # --- 4. CPU / Memory / HDD ---
             try:
                 cpu_freq = int(resource.get("cpu-frequency"))
                 cpu_load = int(resource.get("cpu-load"))
@@ -546,13 +1005,24 @@ class RouterAPI:
                 self.close()
                 return {"status": "No"}
 
-            # --- 4. WAN / IP / Health ---
-            temperature, voltage = self.get_temperature_and_voltage()
-            ipv4 = self.get_external_ipv4()
-            iface, speed = self.get_wan_info()
-            proto, port = self.get_webfig_port() or ("http", 80)
+            # --- 5. WAN / IP / Health ---
+            # A new default route means the WAN IP tier is stale
+            try:
+                self.tiers.observe_default_route(await self._default_route())
+            except Exception:
+                pass
+
+            # Independent queries, in flight at the same time
+            (temperature, voltage), ipv4, wan, webfig = await asyncio.gather(
+                self.get_temperature_and_voltage(),
+                self._tier("wan_ip", self.get_external_ipv4),
+                self.get_wan_rxtx(),
+                self._tier("services", self.get_webfig_port),
+            )
+            iface, speed = format_wan(wan)
+            proto, port = webfig or ("http", 80)
 
-            # --- 5. Forming a valid status ---
+            # --- 6. Forming a valid status (all tiers merged) ---
             return {
                 "status": "Yes",
                 "board": board,
@@ -569,6 +1039,8 @@ class RouterAPI:
                 "ipv4": ipv4,
                 "iface": iface,
                 "speed": speed,
+                "rx_bps": wan["rx_bps"] if wan else None,
+                "tx_bps": wan["tx_bps"] if wan else None,
                 "reconnects": self.reconnects if self.reconnects else "-",
                 "webfig_host": str(self.host),
                 "webfig_proto": proto,
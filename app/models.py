@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 @dataclass
 class Router:
@@ -8,3 +9,5 @@ class Router:
     password: str      # decrypted
     port: int
     enabled: int
+    poll_interval: Optional[int] = None  # seconds, None = default
+    group_name: Optional[str] = None     # alert rules can target a group
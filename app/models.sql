@@ -6,7 +6,9 @@ CREATE TABLE IF NOT EXISTS routers (
     username TEXT NOT NULL,
     password TEXT NOT NULL,
     port INTEGER NOT NULL DEFAULT 8728,
-    enabled INTEGER NOT NULL DEFAULT 1
+    enabled INTEGER NOT NULL DEFAULT 1,
+    poll_interval INTEGER,  -- seconds, NULL = default
+    group_name TEXT         -- alert rules can target a group
 );
 
 -- users table
@@ -17,3 +19,17 @@ CREATE TABLE IF NOT EXISTS users (
     role TEXT NOT NULL DEFAULT 'viewer'
 );
 
+
+-- alert rules, evaluated over the latest sample of every router
+CREATE TABLE IF NOT EXISTS alert_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    metric TEXT NOT NULL,             -- cpu_load, temperature, voltage, free_memory, ...
+    op TEXT NOT NULL DEFAULT '>',     -- '>' or '<'
+    threshold REAL NOT NULL,
+    clear_threshold REAL,             -- hysteresis: the alert clears past this, NULL = threshold
+    duration INTEGER NOT NULL DEFAULT 0,  -- seconds the condition must hold before it fires
+    router TEXT,                      -- only this router, NULL = any
+    group_name TEXT,                  -- only routers of this group, NULL = any
+    enabled INTEGER NOT NULL DEFAULT 1
+);
@@ -1,8 +1,12 @@
 # app/notifications.py
 # Telegram worker for notifications
 import os
+import time
+import random
 import asyncio
 import logging
+from typing import Dict, List, Optional, Tuple
+
 import aiohttp
 from dotenv import load_dotenv
 
@@ -10,6 +14,8 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# A local stand-in server can be used instead (benchmarks/telegram_bench.py)
+API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
 CHAT_IDS = os.getenv("TELEGRAM_CHAT_ID", "").split(",")
 
 # Remove empty elements
@@ -22,48 +28,174 @@ if not TELEGRAM_ENABLED:
 
 _worker_shutdown = asyncio.Event()
 _worker_task: asyncio.Task | None = None
+# One session for all sends, opened and closed with the worker
+_session: aiohttp.ClientSession | None = None
 
 SERVER_NAME = "Routers|MikroTik"
 
+# Events of one kind within the window are merged; this many or more
+# become one digest message ("212 routers DOWN: ...")
+COALESCE_WINDOW = float(os.getenv("TELEGRAM_COALESCE_WINDOW", 3))
+DIGEST_MIN = 3
+# Telegram allows about 1 message/s per chat and 30/s per bot
+CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+CHAT_BURST = 3
+GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 25))
+# 429 answers are waited out, not counted as failed attempts, up to this many
+RATE_LIMIT_RETRIES = 10
+MAX_MESSAGE_LENGTH = 4096
+# Time given to queued messages on shutdown (seconds)
+STOP_TIMEOUT = 10
+# Kept-alive connections to the Bot API, shared by all chats
+CONNECTION_LIMIT = int(os.getenv("TELEGRAM_CONNECTIONS", 16))
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+REQUEST_TIMEOUT = 10
+
+STATS = {"events": 0, "digests": 0, "cancelled": 0, "sent": 0, "failed": 0, "rate_limited": 0}
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `burst` saved up; acquire() waits for one."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Nothing is let through for `seconds` (Telegram's retry_after)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+_global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+
 
 #   MESSAGE QUEUE
 
-_message_queue = asyncio.Queue()
-_worker_started = False
+# (kind, router, detail): kind None is a ready text in `detail`
+_message_queue: asyncio.Queue = asyncio.Queue()
+# chat_id -> (queue of texts, sender task, bucket)
+_chats: Dict[str, Tuple[asyncio.Queue, asyncio.Task, TokenBucket]] = {}
 
 
 async def telegram_worker():
+    """
+    Collects events for COALESCE_WINDOW after the first one, merges
+    them (see _coalesce) and hands the texts to every chat's sender.
+    """
     logger.info("Telegram worker started")
 
     while not _worker_shutdown.is_set():
         try:
-            text = await asyncio.wait_for(_message_queue.get(), timeout=1.0)
+            first = await asyncio.wait_for(_message_queue.get(), timeout=1.0)
         except asyncio.TimeoutError:
             continue  # check shutdown every 1 sec
 
-        await _send_to_all_chats(text)
-        _message_queue.task_done()
+        batch = [first]
+        deadline = time.monotonic() + COALESCE_WINDOW
+        while not _worker_shutdown.is_set() and (left := deadline - time.monotonic()) > 0:
+            try:
+                batch.append(await asyncio.wait_for(_message_queue.get(), timeout=left))
+            except asyncio.TimeoutError:
+                break
+        _dispatch(batch)
+
+    # Whatever was queued before shutdown goes out as one batch
+    batch = []
+    while not _message_queue.empty():
+        batch.append(_message_queue.get_nowait())
+    if batch:
+        _dispatch(batch)
 
     logger.info("Telegram worker stopped")
 
+
+def _dispatch(batch: list) -> None:
+    for text in _coalesce(batch):
+        for chat_id, (queue, _, _) in _chats.items():
+            queue.put_nowait(text)
+    for _ in batch:
+        _message_queue.task_done()
+
+
+async def _chat_sender(chat_id: str, queue: asyncio.Queue, bucket: TokenBucket):
+    """One per chat, so a slow or rate-limited chat does not hold up the others."""
+    while True:
+        text = await queue.get()
+        try:
+            await _send_with_retry(chat_id, text, bucket)
+        finally:
+            queue.task_done()
+
+
+def _new_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTION_LIMIT,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+    )
+
+
 def start_telegram_worker():
-    global _worker_task
+    global _worker_task, _session
     if _worker_task is None:
+        _session = _new_session()
+        for chat_id in CHAT_IDS:
+            queue = asyncio.Queue()
+            bucket = TokenBucket(CHAT_RATE, CHAT_BURST)
+            task = asyncio.create_task(_chat_sender(chat_id, queue, bucket))
+            _chats[chat_id] = (queue, task, bucket)
         _worker_task = asyncio.create_task(telegram_worker())
 
 async def stop_telegram_worker():
+    global _session
     _worker_shutdown.set()
 
-    # Wait for all messages to be sent
-    await _message_queue.join()
-
-    # Wait for background task to complete
+    # Wait for the worker to hand over the last batch and for the chats to send it
     if _worker_task:
-        _worker_task.cancel()
         try:
-            await _worker_task
-        except Exception:
+            await asyncio.wait_for(_worker_task, timeout=STOP_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
             pass
+        except Exception:
+            logger.exception("Telegram worker failed")
+
+    queues = [queue.join() for queue, _, _ in _chats.values()]
+    try:
+        await asyncio.wait_for(asyncio.gather(*queues), timeout=STOP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Telegram messages not sent before shutdown were dropped")
+
+    tasks = [task for _, task, _ in _chats.values()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _chats.clear()
+
+    if _session is not None:
+        await _session.close()
+        _session = None
 
 
 async def send_telegram(text: str):
@@ -71,60 +203,135 @@ async def send_telegram(text: str):
     if not TELEGRAM_ENABLED:
         return False
 
-    await _message_queue.put(text)
+    await _message_queue.put((None, None, text))
     return True
 
 
-#   RETRY + MULTI-CHAT LOGIC
+async def send_event(kind: str, name: str, detail=None):
+    """
+    A router state change ("down", "up", "reconnects"); events close
+    in time are merged into digests instead of one message each.
+    """
+    if not TELEGRAM_ENABLED:
+        return False
+
+    STATS["events"] += 1
+    await _message_queue.put((kind, name, detail))
+    return True
+
+
+def telegram_stats() -> dict:
+    return {
+        **STATS,
+        "queued": _message_queue.qsize(),
+        "chat_queues": {chat_id: queue.qsize() for chat_id, (queue, _, _) in _chats.items()},
+    }
+
 
-async def _send_to_all_chats(text: str):
-    """Sends a message to all chats with retry."""
-    for chat_id in CHAT_IDS:
-        await _send_with_retry(chat_id, text)
+#   COALESCING
+
+# A change and its opposite within one window cancel out
+OPPOSITE = {"down": "up", "up": "down"}
+
+
+def _coalesce(batch: list) -> List[str]:
+    """
+    Ready texts as they are; per kind the latest event per router,
+    with DOWN then UP (or UP then DOWN) of one router dropped.
+    DIGEST_MIN or more routers of one kind make one digest.
+    """
+    texts = []
+    pending: Dict[str, Dict[str, object]] = {}
+    for kind, name, detail in batch:
+        if kind is None:
+            texts.append(detail)
+            continue
+        opposite = pending.get(OPPOSITE.get(kind), {})
+        if name in opposite:
+            del opposite[name]
+            STATS["cancelled"] += 1
+            continue
+        pending.setdefault(kind, {})[name] = detail
+
+    for kind, events in pending.items():
+        if len(events) >= DIGEST_MIN:
+            texts.append(fmt_digest(kind, list(events.items())))
+            STATS["digests"] += 1
+        else:
+            texts.extend(_fmt_event(kind, name, detail) for name, detail in events.items())
+    return texts
 
 
-async def _send_with_retry(chat_id: str, text: str):
-    """Sending with retry mechanics."""
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+#   RETRY + MULTI-CHAT LOGIC
+
+async def _send_with_retry(chat_id: str, text: str, bucket: Optional[TokenBucket] = None):
+    """
+    Sending with retry mechanics. Every attempt takes a token from the
+    chat's and the global bucket; a 429 pauses the chat for retry_after.
+    """
+    url = f"{API_BASE}/bot{BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": chat_id,
         "text": text,
         "parse_mode": "Markdown"
     }
 
-    delays = [1, 3, 5]  # backoff
+    delays = [1, 3, 5]  # backoff, each with ±50 % jitter so chats do not retry in step
+    attempt = 0
+    rate_limited = 0
 
-    for attempt, delay in enumerate(delays, start=1):
+    while attempt < len(delays):
+        if bucket is not None:
+            await bucket.acquire()
+        await _global_bucket.acquire()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, data=payload, timeout=10) as resp:
-
-                    if resp.status == 200:
-                        return True
-
-                    # Telegram API error
-                    try:
-                        err = await resp.json()
-                    except Exception:
-                        err = await resp.text()
-
-                    logger.error(
-                        "Telegram API error (attempt %s, chat %s): %s",
-                        attempt, chat_id, err
-                    )
+            async with _session.post(url, data=payload) as resp:
+
+                if resp.status == 200:
+                    STATS["sent"] += 1
+                    return True
+
+                # Telegram API error
+                try:
+                    err = await resp.json()
+                except Exception:
+                    err = await resp.text()
+
+                retry_after = None
+                if resp.status == 429 and isinstance(err, dict):
+                    retry_after = (err.get("parameters") or {}).get("retry_after")
+                if retry_after is not None and rate_limited < RATE_LIMIT_RETRIES:
+                    rate_limited += 1
+                    STATS["rate_limited"] += 1
+                    logger.warning("Telegram rate limit (chat %s): retry after %s s", chat_id, retry_after)
+                    if bucket is not None:
+                        bucket.pause(float(retry_after))
+                    else:
+                        await asyncio.sleep(float(retry_after))
+                    continue
+
+                logger.error(
+                    "Telegram API error (attempt %s, chat %s): %s",
+                    attempt + 1, chat_id, err
+                )
+                # Bad request, blocked bot, unknown chat: retrying will not help
+                if 400 <= resp.status < 500 and resp.status != 429:
+                    break
 
         except aiohttp.ClientConnectionError:
-            logger.error("Telegram connection error (attempt %s)", attempt)
+            logger.error("Telegram connection error (attempt %s)", attempt + 1)
 
         except asyncio.TimeoutError:
-            logger.error("Telegram timeout (attempt %s)", attempt)
+            logger.error("Telegram timeout (attempt %s)", attempt + 1)
 
         except Exception as e:
             logger.exception("Unexpected Telegram error: %s", e)
 
         # Retry
-        await asyncio.sleep(delay)
+        await asyncio.sleep(delays[attempt] * random.uniform(0.5, 1.5))
+        attempt += 1
 
+    STATS["failed"] += 1
     logger.error("Failed to send Telegram message after retries: %s", text)
     return False
 
@@ -145,3 +352,57 @@ def fmt_reconnect_alert(name, count):
     return (f"*{SERVER_NAME}*\n\n"
             f"⚠️ *High reconnect rate*\n\n"
             f"`{name}`: {count} reconnects.")
+
+def _fmt_event(kind, name, detail):
+    if kind == "down":
+        return fmt_down(name)
+    if kind == "up":
+        return fmt_up(name)
+    if kind == "reconnects":
+        return fmt_reconnect_alert(name, detail)
+    return f"*{SERVER_NAME}*\n\n`{name}`: {kind} {detail if detail is not None else ''}".rstrip()
+
+DIGEST_TITLES = {
+    "down": "❌ *{n} routers DOWN*",
+    "up": "✅ *{n} routers UP*",
+    "reconnects": "⚠️ *High reconnect rate on {n} routers*",
+}
+
+def fmt_digest(kind, events):
+    """One message for many routers; the list is cut to fit Telegram's limit."""
+    title = DIGEST_TITLES.get(kind, "*{n} routers: " + kind + "*").format(n=len(events))
+    head = f"*{SERVER_NAME}*\n\n{title}\n\n"
+    room = MAX_MESSAGE_LENGTH - len(head) - 40  # leave room for "...and N more"
+
+    parts = []
+    for i, (name, detail) in enumerate(events):
+        part = f"`{name}` ({detail})" if kind == "reconnects" else f"`{name}`"
+        if len(part) + 2 > room:
+            parts.append(f"...and {len(events) - i} more")
+            break
+        room -= len(part) + 2
+        parts.append(part)
+    return head + ", ".join(parts)
+
+# Routers listed in one rule message, the rest are counted
+MAX_LISTED = 20
+
+def _rule_routers(items):
+    lines = [f"`{name}`: {value:g}" for name, value in items[:MAX_LISTED]]
+    if len(items) > MAX_LISTED:
+        lines.append(f"...and {len(items) - MAX_LISTED} more")
+    return "\n".join(lines)
+
+def fmt_rule_alert(rule, items):
+    condition = f"{rule['metric']} {rule['op']} {rule['threshold']:g}"
+    if rule.get("duration"):
+        condition += f" for {rule['duration']} s"
+    return (f"*{SERVER_NAME}*\n\n"
+            f"🔥 *{rule['name']}*\n"
+            f"{condition}\n\n"
+            f"{_rule_routers(items)}")
+
+def fmt_rule_clear(rule, items):
+    return (f"*{SERVER_NAME}*\n\n"
+            f"✅ *{rule['name']}* cleared\n\n"
+            f"{_rule_routers(items)}")
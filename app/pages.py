@@ -7,17 +7,24 @@ import time
 import paramiko
 import json
 
-from fastapi import Request, Form
+from fastapi import Request, Form, File, UploadFile
 from fastapi import WebSocket
 from fastapi.responses import HTMLResponse, RedirectResponse
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 from starlette.status import HTTP_302_FOUND
 
-from .db import get_user, verify_password
+from .db import DB, get_user
 from .db import list_users, add_user, update_user_role, update_user_password, delete_user, users_count
+from .db import get_alert_rules, add_alert_rule, update_alert_rule, delete_alert_rule
 from .log_stream import log_queue, connected_log_clients
 from .state import router_manager
-from .state import ROUTER_APIS
+from .state import collect_metrics
+from .history import METRICS, TABLES, get_series
+from .ringbuffer import RECENT, to_json
+from .downsample import downsample
+from .alerts import ALERTS, parse_rule, reload_rules
+from .auth import PASSWORDS, LOGIN_THROTTLE, PasswordPoolBusy
+from .bulk import IMPORT_MAX_BYTES, IMPORT_MAX_ERRORS, EXPORT_FORMATS, parse_file, validate_rows, export_routers
 
 # one-time WS tokens
 WS_TOKENS = {}
@@ -33,7 +40,7 @@ def register_pages(app, templates):
             return RedirectResponse("/login", status_code=HTTP_302_FOUND)
 
 
-        routers = await router_manager.get_routers()
+        version, routers = router_manager.snapshot()
         router_names = list(routers.keys())
 
         # Checking user rights
@@ -44,6 +51,7 @@ def register_pages(app, templates):
             {
                 "request": request,
                 "router_names": router_names,
+                "registry_version": version,
                 "is_admin": is_admin
             }
         )
@@ -51,7 +59,7 @@ def register_pages(app, templates):
     # --- Auth ---
     @app.get("/login", response_class=HTMLResponse)
     async def login_page(request: Request):
-        users = users_count()
+        users = await DB.run(users_count)
         if users == 0:  # If there are no users
             # Show a special form for creating the first user
             return templates.TemplateResponse("first_login.html", {"request": request, "error": None})
@@ -60,11 +68,11 @@ def register_pages(app, templates):
 
     @app.post("/login")
     async def login(request: Request,
-    username: str = Form(...),
-    password: str = Form(...),
+    username: str = Form(""),
+    password: str = Form(""),
     password_confirm: str = Form(None)  # New parameter for confirmation
 ):
-        users = list_users()
+        users = await DB.run(users_count)
 
         # If this is the first login (no users)
         if not users:
@@ -88,17 +96,56 @@ def register_pages(app, templates):
                     }
                 )
 
+            if not username:
+                return templates.TemplateResponse(
+                    "first_login.html",
+                    {
+                        "request": request,
+                        "error": "Username is required!"
+                    }
+                )
+
             # Create the first user as admin
-            add_user(username, password, "admin")
+            try:
+                password_hash = await PASSWORDS.hash(password)
+            except PasswordPoolBusy:
+                return templates.TemplateResponse(
+                    "first_login.html",
+                    {"request": request, "error": "Server is busy, try again in a moment"},
+                    status_code=503,
+                )
+            await DB.run(add_user, username, password_hash, "admin")
             request.session["user"] = username
             request.session["role"] = "admin"
             return RedirectResponse("/admin/routers", status_code=HTTP_302_FOUND)
 
-        # Normal login
-        user = get_user(username)
-        if not user or not verify_password(password, user["password_hash"]):
+        # Normal login; an empty form or an unknown user never reaches bcrypt
+        if not username or not password:
             return templates.TemplateResponse("login.html", {"request": request, "error": "Invalid credentials"})
 
+        ip = request.client.host if request.client else "-"
+        wait = LOGIN_THROTTLE.retry_after(ip, username)
+        if wait is not None:
+            return templates.TemplateResponse(
+                "login.html",
+                {"request": request, "error": f"Too many failed attempts, try again in {wait} s"},
+                status_code=429,
+            )
+
+        user = await DB.run(get_user, username)
+        try:
+            valid = user is not None and await PASSWORDS.verify(password, user["password_hash"])
+        except PasswordPoolBusy:
+            return templates.TemplateResponse(
+                "login.html",
+                {"request": request, "error": "Server is busy, try again in a moment"},
+                status_code=503,
+            )
+        if not valid:
+            LOGIN_THROTTLE.failed(ip, username)
+            return templates.TemplateResponse("login.html", {"request": request, "error": "Invalid credentials"})
+
+        LOGIN_THROTTLE.succeeded(username)
         request.session["user"] = username
         request.session["role"] = user["role"]
         return RedirectResponse("/welcome", status_code=HTTP_302_FOUND)
@@ -165,6 +212,151 @@ def register_pages(app, templates):
         return {"status": "ok"}
 
 
+    # --- Poller metrics ---
+    @app.get("/admin/metrics")
+    async def metrics(request: Request):
+        if not request.session.get("user") or request.session.get("role") != "admin":
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        return collect_metrics()
+
+
+    # --- Alert rules ---
+    @app.get("/admin/alert-rules")
+    async def alert_rules(request: Request):
+        if not request.session.get("user") or request.session.get("role") != "admin":
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        rules = await DB.run(get_alert_rules)
+        return {"rules": rules, "active": ALERTS.active()}
+
+
+    @app.post("/admin/alert-rules")
+    async def add_rule(request: Request):
+        if not request.session.get("user") or request.session.get("role") != "admin":
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        try:
+            rule = parse_rule(await request.json())
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        rule_id = await DB.run(add_alert_rule, rule)
+        await reload_rules()
+        return {"id": rule_id, **rule}
+
+
+    @app.post("/admin/alert-rules/{rule_id}")
+    async def edit_rule(request: Request, rule_id: int):
+        if not request.session.get("user") or request.session.get("role") != "admin":
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        try:
+            rule = parse_rule(await request.json())
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        if not await DB.run(update_alert_rule, rule_id, rule):
+            return JSONResponse({"error": "Rule not found"}, status_code=404)
+        await reload_rules()
+        return {"id": rule_id, **rule}
+
+
+    @app.post("/admin/alert-rules/delete/{rule_id}")
+    async def delete_rule(request: Request, rule_id: int):
+        if not request.session.get("user") or request.session.get("role") != "admin":
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        if not await DB.run(delete_alert_rule, rule_id):
+            return JSONResponse({"error": "Rule not found"}, status_code=404)
+        await reload_rules()
+        return {"deleted": rule_id}
+
+
+    # --- Metric history ---
+    @app.get("/api/history/{name}")
+    async def history(request: Request, name: str, start: float = None, end: float = None,
+                      resolution: str = None, metrics: str = None):
+        if not request.session.get("user"):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+        end = end if end is not None else time.time()
+        start = start if start is not None else end - 3600
+        if start >= end:
+            return JSONResponse({"error": "start must be before end"}, status_code=400)
+        if resolution is not None and resolution not in TABLES:
+            return JSONResponse({"error": f"resolution must be one of: {', '.join(TABLES)}"}, status_code=400)
+
+        wanted = metrics.split(",") if metrics else None
+        if wanted and not set(wanted) <= set(METRICS):
+            return JSONResponse({"error": f"metrics must be among: {', '.join(METRICS)}"}, status_code=400)
+
+        return await get_series(name, start, end, resolution, wanted)
+
+
+    @app.get("/api/history/{name}/downsample")
+    async def history_downsample(request: Request, name: str, start: float = None, end: float = None,
+                                 points: int = 500, metrics: str = None, mode: str = "lttb"):
+        """At most `points` per metric: LTTB line (mode=lttb) or min/max/avg buckets (mode=minmax)."""
+        if not request.session.get("user"):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+        end = end if end is not None else time.time()
+        start = start if start is not None else end - 86400
+        if start >= end:
+            return JSONResponse({"error": "start must be before end"}, status_code=400)
+        if mode not in ("lttb", "minmax"):
+            return JSONResponse({"error": "mode must be lttb or minmax"}, status_code=400)
+
+        wanted = metrics.split(",") if metrics else None
+        if wanted and not set(wanted) <= set(METRICS):
+            return JSONResponse({"error": f"metrics must be among: {', '.join(METRICS)}"}, status_code=400)
+
+        return await asyncio.to_thread(downsample, name, start, end, points, wanted, mode)
+
+
+    @app.get("/api/recent")
+    async def recent(request: Request, routers: str = None, metrics: str = None,
+                     samples: int = 60, window: float = None):
+        """
+        In-memory recent samples: the last `samples` per router, or with
+        `window` (seconds) min/max/mean/p95 over that window.
+        """
+        if not request.session.get("user"):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+        names = routers.split(",") if routers else None
+        wanted = metrics.split(",") if metrics else list(METRICS)
+        if not set(wanted) <= set(METRICS):
+            return JSONResponse({"error": f"metrics must be among: {', '.join(METRICS)}"}, status_code=400)
+
+        if window is not None:
+            result = {"window": window, "metrics": {}}
+            for m in wanted:
+                stats = RECENT.window(m, window, names)
+                result["routers"] = stats.pop("routers")
+                count = stats.pop("count")
+                result["metrics"][m] = {k: to_json(v) for k, v in stats.items()}
+                result["metrics"][m]["count"] = count.tolist()
+            return result
+
+        result = {"metrics": {}}
+        for m in wanted:
+            data = RECENT.last(m, samples, names)
+            result["routers"] = data["routers"]
+            result["t"] = to_json(data["t"])
+            result["metrics"][m] = to_json(data["values"])
+        return result
+
+
+    @app.get("/api/routers")
+    async def router_names(request: Request, version: int = None):
+        """
+        Router names with the registry version; with `version` equal to the
+        current one only {"version", "unchanged": true} comes back.
+        """
+        if not request.session.get("user"):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+        current, routers = router_manager.snapshot()
+        if version == current:
+            return {"version": current, "unchanged": True}
+        return {"version": current, "routers": list(routers)}
+
+
     # --- Routers List ---
     @app.get("/admin/routers", response_class=HTMLResponse)
     async def admin_routers(request: Request):
@@ -184,15 +376,99 @@ def register_pages(app, templates):
 
     @app.post("/admin/routers/add")
     async def add_router(request: Request, name: str = Form(...), host: str = Form(...),
-                         username: str = Form(...), password: str = Form(...), port: int = Form(8728)):
+                         username: str = Form(...), password: str = Form(...), port: int = Form(8728),
+                         poll_interval: str = Form(""), group_name: str = Form("")):
         if not request.session.get("user") or request.session.get("role") != "admin":
             return JSONResponse({"error": "Unauthorized"}, status_code=401)
-        result = await router_manager.add_router(name, host, username, password, port, enabled=1)
+        interval = _parse_poll_interval(poll_interval)
+        if interval is False:
+            return JSONResponse({"error": "Poll interval must be a whole number of seconds (1 or more)"}, status_code=400)
+        result = await router_manager.add_router(name, host, username, password, port, enabled=1,
+                                                 poll_interval=interval, group_name=group_name.strip() or None)
         if result is False:
             return JSONResponse({"error": "Router with this name already exists"}, status_code=400)
         return RedirectResponse("/admin/routers", status_code=HTTP_302_FOUND)
 
 
+    # --- Bulk Import / Export ---
+    @app.post("/admin/routers/import")
+    async def import_routers(request: Request, file: UploadFile = File(...), replace: str = Form("")):
+        """
+        CSV (header line) or JSON array with name, host, username, password
+        and optionally port, enabled, poll_interval, group_name.
+        All rows or none: any invalid row rejects the whole file.
+        """
+        if not request.session.get("user") or request.session.get("role") != "admin":
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+        data = await file.read(IMPORT_MAX_BYTES + 1)
+        if len(data) > IMPORT_MAX_BYTES:
+            return JSONResponse({"error": f"File is larger than {IMPORT_MAX_BYTES // (1024 * 1024)} MB"}, status_code=413)
+        try:
+            items = await asyncio.to_thread(parse_file, data, file.filename or "")
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+        rows, errors = await asyncio.to_thread(validate_rows, items)
+        if errors:
+            first = errors[0]
+            return JSONResponse({
+                "error": f"{len(errors)} invalid rows, nothing imported (row {first['row']}: {first['error']})",
+                "rows": errors[:IMPORT_MAX_ERRORS],
+            }, status_code=400)
+
+        try:
+            added, updated = await router_manager.import_routers(rows, replace=replace in ("1", "on", "true"))
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        return {"added": added, "updated": updated}
+
+
+    def _export_response(format: str, passwords: bool):
+        if format not in EXPORT_FORMATS:
+            return JSONResponse({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}, status_code=400)
+        return StreamingResponse(
+            export_routers(format, passwords),
+            media_type=EXPORT_FORMATS[format],
+            headers={"Content-Disposition": f'attachment; filename="routers.{format}"'},
+        )
+
+    @app.get("/admin/routers/export")
+    async def export_routers_file(request: Request, format: str = "csv"):
+        """The whole fleet, streamed, without passwords."""
+        if not request.session.get("user") or request.session.get("role") != "admin":
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        return _export_response(format, False)
+
+    @app.post("/admin/routers/export")
+    async def export_routers_with_passwords(request: Request, format: str = Form("csv"),
+                                            admin_password: str = Form("")):
+        """
+        With passwords in plain text, ready to import elsewhere. Only as a POST
+        with the admin's own password re-entered, so that no link or cross-site
+        navigation can trigger it and nothing secret ends up in a URL.
+        """
+        username = request.session.get("user")
+        if not username or request.session.get("role") != "admin":
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+        # Wrong passwords count as failed logins
+        ip = request.client.host if request.client else "-"
+        wait = LOGIN_THROTTLE.retry_after(ip, username)
+        if wait is not None:
+            return JSONResponse({"error": f"Too many failed attempts, try again in {wait} s"}, status_code=429)
+        user = await DB.run(get_user, username)
+        try:
+            valid = bool(admin_password) and user is not None and await PASSWORDS.verify(admin_password, user["password_hash"])
+        except PasswordPoolBusy:
+            return JSONResponse({"error": "Server is busy, try again in a moment"}, status_code=503)
+        if not valid:
+            LOGIN_THROTTLE.failed(ip, username)
+            return JSONResponse({"error": "Wrong password"}, status_code=403)
+
+        return _export_response(format, True)
+
+
     # --- Edit Router ---
     @app.get("/admin/routers/edit/{name}", response_class=HTMLResponse)
     async def edit_router_page(request: Request, name: str):
@@ -207,10 +483,15 @@ def register_pages(app, templates):
 
     @app.post("/admin/routers/edit/{name}")
     async def edit_router(request: Request, name: str, host: str = Form(...),
-                          username: str = Form(...), password: str = Form(...), port: int = Form(8728)):
+                          username: str = Form(...), password: str = Form(...), port: int = Form(8728),
+                          poll_interval: str = Form(""), group_name: str = Form("")):
         if not request.session.get("user") or request.session.get("role") != "admin":
             return JSONResponse({"error": "Unauthorized"}, status_code=401)
-        await router_manager.update_router(name, host, username, password, port)
+        interval = _parse_poll_interval(poll_interval)
+        if interval is False:
+            return JSONResponse({"error": "Poll interval must be a whole number of seconds (1 or more)"}, status_code=400)
+        await router_manager.update_router(name, host, username, password, port, poll_interval=interval,
+                                           group_name=group_name.strip() or None)
         return RedirectResponse("/admin/routers", status_code=HTTP_302_FOUND)
 
 
@@ -228,7 +509,7 @@ def register_pages(app, templates):
     async def admin_users(request: Request):
         if request.session.get("role") != "admin":
             return RedirectResponse("/login", status_code=HTTP_302_FOUND)
-        users = list_users()
+        users = await DB.run(list_users)
         return templates.TemplateResponse("admin_users.html", {"request": request, "users": users})
 
 
@@ -249,7 +530,11 @@ def register_pages(app, templates):
     ):
         if request.session.get("role") != "admin":
             return JSONResponse({"error": "Unauthorized"}, status_code=401)
-        result = add_user(username, password, role)
+        try:
+            password_hash = await PASSWORDS.hash(password)
+        except PasswordPoolBusy:
+            return JSONResponse({"error": "Server is busy, try again in a moment"}, status_code=503)
+        result = await DB.run(add_user, username, password_hash, role)
         if result is False:
             return JSONResponse({"error": "User already exists"}, status_code=400)
         return RedirectResponse("/admin/users", status_code=HTTP_302_FOUND)
@@ -260,7 +545,7 @@ def register_pages(app, templates):
     async def edit_user_page(request: Request, username: str):
         if request.session.get("role") != "admin":
             return RedirectResponse("/login", status_code=HTTP_302_FOUND)
-        user = get_user(username)
+        user = await DB.run(get_user, username)
         if not user:
             return RedirectResponse("/admin/users", status_code=HTTP_302_FOUND)
         return templates.TemplateResponse(
@@ -279,8 +564,12 @@ def register_pages(app, templates):
             return JSONResponse({"error": "Unauthorized"}, status_code=401)
 
         if password:
-            update_user_password(username, password)
-        update_user_role(username, role)
+            try:
+                password_hash = await PASSWORDS.hash(password)
+            except PasswordPoolBusy:
+                return JSONResponse({"error": "Server is busy, try again in a moment"}, status_code=503)
+            await DB.run(update_user_password, username, password_hash)
+        await DB.run(update_user_role, username, role)
         return RedirectResponse("/admin/users", status_code=HTTP_302_FOUND)
 
 
@@ -289,8 +578,8 @@ def register_pages(app, templates):
     async def delete_user_post(request: Request, username: str):
         if request.session.get("role") != "admin":
             return JSONResponse({"error": "Unauthorized"}, status_code=401)
-        if users_count() > 1:
-            delete_user(username)
+        if await DB.run(users_count) > 1:
+            await DB.run(delete_user, username)
         return RedirectResponse("/admin/users", status_code=HTTP_302_FOUND)
 
 
@@ -369,6 +658,16 @@ def register_pages(app, templates):
                 pass
 
 
+    # --- Router Detail (history charts) ---
+    @app.get("/router/{name}", response_class=HTMLResponse)
+    async def router_detail(name: str, request: Request):
+        if not request.session.get("user"):
+            return RedirectResponse("/login", status_code=HTTP_302_FOUND)
+        return templates.TemplateResponse(
+            "router_detail.html",
+            {"request": request, "router_name": name})
+
+
     # --- Router Log ---
     @app.get("/router/{name}/log")
     async def router_terminal(name: str, request: Request):
@@ -383,17 +682,17 @@ def register_pages(app, templates):
     async def ws_log(ws: WebSocket, router: str):
         await ws.accept()
 
-        api = ROUTER_APIS.get(router)
-        if not api:
-            await ws.send_text(json.dumps({
-                "type": "error",
-                "message": "Router API not connected"
-            }))
-            await ws.close()
-            return
-
         try:
-            logs = api.get_logs(200) # <------- Load last 200 lines of log
+            # Own connection from the router's pool, never the poller's
+            async with router_manager.lease(router) as api:
+                if not api:
+                    await ws.send_text(json.dumps({
+                        "type": "error",
+                        "message": "Router not found"
+                    }))
+                    return
+
+                logs = await api.get_logs(200) # <------- Load last 200 lines of log
 
             await ws.send_text(json.dumps({
                 "type": "logs",
@@ -454,6 +753,17 @@ def register_pages(app, templates):
                 status_code=500)
 
 
+    def _parse_poll_interval(value: str):
+        """Empty → None (default interval), invalid → False."""
+        value = (value or "").strip()
+        if not value:
+            return None
+        try:
+            interval = int(value)
+        except ValueError:
+            return False
+        return interval if interval >= 1 else False
+
     def _cleanup_tokens():
         now = time.time()
         for t, (_, ts) in list(WS_TOKENS.items()):
@@ -0,0 +1,190 @@
+# app/ringbuffer.py
+# Recent metrics in memory: one preallocated NumPy ring buffer per metric
+
+import os
+import time
+import warnings
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .history import METRICS
+
+# Samples kept per router (720 x 5 s = 1 hour at the default poll interval)
+RING_SAMPLES = int(os.getenv("RING_SAMPLES", 720))
+# Router rows allocated up front; the arrays double when they run out
+RING_INITIAL_ROUTERS = 256
+
+
+class RingStore:
+    """
+    For every metric a (routers x RING_SAMPLES) float32 array, plus
+    one float64 array of sample times; a router is a row with its own
+    write position. Appending writes a few scalars in place (no
+    allocation per poll); reads gather rows with fancy indexing and
+    reduce along the time axis, for any subset of routers at once.
+    Missing values and unused slots are NaN.
+    """
+
+    def __init__(self, metrics: Sequence[str] = METRICS, samples: int = RING_SAMPLES,
+                 routers: int = RING_INITIAL_ROUTERS):
+        self.metrics = tuple(metrics)
+        self.samples = samples
+        self._capacity = 0
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._data: Dict[str, np.ndarray] = {}
+        self._ts = np.empty((0, samples))
+        self._pos = np.zeros(0, dtype=np.int64)
+        self._count = np.zeros(0, dtype=np.int64)
+        self._grow(routers)
+
+    # =========================
+    # Rows
+    # =========================
+
+    def _grow(self, capacity: int) -> None:
+        old = self._capacity
+
+        def grown(arr: np.ndarray, fill) -> np.ndarray:
+            new = np.full((capacity,) + arr.shape[1:], fill, dtype=arr.dtype)
+            new[:old] = arr[:old]
+            return new
+
+        for m in self.metrics:
+            self._data[m] = grown(self._data.get(m, np.empty((0, self.samples), dtype=np.float32)), np.nan)
+        self._ts = grown(self._ts, np.nan)
+        self._pos = grown(self._pos, 0)
+        self._count = grown(self._count, 0)
+        self._free.extend(range(capacity - 1, old - 1, -1))
+        self._capacity = capacity
+
+    def _row(self, name: str) -> int:
+        row = self._rows.get(name)
+        if row is None:
+            if not self._free:
+                self._grow(self._capacity * 2)
+            row = self._rows[name] = self._free.pop()
+        return row
+
+    def drop(self, name: str) -> None:
+        """Forget a router; its row is cleared and reused."""
+        row = self._rows.pop(name, None)
+        if row is None:
+            return
+        for m in self.metrics:
+            self._data[m][row] = np.nan
+        self._ts[row] = np.nan
+        self._pos[row] = 0
+        self._count[row] = 0
+        self._free.append(row)
+
+    @property
+    def routers(self) -> List[str]:
+        return list(self._rows)
+
+    # =========================
+    # Writes
+    # =========================
+
+    def append(self, name: str, status: dict, ts: Optional[float] = None) -> None:
+        row = self._row(name)
+        p = self._pos[row]
+        for m in self.metrics:
+            v = status.get(m)
+            self._data[m][row, p] = v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+        self._ts[row, p] = time.time() if ts is None else ts
+        self._pos[row] = (p + 1) % self.samples
+        if self._count[row] < self.samples:
+            self._count[row] += 1
+
+    # =========================
+    # Reads
+    # =========================
+
+    def _select(self, names: Optional[Iterable[str]]):
+        names = [n for n in (self._rows if names is None else names) if n in self._rows]
+        return names, np.fromiter((self._rows[n] for n in names), dtype=np.int64, count=len(names))
+
+    def last(self, metric: str, n: int, names: Optional[Iterable[str]] = None) -> dict:
+        """
+        Last `n` samples per router, oldest first: {"routers", "t", "values"}
+        with (routers x n) arrays; slots without a sample are NaN.
+        """
+        n = max(1, min(int(n), self.samples))
+        names, rows = self._select(names)
+        idx = (self._pos[rows, None] - n + np.arange(n)) % self.samples
+        return {
+            "routers": names,
+            "t": self._ts[rows[:, None], idx],
+            "values": self._data[metric][rows[:, None], idx],
+        }
+
+    def latest(self, names: Sequence[str], metrics: Sequence[str]) -> tuple:
+        """
+        Newest sample of every router in `names` (in that order):
+        sample times (routers,) and values (routers x metrics).
+        Routers without samples get NaN.
+        """
+        rows = np.fromiter((self._rows.get(n, -1) for n in names), dtype=np.int64, count=len(names))
+        known = rows >= 0
+        rows = np.where(known, rows, 0)
+        idx = (self._pos[rows] - 1) % self.samples
+        ts = np.where(known, self._ts[rows, idx], np.nan)
+        values = np.full((len(names), len(metrics)), np.nan)
+        for j, m in enumerate(metrics):
+            values[:, j] = np.where(known, self._data[m][rows, idx], np.nan)
+        return ts, values
+
+    def window(self, metric: str, seconds: float, names: Optional[Iterable[str]] = None,
+               percentiles: Sequence[float] = (95,), now: Optional[float] = None) -> dict:
+        """min / max / mean / count and percentiles over the last `seconds`, per router."""
+        names, rows = self._select(names)
+        now = time.time() if now is None else now
+        ts = self._ts[rows]
+        values = np.where(ts >= now - seconds, self._data[metric][rows], np.nan)
+
+        count = np.count_nonzero(~np.isnan(values), axis=1)
+        result = {"routers": names, "count": count}
+        if not len(names):
+            for key in ("min", "max", "mean", *(f"p{q:g}" for q in percentiles)):
+                result[key] = np.empty(0)
+            return result
+
+        with warnings.catch_warnings():
+            # Routers with no sample in the window give NaN, not a warning
+            warnings.simplefilter("ignore", RuntimeWarning)
+            result["min"] = np.nanmin(values, axis=1)
+            result["max"] = np.nanmax(values, axis=1)
+            result["mean"] = np.nanmean(values, axis=1)
+
+        # Percentiles from one sort (NaN sorts last), linear interpolation
+        # like np.percentile; much cheaper than np.nanpercentile per row
+        ordered = np.sort(values, axis=1)
+        last = np.maximum(count - 1, 0)
+        for q in percentiles:
+            k = last * (q / 100.0)
+            lo = np.floor(k).astype(np.int64)
+            hi = np.minimum(lo + 1, last)
+            low = np.take_along_axis(ordered, lo[:, None], axis=1)[:, 0]
+            high = np.take_along_axis(ordered, hi[:, None], axis=1)[:, 0]
+            p = low + (high - low) * (k - lo)
+            result[f"p{q:g}"] = np.where(count > 0, p, np.nan)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "routers": len(self._rows),
+            "capacity": self._capacity,
+            "samples": self.samples,
+            "bytes": sum(a.nbytes for a in self._data.values()) + self._ts.nbytes,
+        }
+
+
+def to_json(values: np.ndarray) -> list:
+    """Array -> nested lists with None for NaN (JSON has no NaN)."""
+    values = np.round(values.astype(float), 3)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+RECENT = RingStore()
@@ -1,89 +1,304 @@
 # app/router_manager.py
 import asyncio
-import sqlite3
-from typing import Dict, Optional
+import logging
+import os
+
+import time
+from contextlib import asynccontextmanager
+from types import MappingProxyType
+from typing import AsyncIterator, Callable, Dict, List, Mapping, Optional, Tuple
 
 from .crypto import decrypt_password, encrypt_password
-from .db import get_routers, get_connection
+from . import db
+from .db import DB, get_router_row, get_routers
 from .mikrotik import RouterAPI
 from .models import Router
 
+logger = logging.getLogger(__name__)
+
+# Registry listener: (name, old, new); old is None for an added router,
+# new is None for a removed (or disabled) one
+RouterListener = Callable[[str, Optional[Router], Optional[Router]], None]
+# A change of these fields means a different device or login: connections are dropped
+CONNECTION_FIELDS = ("host", "username", "password", "port")
+
+# Passwords encrypted per worker job on bulk import
+IMPORT_ENCRYPT_CHUNK = 250
+
+# --- Connection pool ---
+POOL_MAX_PER_ROUTER = int(os.getenv("POOL_MAX_PER_ROUTER", 2))   # poller + one interactive view
+POOL_IDLE_TIMEOUT = float(os.getenv("POOL_IDLE_TIMEOUT", 300))   # idle connections are closed after (seconds)
+POOL_PING_AFTER = float(os.getenv("POOL_PING_AFTER", 60))        # idle longer than this → ping on checkout
+POOL_LEASE_TIMEOUT = float(os.getenv("POOL_LEASE_TIMEOUT", 10))  # wait for a free connection (seconds)
+
+
+class ConnectionPool:
+    """
+    Connections (RouterAPI instances) of one router.
+    Each lease is exclusive: nobody else uses that connection until it is returned.
+    """
+
+    def __init__(self, factory: Callable[[], RouterAPI], max_size: int = POOL_MAX_PER_ROUTER):
+        self._factory = factory
+        self.max_size = max_size
+        self._idle: List[Tuple[RouterAPI, float]] = []  # (api, returned at)
+        self._in_use = 0
+        self._cond = asyncio.Condition()
+        self.closed = False
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def size(self) -> int:
+        return self._in_use + len(self._idle)
+
+    async def acquire(self, timeout: float = POOL_LEASE_TIMEOUT) -> RouterAPI:
+        async with self._cond:
+            await asyncio.wait_for(
+                self._cond.wait_for(lambda: self._idle or self.size < self.max_size),
+                timeout=timeout,
+            )
+            if self._idle:
+                # Most recently used first: the warmest connection
+                api, returned_at = self._idle.pop()
+            else:
+                api, returned_at = self._factory(), None
+            self._in_use += 1
+
+        # Health check on checkout
+        if api.api is not None:
+            if not api.connected:
+                api.close()
+            elif returned_at is not None and time.monotonic() - returned_at > POOL_PING_AFTER:
+                if not await api.ping():
+                    api.close()
+        return api
+
+    async def release(self, api: RouterAPI) -> None:
+        async with self._cond:
+            self._in_use -= 1
+            if self.closed or not api.connected:
+                api.close(lost=not api.connected)
+            else:
+                self._idle.append((api, time.monotonic()))
+            self._cond.notify()
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Close connections idle longer than POOL_IDLE_TIMEOUT."""
+        now = time.monotonic() if now is None else now
+        keep, evicted = [], 0
+        for api, returned_at in self._idle:
+            if now - returned_at > POOL_IDLE_TIMEOUT:
+                api.close(lost=False)
+                evicted += 1
+            else:
+                keep.append((api, returned_at))
+        self._idle = keep
+        return evicted
+
+    def close(self) -> None:
+        """Close idle connections; leased ones are closed when returned."""
+        self.closed = True
+        for api, _ in self._idle:
+            api.close(lost=False)
+        self._idle = []
+
 
 class RouterManager:
-    __slots__ = ("_routers", "_lock")
+    """
+    The registry is an immutable snapshot: (version, read-only name -> Router).
+    Writers build a new mapping and swap it in with one assignment; readers
+    take the current one without a lock or a copy, and compare versions to
+    skip work when nothing changed.
+    """
+    __slots__ = ("_snapshot", "_rows", "_lock", "_pools", "_listeners")
     def __init__(self):
-        self._routers: Dict[str, Router] = {}
+        self._snapshot: Tuple[int, Mapping[str, Router]] = (0, MappingProxyType({}))
+        # name -> row as stored (encrypted password), to diff against
+        self._rows: Dict[str, dict] = {}
+        # Serializes writers only
         self._lock = asyncio.Lock()
+        # name -> ConnectionPool
+        self._pools: Dict[str, ConnectionPool] = {}
+        self._listeners: List[RouterListener] = []
 
     # =========================
     # Lifecycle
     # =========================
 
-    async def load(self) -> None:
+    async def load(self, passwords: Optional[Dict[str, str]] = None) -> None:
         """
         Load routers from DB into memory.
         DB is synchronous -> run in thread.
+        Only rows that differ from the loaded ones are applied (and decrypted).
+        `passwords` (ciphertext -> plain text) spares decrypting what was just encrypted.
         """
-        rows = await asyncio.to_thread(get_routers)
-
-        routers: Dict[str, Router] = {}
-        for r in rows:
-            routers[r["name"]] = Router(
-                name=r["name"],
-                host=r["host"],
-                username=r["username"],
-                password=decrypt_password(r["password"]),
-                port=r.get("port", 8728),
-                enabled=r.get("enabled", 1),
-            )
-
-        async with self._lock:
-            self._routers = routers
+        rows = await DB.run(get_routers)
+        rows = {r["name"]: r for r in rows}
+        # DB order (by name) first, then whatever is gone from the DB
+        names = list(rows) + [name for name in self._rows if name not in rows]
+        await self._apply(rows, names, passwords)
 
     async def reload(self) -> None:
         await self.load()
 
+    async def refresh(self, name: str) -> None:
+        """Re-read one router after it was added, edited or deleted: O(1), not a full reload."""
+        row = await DB.run(get_router_row, name)
+        await self._apply({name: row} if row else {}, (name,))
+
+    def add_listener(self, listener: RouterListener) -> None:
+        """Called after every change of a router in the registry."""
+        self._listeners.append(listener)
+
+    async def _apply(self, rows: Dict[str, dict], names,
+                     passwords: Optional[Dict[str, str]] = None) -> None:
+        """
+        Bring `names` in line with `rows` (name -> stored row; missing = removed).
+        The password is decrypted only when its ciphertext changed.
+        The snapshot stays ordered by name, as the dashboard and admin list show it.
+        """
+        changes = []
+        async with self._lock:
+            version, current = self._snapshot
+            routers = None
+            added = False
+            for name in names:
+                row, old_row = rows.get(name), self._rows.get(name)
+                if row == old_row:
+                    continue
+                if routers is None:
+                    routers = dict(current)
+                old = routers.get(name)
+                if row is None:
+                    new = None
+                    del self._rows[name]
+                    routers.pop(name, None)
+                else:
+                    same_secret = old is not None and old_row["password"] == row["password"]
+                    password = old.password if same_secret else (passwords or {}).get(row["password"])
+                    new = self._router(row, password)
+                    self._rows[name] = row
+                    routers[name] = new
+                    added = added or old is None
+                changes.append((name, old, new))
+            if added:
+                routers = dict(sorted(routers.items()))
+            if changes:
+                self._snapshot = (version + 1, MappingProxyType(routers))
+
+        for name, old, new in changes:
+            # Connections of removed routers or to a changed device must not be reused
+            if old is not None and (new is None or any(
+                    getattr(old, f) != getattr(new, f) for f in CONNECTION_FIELDS)):
+                self._drop_pool(name)
+            for listener in self._listeners:
+                try:
+                    listener(name, old, new)
+                except Exception:
+                    logger.exception("Router listener failed for %s", name)
+
+    @staticmethod
+    def _router(row: dict, password: Optional[str] = None) -> Router:
+        return Router(
+            name=row["name"],
+            host=row["host"],
+            username=row["username"],
+            password=password if password is not None else decrypt_password(row["password"]),
+            port=row.get("port", 8728),
+            enabled=row.get("enabled", 1),
+            poll_interval=row.get("poll_interval"),
+            group_name=row.get("group_name"),
+        )
+
     async def shutdown(self) -> None:
         """
         Graceful shutdown hook.
         """
         async with self._lock:
-            self._routers.clear()
+            self._snapshot = (self._snapshot[0] + 1, MappingProxyType({}))
+            self._rows.clear()
+        for name in list(self._pools):
+            self._drop_pool(name)
 
     # =========================
-    # Read access (in-memory)
+    # Read access (in-memory, lock-free)
     # =========================
 
-    async def get_routers(self) -> Dict[str, Router]:
-        async with self._lock:
-            return dict(self._routers)
+    def snapshot(self) -> Tuple[int, Mapping[str, Router]]:
+        """(version, routers); the mapping never changes once handed out."""
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot[0]
+
+    @property
+    def routers(self) -> Mapping[str, Router]:
+        return self._snapshot[1]
+
+    async def get_routers(self) -> Mapping[str, Router]:
+        return self._snapshot[1]
 
     async def get_router(self, name: str) -> Optional[Router]:
-        async with self._lock:
-            return self._routers.get(name)
+        return self._snapshot[1].get(name)
 
     # =========================
-    # Router API factory
+    # Connection pool
     # =========================
 
-    async def get_api(self, name: str) -> Optional[RouterAPI]:
-        """
-        Returns RouterAPI instance or None.
-        Lock is held only to read router data.
-        """
-        async with self._lock:
-            router = self._routers.get(name)
-
-        if not router or not router.enabled:
-            return None
-
-        return RouterAPI(
+    @staticmethod
+    def _api_factory(router: Router) -> Callable[[], RouterAPI]:
+        return lambda: RouterAPI(
             host=router.host,
             username=router.username,
             password=router.password,
             port=router.port,
+            name=router.name,
         )
 
+    @asynccontextmanager
+    async def lease(self, name: str) -> AsyncIterator[Optional[RouterAPI]]:
+        """
+        Exclusive connection to a router for the duration of the block:
+            async with router_manager.lease(name) as api:
+                ...
+        Yields None for unknown / disabled routers.
+        """
+        router = self.routers.get(name)
+        if not router or not router.enabled:
+            yield None
+            return
+
+        pool = self._pools.get(name)
+        if pool is None or pool.closed:
+            pool = self._pools[name] = ConnectionPool(self._api_factory(router))
+
+        api = await pool.acquire()
+        try:
+            yield api
+        finally:
+            await pool.release(api)
+
+    def evict_idle(self) -> int:
+        """Close idle connections of every router; returns how many were closed."""
+        now = time.monotonic()
+        return sum(pool.evict_idle(now) for pool in self._pools.values())
+
+    def _drop_pool(self, name: str) -> None:
+        pool = self._pools.pop(name, None)
+        if pool is not None:
+            pool.close()
+
+    def pool_stats(self) -> dict:
+        return {
+            "pools": len(self._pools),
+            "connections": sum(p.size for p in self._pools.values()),
+            "leased": sum(p.in_use for p in self._pools.values()),
+        }
+
     # =========================
     # CRUD (DB)
     # =========================
@@ -96,8 +311,10 @@ class RouterManager:
         password: str,
         port: int = 8728,
         enabled: int = 1,
+        poll_interval: Optional[int] = None,
+        group_name: Optional[str] = None,
     ) -> None:
-        result = await asyncio.to_thread(
+        result = await DB.run(
             self._add_router_sync,
             name,
             host,
@@ -105,10 +322,12 @@ class RouterManager:
             password,
             port,
             enabled,
+            poll_interval,
+            group_name,
         )
 
         if result is True:
-            await self.reload()
+            await self.refresh(name)
         return result
 
 
@@ -120,8 +339,10 @@ class RouterManager:
         password: str,
         port: int = 8728,
         enabled: int = 1,
+        poll_interval: Optional[int] = None,
+        group_name: Optional[str] = None,
     ) -> None:
-        await asyncio.to_thread(
+        await DB.run(
             self._update_router_sync,
             name,
             host,
@@ -129,12 +350,38 @@ class RouterManager:
             password,
             port,
             enabled,
+            poll_interval,
+            group_name,
         )
-        await self.reload()
+        await self.refresh(name)
+
+    async def import_routers(self, rows: List[dict], replace: bool = False) -> Tuple[int, int]:
+        """
+        Store validated routers (see bulk.validate_rows) in one transaction
+        and refresh the registry once. Passwords are encrypted in chunks on
+        worker threads. Returns (added, updated).
+        Raises ValueError if names exist and `replace` is off; nothing is written then.
+        """
+        chunks = [rows[i:i + IMPORT_ENCRYPT_CHUNK] for i in range(0, len(rows), IMPORT_ENCRYPT_CHUNK)]
+        encrypted = await asyncio.gather(*(asyncio.to_thread(self._encrypt_rows, c) for c in chunks))
+        stored = [row for chunk in encrypted for row in chunk]
+
+        added, updated, conflicts = await DB.run(db.import_routers, stored, replace)
+        if conflicts:
+            shown = ", ".join(conflicts[:10]) + (", ..." if len(conflicts) > 10 else "")
+            raise ValueError(f"{len(conflicts)} routers already exist: {shown}")
+
+        await self.load({s["password"]: r["password"] for s, r in zip(stored, rows)})
+        logger.info("Imported routers: %d added, %d updated", added, updated)
+        return added, updated
+
+    @staticmethod
+    def _encrypt_rows(rows: List[dict]) -> List[dict]:
+        return [dict(row, password=encrypt_password(row["password"])) for row in rows]
 
     async def delete_router(self, name: str) -> None:
-        await asyncio.to_thread(self._delete_router_sync, name)
-        await self.reload()
+        await DB.run(db.delete_router, name)
+        await self.refresh(name)
 
     # =========================
     # Sync DB helpers
@@ -148,32 +395,14 @@ class RouterManager:
         password: str,
         port: int,
         enabled: int,
+        poll_interval: Optional[int],
+        group_name: Optional[str],
     ) -> None:
-        conn = get_connection()
         try:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                INSERT INTO routers (name, host, username, password, port, enabled)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    name,
-                    host,
-                    username,
-                    encrypt_password(password),
-                    port,
-                    enabled,
-                ),
-            )
-            conn.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
+            return db.add_router(name, host, username, encrypt_password(password),
+                                 port, enabled, poll_interval, group_name)
         except Exception as e:
             return e
-        finally:
-            conn.close()
 
 
     def _update_router_sync(
@@ -184,45 +413,17 @@ class RouterManager:
         password: str,
         port: int,
         enabled: int,
+        poll_interval: Optional[int],
+        group_name: Optional[str],
     ) -> None:
-        conn = get_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                UPDATE routers
-                SET host=?, username=?, password=?, port=?, enabled=?
-                WHERE name=?
-                """,
-                (
-                    host,
-                    username,
-                    encrypt_password(password),
-                    port,
-                    enabled,
-                    name,
-                ),
-            )
-            conn.commit()
-        finally:
-            conn.close()
-
-
-    def _delete_router_sync(self, name: str) -> None:
-        conn = get_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute("DELETE FROM routers WHERE name=?", (name,))
-            conn.commit()
-        finally:
-            conn.close()
+        db.update_router(name, host, username, encrypt_password(password),
+                         port, enabled, poll_interval, group_name)
 
 
     async def get_ip(self, name: str) -> Optional[str]:
-        async with self._lock:
-            router = self._routers.get(name)
-            if not router:
-                return None
-            return router.host
+        router = self.routers.get(name)
+        if not router:
+            return None
+        return router.host
 
 
@@ -0,0 +1,270 @@
+# app/routeros.py
+# Native asyncio RouterOS API client (tagged requests over one socket)
+
+import asyncio
+import itertools
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from librouteros.exceptions import ConnectionClosed, FatalError, MultiTrapError, ProtocolError, TrapError
+from librouteros.login import encode_password
+from librouteros.protocol import parse_word
+
+logger = logging.getLogger(__name__)
+
+ENCODING = "utf-8"
+
+
+# =========================
+# Word / sentence encoding
+# =========================
+
+def encode_length(length: int) -> bytes:
+    """RouterOS variable length prefix (1-5 bytes)."""
+    if length < 0x80:
+        return length.to_bytes(1, "big")
+    if length < 0x4000:
+        return (length | 0x8000).to_bytes(2, "big")
+    if length < 0x200000:
+        return (length | 0xC00000).to_bytes(3, "big")
+    if length < 0x10000000:
+        return (length | 0xE0000000).to_bytes(4, "big")
+    return b"\xf0" + length.to_bytes(4, "big")
+
+
+def encode_word(word: str) -> bytes:
+    data = word.encode(ENCODING)
+    return encode_length(len(data)) + data
+
+
+def encode_sentence(*words: str) -> bytes:
+    """Words + terminating zero-length word."""
+    return b"".join(encode_word(w) for w in words) + b"\x00"
+
+
+async def read_length(reader: asyncio.StreamReader) -> int:
+    first = (await reader.readexactly(1))[0]
+    if first < 0x80:
+        return first
+    if first < 0xC0:
+        rest = await reader.readexactly(1)
+        return int.from_bytes(bytes([first]) + rest, "big") & 0x3FFF
+    if first < 0xE0:
+        rest = await reader.readexactly(2)
+        return int.from_bytes(bytes([first]) + rest, "big") & 0x1FFFFF
+    if first < 0xF0:
+        rest = await reader.readexactly(3)
+        return int.from_bytes(bytes([first]) + rest, "big") & 0xFFFFFFF
+    if first == 0xF0:
+        return int.from_bytes(await reader.readexactly(4), "big")
+    raise ProtocolError(f"Unknown control byte {first:#x}")
+
+
+async def read_sentence(reader: asyncio.StreamReader) -> List[str]:
+    words = []
+    while True:
+        length = await read_length(reader)
+        if length == 0:
+            return words
+        data = await reader.readexactly(length)
+        words.append(data.decode(ENCODING, errors="replace"))
+
+
+def parse_sentence(words: List[str]) -> Tuple[str, Optional[str], Dict[str, object]]:
+    """
+    Split a reply sentence into (reply word, tag, attributes).
+    Attribute values are cast the same way librouteros does it,
+    so RouterAPI sees identical dicts on both transports.
+    """
+    reply_word = words[0] if words else ""
+    tag = None
+    attrs: Dict[str, object] = {}
+    for word in words[1:]:
+        if word.startswith(".tag="):
+            tag = word[5:]
+        elif word.startswith("="):
+            key, value = parse_word(word)
+            attrs[key] = value
+    return reply_word, tag, attrs
+
+
+# =========================
+# Client
+# =========================
+
+class _Request:
+    __slots__ = ("rows", "traps", "future")
+
+    def __init__(self, future: asyncio.Future):
+        self.rows: List[dict] = []
+        self.traps: List[TrapError] = []
+        self.future = future
+
+
+class RouterOSClient:
+    """
+    One TCP connection to the RouterOS API.
+
+    Every request carries its own `.tag`, a single reader task routes
+    the replies back to the waiting coroutine, so any number of
+    requests can be in flight on the same socket at the same time.
+    """
+
+    def __init__(self, host: str, port: int = 8728, timeout: float = 10,
+                 connect_timeout: Optional[float] = None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout  # per request (read)
+        self.connect_timeout = timeout if connect_timeout is None else connect_timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[str, _Request] = {}
+        self._tags = itertools.count(1)
+        self._closed = True
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    # --- Lifecycle ---
+
+    async def open(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port),
+            timeout=self.connect_timeout,
+        )
+        self._closed = False
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def login(self, username: str, password: str) -> None:
+        """
+        Post-6.43 plain login; falls back to the MD5 challenge
+        if the router answers with a `ret` token (old RouterOS).
+        """
+        reply = await self.call("/login", f"=name={username}", f"=password={password}")
+        if reply and "ret" in reply[0]:
+            token = str(reply[0]["ret"])
+            await self.call("/login", f"=name={username}", f"=response={encode_password(token, password)}")
+
+    @classmethod
+    async def connect(cls, host: str, username: str, password: str,
+                      port: int = 8728, timeout: float = 10,
+                      connect_timeout: Optional[float] = None) -> "RouterOSClient":
+        client = cls(host, port=port, timeout=timeout, connect_timeout=connect_timeout)
+        await client.open()
+        try:
+            await client.login(username, password)
+        except BaseException:
+            client.close()
+            raise
+        return client
+
+    def close(self) -> None:
+        if self._closed and self._writer is None:
+            return
+        self._closed = True
+        if self._reader_task is not None and self._reader_task is not asyncio.current_task():
+            self._reader_task.cancel()
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        self._writer = None
+        self._fail_pending(ConnectionClosed("Connection closed"))
+
+    # --- Requests ---
+
+    async def call(self, command: str, *words: str) -> List[dict]:
+        """
+        Send one command and wait for its !done.
+        Returns the list of !re rows; raises TrapError on !trap.
+        """
+        if self._closed or self._writer is None:
+            raise ConnectionClosed("Connection closed")
+
+        tag = str(next(self._tags))
+        request = _Request(asyncio.get_running_loop().create_future())
+        self._pending[tag] = request
+
+        try:
+            self._writer.write(encode_sentence(command, *words, f".tag={tag}"))
+            await self._writer.drain()
+            return await asyncio.wait_for(asyncio.shield(request.future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # A request that never finished leaves the stream in an unknown state
+            self.close()
+            raise
+        finally:
+            self._pending.pop(tag, None)
+
+    # --- Reader ---
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                words = await read_sentence(self._reader)
+                self._dispatch(words)
+        except asyncio.CancelledError:
+            pass
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            logger.debug("RouterOS %s: connection lost: %s", self.host, e)
+            self._fail_pending(ConnectionClosed(str(e) or "Connection lost"))
+        except FatalError as e:
+            self._fail_pending(e)
+        except Exception as e:
+            logger.warning("RouterOS %s: reader failed: %s", self.host, e)
+            self._fail_pending(ProtocolError(str(e)))
+        finally:
+            self._closed = True
+            if self._writer is not None:
+                try:
+                    self._writer.close()
+                except Exception:
+                    pass
+                self._writer = None
+
+    def _dispatch(self, words: List[str]) -> None:
+        reply_word, tag, attrs = parse_sentence(words)
+
+        if reply_word == "!fatal":
+            # Router is closing the session: nothing after this is valid
+            message = words[1] if len(words) > 1 else "fatal"
+            raise FatalError(message)
+
+        request = self._pending.get(tag) if tag is not None else None
+        if request is None:
+            return
+
+        if reply_word == "!re":
+            request.rows.append(attrs)
+        elif reply_word == "!trap":
+            request.traps.append(TrapError(
+                message=str(attrs.get("message", "")),
+                category=attrs.get("category"),
+            ))
+        elif reply_word == "!done":
+            if attrs:
+                request.rows.append(attrs)
+            self._finish(request)
+        # "!empty" (RouterOS 7.18+) carries no rows and is followed by !done
+
+    @staticmethod
+    def _finish(request: _Request) -> None:
+        if request.future.done():
+            return
+        if len(request.traps) > 1:
+            request.future.set_exception(MultiTrapError(*request.traps))
+        elif request.traps:
+            request.future.set_exception(request.traps[0])
+        else:
+            request.future.set_result(request.rows)
+
+    def _fail_pending(self, exc: Exception) -> None:
+        for request in list(self._pending.values()):
+            if not request.future.done():
+                request.future.set_exception(exc)
+                # mark retrieved: the caller may already be gone (timeout)
+                request.future.exception()
+        self._pending.clear()
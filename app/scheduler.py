@@ -0,0 +1,128 @@
+# app/scheduler.py
+# Staggered per-router poll scheduler
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import zlib
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PollScheduler:
+    """
+    Heap of (next due time, router name).
+
+    Routers are spread evenly across their interval, and every router
+    runs on its own schedule: the next poll is booked when the previous
+    one finishes, so a slow router never delays the others.
+    """
+
+    def __init__(
+        self,
+        poll: Callable[[str], Awaitable[None]],
+        interval_for: Callable[[str], float],
+        min_interval: float = 1.0,
+    ):
+        self._poll = poll
+        self._interval_for = interval_for
+        self._min_interval = min_interval
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._names: set = set()
+        # name -> seq of its live heap entry (older entries are skipped)
+        self._booked: Dict[str, int] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+
+    # =========================
+    # Router set
+    # =========================
+
+    def sync(self, names: Iterable[str]) -> None:
+        """
+        Follow the router list: new routers are booked, removed ones
+        are dropped lazily when they come up in the heap.
+        """
+        names = set(names)
+        added = sorted(names - self._names)
+        first_sync = not self._names
+        for name in self._names - names:
+            self._booked.pop(name, None)
+        self._names = names
+
+        now = time.monotonic()
+        for i, name in enumerate(added):
+            interval = self.interval(name)
+            if first_sync:
+                # Even spread of the whole fleet over one interval
+                offset = interval * i / len(added)
+            else:
+                # Stable phase for routers added later
+                offset = interval * (zlib.crc32(name.encode()) % 1000) / 1000
+            self._push(now + offset, name)
+
+        if added:
+            self._wakeup.set()
+
+    def interval(self, name: str) -> float:
+        return max(self._min_interval, float(self._interval_for(name)))
+
+    def _push(self, due: float, name: str) -> None:
+        seq = next(self._seq)
+        self._booked[name] = seq
+        heapq.heappush(self._heap, (due, seq, name))
+
+    # =========================
+    # Loop
+    # =========================
+
+    async def run(self, shutdown_event: asyncio.Event) -> None:
+        try:
+            while not shutdown_event.is_set():
+                delay = self._heap[0][0] - time.monotonic() if self._heap else 1.0
+                if delay > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, 1.0))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                due, seq, name = heapq.heappop(self._heap)
+                if self._booked.get(name) != seq or name in self._running:
+                    continue
+                del self._booked[name]
+
+                self._running[name] = asyncio.create_task(self._run_one(name, due))
+        finally:
+            tasks = list(self._running.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_one(self, name: str, due: float) -> None:
+        try:
+            await self._poll(name)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Poll of router %s failed: %s", name, e)
+        finally:
+            self._running.pop(name, None)
+
+        if name in self._names:
+            # Keep the phase; if the poll overran its slot, go again right away
+            self._push(max(due + self.interval(name), time.monotonic()), name)
+            self._wakeup.set()
+
+    # =========================
+    # Introspection
+    # =========================
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
@@ -1,21 +1,39 @@
 import asyncio
 import logging
-from typing import Dict, Set, Tuple
-from starlette.websockets import WebSocket
-
+import time
+from collections import deque
+from typing import Deque, Dict, Set, Tuple
+
+from .alerts import ALERTS, ALERT_INTERVAL, reload_rules
+from .auth import LOGIN_THROTTLE, PASSWORDS
+from .broadcast import Broadcaster
+from .db import DB
+from .history import HISTORY, METRICS
+from .ringbuffer import RECENT
+from .executor import ROUTER_EXECUTOR, wait_for_running
+from .mikrotik import ROUND_TRIPS, ROUTER_BREAKERS, CircuitBreaker, forget_router, reset_router_state
 from .router_manager import RouterManager
-from .notifications import send_telegram, fmt_down, fmt_up, fmt_reconnect_alert
+from .scheduler import PollScheduler
+from .notifications import send_telegram, send_event, telegram_stats
+from .notifications import fmt_rule_alert, fmt_rule_clear
 
 logger = logging.getLogger(__name__)
 
-ROUTER_APIS: Dict[str, object] = {}
 STATUS_CACHE: Dict[str, dict] = {}
-CACHE_INTERVAL = 5
+CACHE_INTERVAL = 5  # default poll interval per router (routers.poll_interval overrides)
 TIMEOUT_PER_ROUTER = 5
+BROADCAST_INTERVAL = 1  # deltas only carry what changed, so they can go out often
 
 _cache_lock = asyncio.Lock()
-connected_websockets: Set[WebSocket] = set()
 router_manager = RouterManager()
+# Routers that reported since the last broadcast
+_dirty: Set[str] = set()
+_scheduler = None
+# Last broadcast state (what clients have after applying every delta), its version,
+# and the registry version clients were last told about
+_sent: Dict[str, dict] = {}
+_seq = 0
+_sent_registry = 0
 
 # --- Telegram notifications ------------------------
 # name -> "up" / "down"
@@ -24,150 +42,370 @@ ROUTER_STATE = {}
 ROUTER_DOWN_STREAK = {}
 # name -> last sent reconnects alert
 ROUTER_RECONNECT_ALERT = {}
+RECONNECT_ALERT_STEP = 10  # an alert every +10 reconnects
+# Metric thresholds are alert rules (see alerts.py), not branches here
 # ---------------------------------------------------
 
+# --- Adaptive poll intervals -----------------------
+DOWN_ALERT_STREAK = 3      # failed checks in a row before DOWN is sent
+DOWN_MAX_INTERVAL = 300    # cap for the backoff of routers that are DOWN (seconds)
+FLAP_WINDOW = 600          # transitions are counted over this window (seconds)
+FLAP_THRESHOLD = 3         # up/down transitions in the window → flapping
+RECOVERY_WINDOW = 120      # a router is "recently recovered" for this long (seconds)
+FAST_FACTOR = 0.5          # flapping / recovered routers: base interval * factor
+# name -> monotonic times of up/down transitions within FLAP_WINDOW
+ROUTER_TRANSITIONS: Dict[str, Deque[float]] = {}
+# ---------------------------------------------------
 
 
-async def _fetch_router_status(name: str) -> Tuple[str, dict]:
-    api = ROUTER_APIS.get(name)
 
-    if not api:
-        try:
-            api = await router_manager.get_api(name)
-        except Exception as e:
-            logger.warning("get_api(%s) failed: %s", name, e)
-            return name, {"status": "No"}
+async def _fetch_router_status(name: str) -> Tuple[str, dict]:
+    try:
+        async with router_manager.lease(name) as api:
+            if not api:
+                return name, {"status": "No"}
+            return name, await _get_status(name, api)
+    except asyncio.TimeoutError:
+        # No free connection in the router's pool
+        logger.warning("No connection available for router %s", name)
+        return name, {"status": "No"}
 
-        if api:
-            ROUTER_APIS[name] = api
-        else:
-            return name, {"status": "No"}
 
+async def _get_status(name: str, api) -> dict:
     try:
-        status = await asyncio.wait_for(
-            asyncio.to_thread(api.get_status),
+        # The timeout starts when the work runs, not while it waits for a thread
+        status = await wait_for_running(
+            api.get_status(),
             timeout=TIMEOUT_PER_ROUTER,
+            clock=api.io_clock,
         )
 
         if isinstance(status, dict) and "error" in status:
             logger.warning("Router %s returned error status: %s", name, status)
-            return name, {"status": "No"}
+            return {"status": "No"}
 
-        return name, status
+        return status
 
     except asyncio.TimeoutError:
         logger.warning("Timeout getting status from router %s", name)
-        return name, {"status": "No"}
+        return {"status": "No"}
 
     except Exception as e:
         logger.exception("Error getting status from router %s: %s", name, e)
+        # Broken connection is not returned to the pool
         try:
             api.close()
         except Exception:
             pass
-        ROUTER_APIS.pop(name, None)
-        return name, {"status": "No"}
+        return {"status": "No"}
 
 
 
-async def update_status_periodically(shutdown_event: asyncio.Event):
+async def _apply_status(name: str, status: dict) -> None:
+    """Store one router's poll result and run the notification logic."""
+    async with _cache_lock:
+        STATUS_CACHE[name] = status
+    _dirty.add(name)
+    if status.get("status") == "Yes":
+        now = time.time()
+        RECENT.append(name, status, now)
+        HISTORY.record(name, status, now)
+
+    # === TELEGRAM NOTIFICATIONS ===
+
+    curr_status = "up" if status.get("status") == "Yes" else "down"
+    prev_status = ROUTER_STATE.get(name)
+
+    # --- DOWN streak logic ---
+    if curr_status == "down":
+        ROUTER_DOWN_STREAK[name] = ROUTER_DOWN_STREAK.get(name, 0) + 1
+    else:
+        ROUTER_DOWN_STREAK[name] = 0
+
+    # DOWN only if 3 checks in a row
+    if curr_status == "down" and ROUTER_DOWN_STREAK[name] == DOWN_ALERT_STREAK:
+        await send_event("down", name)
+
+    # UP event (only if previously down)
+    if curr_status == "up" and prev_status == "down":
+        await send_event("up", name)
+
+    # Save state
+    if prev_status is not None and prev_status != curr_status:
+        ROUTER_TRANSITIONS.setdefault(name, deque()).append(time.monotonic())
+    ROUTER_STATE[name] = curr_status
+
+    # --- Reconnect alert ---
+    reconnects = status.get("reconnects")
+    if isinstance(reconnects, int):
+        last_alert = ROUTER_RECONNECT_ALERT.get(name, 0)
+
+        if reconnects >= last_alert + RECONNECT_ALERT_STEP:
+            await send_event("reconnects", name, reconnects)
+            ROUTER_RECONNECT_ALERT[name] = reconnects
+
+
+async def _poll_router(name: str) -> None:
     try:
-        while not shutdown_event.is_set():
-            try:
-                routers = await router_manager.get_routers()
-            except Exception as e:
-                logger.exception("Error getting routers list: %s", e)
-                await asyncio.sleep(CACHE_INTERVAL)
-                continue
+        _, status = await _fetch_router_status(name)
+    except Exception as e:
+        logger.exception("Task for router %s failed: %s", name, e)
+        status = {"status": "No"}
+    if name not in router_manager.routers:
+        # Deleted while it was being polled
+        return
+    await _apply_status(name, status)
+
+
+def _on_router_change(name: str, old, new) -> None:
+    """
+    Registry listener: per-router runtime state follows the registry
+    right away instead of outliving the router.
+    """
+    if new is None:
+        _dirty.discard(name)
+        for table in (STATUS_CACHE, ROUTER_STATE, ROUTER_DOWN_STREAK,
+                      ROUTER_RECONNECT_ALERT, ROUTER_TRANSITIONS):
+            table.pop(name, None)
+        RECENT.drop(name)
+        forget_router(name)
+        return
+
+    if old is not None and (old.host, old.port, old.username, old.password) != \
+            (new.host, new.port, new.username, new.password):
+        reset_router_state(name)
+
+
+router_manager.add_listener(_on_router_change)
+
+
+def _poll_interval(name: str) -> float:
+    """
+    Interval until the router's next poll:
+    - DOWN (alert already sent): exponential backoff up to DOWN_MAX_INTERVAL
+    - flapping or recently recovered: faster than the base interval
+    - otherwise: base interval (routers.poll_interval or CACHE_INTERVAL)
+    Failed checks before the DOWN alert keep the base interval,
+    so DOWN is still sent after DOWN_ALERT_STREAK checks in a row.
+    """
+    router = router_manager.routers.get(name)
+    base = router.poll_interval if router is not None and router.poll_interval else CACHE_INTERVAL
+
+    streak = ROUTER_DOWN_STREAK.get(name, 0)
+    if streak >= DOWN_ALERT_STREAK:
+        backoff = base * 2 ** (streak - DOWN_ALERT_STREAK + 1)
+        return min(max(base, DOWN_MAX_INTERVAL), backoff)
+
+    transitions = ROUTER_TRANSITIONS.get(name)
+    if transitions:
+        now = time.monotonic()
+        while transitions and now - transitions[0] > FLAP_WINDOW:
+            transitions.popleft()
+        flapping = len(transitions) >= FLAP_THRESHOLD
+        recovered = (
+            bool(transitions)
+            and ROUTER_STATE.get(name) == "up"
+            and now - transitions[-1] <= RECOVERY_WINDOW
+        )
+        if flapping or recovered:
+            return base * FAST_FACTOR
 
-            logger.debug("Polling routers: %s", routers)
+    return base
 
-            tasks = [
-                _fetch_router_status(name)
-                for name in routers
-            ]
 
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+# =========================
+# Versioned snapshots
+# =========================
 
-            snapshot: Dict[str, dict] = {}
+_MISSING = object()
 
-            for name, result in zip(routers, results):
-                # name is the key from routers (router name)
-                if isinstance(result, Exception):
-                    logger.exception("Task for router %s failed: %s", name, result)
-                    status = {"status": "No"}
-                    snapshot[name] = status
 
-                    # === TELEGRAM NOTIFICATIONS FOR EXCEPTIONS ===
-                    curr_status = "down"
-                    prev_status = ROUTER_STATE.get(name)
+def status_delta(prev: dict, curr: dict) -> dict:
+    """Fields of `curr` that differ from `prev`; fields that disappeared are None."""
+    delta = {k: v for k, v in curr.items() if prev.get(k, _MISSING) != v}
+    for k in prev.keys() - curr.keys():
+        delta[k] = None
+    return delta
 
-                    # increase streak drops
-                    ROUTER_DOWN_STREAK[name] = ROUTER_DOWN_STREAK.get(name, 0) + 1
 
-                    # DOWN - only if 3 times in a row
-                    if ROUTER_DOWN_STREAK[name] == 3:
-                        await send_telegram(fmt_down(name))
+def full_snapshot() -> dict:
+    """Full state at the current version, sent on connect and on resync."""
+    return {"type": "full", "seq": _seq, "registry": _sent_registry, "routers": dict(_sent)}
 
-                    # Save current state
-                    ROUTER_STATE[name] = curr_status
 
-                    # there are no reconnects here, skip it
-                    continue
+async def _next_delta():
+    """
+    Routers that changed since the last broadcast, field by field.
+    A removed router is sent as None. Also sent (possibly without routers)
+    when the registry version moved, so dashboards add and drop cards.
+    Returns None if nothing changed.
+    """
+    global _seq, _sent_registry
 
-                # normal result
-                r_name, status = result
-                snapshot[r_name] = status
+    dirty = set(_dirty)
+    _dirty.clear()
+    async with _cache_lock:
+        current = {name: STATUS_CACHE[name] for name in dirty if name in STATUS_CACHE}
+        removed = _sent.keys() - STATUS_CACHE.keys()
 
-                # === TELEGRAM NOTIFICATIONS ===
+    routers = {}
+    for name, status in current.items():
+        delta = status_delta(_sent.get(name, {}), status)
+        if delta:
+            routers[name] = delta
+            _sent[name] = dict(status)
+    for name in removed:
+        routers[name] = None
+        del _sent[name]
 
-                curr_status = "up" if status.get("status") == "Yes" else "down"
-                prev_status = ROUTER_STATE.get(r_name)
+    registry = router_manager.version
+    if not routers and registry == _sent_registry:
+        return None
+    _seq += 1
+    _sent_registry = registry
+    return {"type": "delta", "seq": _seq, "registry": registry, "routers": routers}
 
-                # --- DOWN streak logic ---
-                if curr_status == "down":
-                    ROUTER_DOWN_STREAK[r_name] = ROUTER_DOWN_STREAK.get(r_name, 0) + 1
-                else:
-                    ROUTER_DOWN_STREAK[r_name] = 0
 
-                # DOWN only if 3 checks in a row
-                if curr_status == "down" and ROUTER_DOWN_STREAK[r_name] == 3:
-                    await send_telegram(fmt_down(r_name))
+async def _broadcast_periodically(shutdown_event: asyncio.Event) -> None:
+    """Hand the changes to the broadcaster once per BROADCAST_INTERVAL."""
+    while not shutdown_event.is_set():
+        await asyncio.sleep(BROADCAST_INTERVAL)
+        message = await _next_delta()
+        if message is None:
+            broadcaster.check_lag()
+            continue
 
-                # UP event (only if previously down)
-                if curr_status == "up" and prev_status == "down":
-                    await send_telegram(fmt_up(r_name))
+        logger.debug("Delta to send: %s", message)
+        broadcaster.publish(message)
 
-                # Save state
-                ROUTER_STATE[r_name] = curr_status
 
-                # --- Reconnect alert ---
-                reconnects = status.get("reconnects")
-                if isinstance(reconnects, int):
-                    last_alert = ROUTER_RECONNECT_ALERT.get(r_name, 0)
+broadcaster = Broadcaster(full_snapshot)
 
-                    # send an alert every +10 reconnects
-                    if reconnects >= last_alert + 10:
-                        await send_telegram(fmt_reconnect_alert(r_name, reconnects))
-                        ROUTER_RECONNECT_ALERT[r_name] = reconnects
 
-            async with _cache_lock:
-                STATUS_CACHE.update(snapshot)
+# =========================
+# Alert rules
+# =========================
 
-            logger.debug("Snapshot to send: %s", snapshot)
+async def _evaluate_alerts_periodically(shutdown_event: asyncio.Event) -> None:
+    """
+    Every ALERT_INTERVAL all rules are checked against the newest sample
+    of every router in one pass (AlertEngine.evaluate), off the poll path.
+    """
+    try:
+        await reload_rules()
+    except Exception as e:
+        logger.exception("Error loading alert rules: %s", e)
+
+    while not shutdown_event.is_set():
+        await asyncio.sleep(ALERT_INTERVAL)
+        try:
+            ts, values = RECENT.latest(ALERTS.names, METRICS)
+            events = ALERTS.evaluate(ts, values)
+        except Exception as e:
+            logger.exception("Error evaluating alert rules: %s", e)
+            continue
+
+        for rule, kind, items in events:
+            fmt = fmt_rule_alert if kind == "fire" else fmt_rule_clear
+            await send_telegram(fmt(rule, items))
+
+
+# =========================
+# Event loop lag
+# =========================
+
+LOOP_LAG_INTERVAL = 0.1
+# Last 5 minutes of wake-up delays (seconds)
+_loop_lags: Deque[float] = deque(maxlen=3000)
+
+
+async def _watch_loop_lag(shutdown_event: asyncio.Event) -> None:
+    """How late a 100 ms sleep wakes up: the stall every task on the loop sees."""
+    while not shutdown_event.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        _loop_lags.append(max(0.0, time.perf_counter() - start - LOOP_LAG_INTERVAL))
+
+
+def _loop_lag_stats() -> dict:
+    lags = sorted(_loop_lags)
+    if not lags:
+        return {"lag_p50_ms": 0.0, "lag_p99_ms": 0.0, "lag_max_ms": 0.0}
+    return {
+        "lag_p50_ms": round(lags[len(lags) // 2] * 1000, 1),
+        "lag_p99_ms": round(lags[int(len(lags) * 0.99)] * 1000, 1),
+        "lag_max_ms": round(lags[-1] * 1000, 1),
+    }
+
+
+def collect_metrics() -> dict:
+    """Poller internals for /admin/metrics."""
+    breakers = {CircuitBreaker.CLOSED: 0, CircuitBreaker.OPEN: 0, CircuitBreaker.HALF_OPEN: 0}
+    not_closed = {}
+    for name, breaker in ROUTER_BREAKERS.items():
+        breakers[breaker.state] += 1
+        if breaker.state != CircuitBreaker.CLOSED:
+            not_closed[name] = {"state": breaker.state, "failures": breaker.failures}
+
+    return {
+        "routers": len(router_manager.routers),
+        "registry_version": router_manager.version,
+        "polls_in_flight": _scheduler.in_flight if _scheduler else 0,
+        "breakers": breakers,
+        "breakers_not_closed": not_closed,
+        "polls_rejected_by_breaker": sum(b.rejected for b in ROUTER_BREAKERS.values()),
+        "round_trips": ROUND_TRIPS["sent"],
+        "round_trips_saved": ROUND_TRIPS["saved"],
+        "router_io": ROUTER_EXECUTOR.stats(),
+        "connections": router_manager.pool_stats(),
+        "broadcast": broadcaster.stats(),
+        "history": HISTORY.stats(),
+        "recent": RECENT.stats(),
+        "alerts": ALERTS.stats(),
+        "telegram": telegram_stats(),
+        "db": DB.stats(),
+        "passwords": PASSWORDS.stats(),
+        "login": LOGIN_THROTTLE.stats(),
+        "event_loop": _loop_lag_stats(),
+    }
 
-            if connected_websockets:
-                dead = set()
-                for ws in connected_websockets:
-                    try:
-                        await ws.send_json(snapshot)
-                    except Exception:
-                        dead.add(ws)
 
-                connected_websockets.difference_update(dead)
+async def update_status_periodically(shutdown_event: asyncio.Event):
+    """
+    Each router is polled on its own schedule (see PollScheduler);
+    the router list is followed every CACHE_INTERVAL, and only re-synced
+    when the registry version changed.
+    """
+    global _scheduler
+
+    scheduler = _scheduler = PollScheduler(_poll_router, _poll_interval)
+    tasks = [
+        asyncio.create_task(scheduler.run(shutdown_event)),
+        asyncio.create_task(_broadcast_periodically(shutdown_event)),
+        asyncio.create_task(_evaluate_alerts_periodically(shutdown_event)),
+        asyncio.create_task(_watch_loop_lag(shutdown_event)),
+    ]
+
+    synced = None
+    try:
+        while not shutdown_event.is_set():
+            try:
+                version, routers = router_manager.snapshot()
+                if version != synced:
+                    scheduler.sync(routers)
+                    ALERTS.set_routers(routers, CACHE_INTERVAL)
+                    synced = version
+                    logger.debug("Polling routers (registry v%d): %s", version, list(routers))
+                router_manager.evict_idle()
+            except Exception as e:
+                logger.exception("Error getting routers list: %s", e)
 
             await asyncio.sleep(CACHE_INTERVAL)
 
     except asyncio.CancelledError:
         logger.info("update_status_periodically cancelled")
         raise
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
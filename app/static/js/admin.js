@@ -21,6 +21,64 @@ document.querySelectorAll(".delete-router-form").forEach(form => {
 });
 
 
+//Bulk import (CSV / JSON) /templates/admin_routers.html
+document.addEventListener("DOMContentLoaded", () => {
+    const form = document.getElementById("importForm");
+
+    if (!form) return;
+
+    form.addEventListener("submit", async (e) => {
+        e.preventDefault();
+
+        const response = await fetch("/admin/routers/import", {
+            method: "POST",
+            body: new FormData(form)
+        });
+        const data = await response.json();
+
+        if (!response.ok) {
+            showToast(data.error, "error");
+            return;
+        }
+
+        showToast(`Imported: ${data.added} added, ${data.updated} updated`, "success");
+        setTimeout(() => window.location.reload(), 1500);
+    });
+});
+
+
+//Export with passwords (POST, admin password re-entered) /templates/admin_routers.html
+document.addEventListener("DOMContentLoaded", () => {
+    const form = document.getElementById("exportForm");
+
+    if (!form) return;
+
+    form.addEventListener("submit", async (e) => {
+        e.preventDefault();
+
+        const formData = new FormData(form);
+        const response = await fetch("/admin/routers/export", {
+            method: "POST",
+            body: formData
+        });
+        form.reset();
+
+        if (!response.ok) {
+            const data = await response.json();
+            showToast(data.error, "error");
+            return;
+        }
+
+        const url = URL.createObjectURL(await response.blob());
+        const link = document.createElement("a");
+        link.href = url;
+        link.download = `routers.${formData.get("format")}`;
+        link.click();
+        setTimeout(() => URL.revokeObjectURL(url), 1000);
+    });
+});
+
+
 //Delete user confirmation /templates/admin_users.html
 document.querySelectorAll(".delete-user-form").forEach(form => {
     const btn = form.querySelector("button");
@@ -17,6 +17,7 @@ function createCard(name) {
   const card = document.createElement("div");
   card.className = "card collapsed";
   card.dataset.name = name.toLowerCase();
+  card.dataset.router = name;
 
   card.innerHTML = `
     <div class="card-header">
@@ -50,6 +51,13 @@ function createCard(name) {
         log
         </button>
 
+        <button class="card-btn chart"
+              data-action="chart"
+              data-router="${name}"
+              title="Open router's history charts">
+        chart
+        </button>
+
         <button class="card-btn webfig"
               data-action="webfig"
               data-router="${name}"
@@ -99,6 +107,9 @@ container.addEventListener("click", (e) => {
   if (action === "log") {
     openLog(router);
   }
+  if (action === "chart") {
+    openChart(router);
+  }
 
 });
 /* toggle */
@@ -122,14 +133,106 @@ toggleAllBtn.addEventListener("click", () => {
   toggleAllBtn.textContent = allCollapsed ? "▸▸" : "▾▾";
 });
 
-/* search */
+/* search: hide cards here, and only stream the matching routers */
+let subscribeTimer = null;
+
 searchInput.addEventListener("input", e => {
   const term = e.target.value.toLowerCase();
   document.querySelectorAll(".card").forEach(card => {
     card.style.display = card.dataset.name.includes(term) ? "" : "none";
   });
+
+  clearTimeout(subscribeTimer);
+  subscribeTimer = setTimeout(() => {
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({ type: "subscribe", search: term }));
+    }
+  }, 300);
 });
 
+/* Status state: full snapshot on connect, then deltas numbered by seq */
+let state = {};
+let seq = null;
+let socket = null;
+/* Registry version the cards were built for */
+let registry = window.REGISTRY_VERSION ?? null;
+
+/* Routers were added or removed on the server: add / drop cards to match */
+async function syncCards(version) {
+  if (version == null || version === registry) return;
+  registry = version;
+  try {
+    const r = await fetch("/api/routers");
+    if (!r.ok) throw new Error(`HTTP ${r.status}`);
+    const data = await r.json();
+    registry = data.version;
+
+    const names = new Set(data.routers);
+    const shown = new Set();
+    document.querySelectorAll(".card").forEach(card => {
+      if (names.has(card.dataset.router)) shown.add(card.dataset.router);
+      else card.remove();
+    });
+
+    const term = searchInput.value.toLowerCase();
+    data.routers.filter(name => !shown.has(name)).forEach(name => {
+      createCard(name);
+      const card = container.lastElementChild;
+      card.style.display = card.dataset.name.includes(term) ? "" : "none";
+      render(name);
+    });
+  } catch (err) {
+    registry = null;
+    console.error("Router list sync failed:", err);
+  }
+}
+
+function render(name) {
+  const d = state[name] || {};
+  const card = document.querySelector(`[data-name="${name.toLowerCase()}"]`);
+  if (!card) return;
+
+  if (d.webfig_host) card.dataset.webfigHost = d.webfig_host;
+  if (d.webfig_proto) card.dataset.webfigProto = d.webfig_proto;
+  if (d.webfig_port) card.dataset.webfigPort = d.webfig_port;
+  if (d.log) card.dataset.log = JSON.stringify(d.log);
+
+  set(`ipv4-${name}`, d.ipv4);
+  set(`board-${name}`, d.board);
+  set(`uptime-${name}`, d.uptime);
+  set(`version-${name}`, d.version);
+  set(`iface-${name}`, d.iface);
+  set(`speed-${name}`, d.speed);
+
+  const tReconnects = document.getElementById(`reconnects-${name}`);
+  if (d.reconnects != null) {
+    tReconnects.textContent = `${d.reconnects}`;
+    tReconnects.className = "value " +
+      (d.reconnects < 10 ? "low" :
+       d.reconnects < 20 ? "normal" : "high");
+  }
+
+  const tTemp = document.getElementById(`temperature-${name}`);
+  if (d.temperature != null) {
+    tTemp.textContent = `${d.temperature} °C`;
+    tTemp.className = "value " +
+      (d.temperature < 40 ? "low" :
+       d.temperature < 60 ? "normal" : "high");
+  }
+
+  set(`cpu_load-${name}`, d.cpu_load, "%");
+  set(`cpu_freq-${name}`, d.cpu_freq, " MHz");
+  set(`memory-${name}`, d.free_memory && d.total_memory
+    ? `${d.free_memory} / ${d.total_memory} MiB` : "--");
+  set(`hdd-${name}`, d.free_hdd && d.total_hdd
+    ? `${d.free_hdd} / ${d.total_hdd} MiB` : "--");
+  set(`voltage-${name}`, d.voltage, " V");
+
+  const s = document.getElementById(`status-${name}`);
+  s.classList.toggle("online", d.status === "Yes");
+  s.classList.toggle("offline", d.status !== "Yes");
+}
+
 /* WebSocket status update with token auth and auto-reconnect */
 async function connectWS() {
   try {
@@ -138,54 +241,43 @@ async function connectWS() {
     if (!r.ok) throw new Error("Failed to get WS token");
     const { token } = await r.json();
 
-    const ws = new WebSocket(`ws://${location.host}/ws/status?token=${token}`);
+    const search = encodeURIComponent(searchInput.value.toLowerCase());
+    const ws = socket = new WebSocket(`ws://${location.host}/ws/status?token=${token}&search=${search}`);
 
     ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
-
-      routerNames.forEach(name => {
-        const d = data[name] || {};
-        const card = document.querySelector(`[data-name="${name.toLowerCase()}"]`);
-        if (card) {
-            if (d.webfig_host) card.dataset.webfigHost = d.webfig_host;
-            if (d.webfig_proto) card.dataset.webfigProto = d.webfig_proto;
-            if (d.webfig_port) card.dataset.webfigPort = d.webfig_port;
-            if (d.log) card.dataset.log = JSON.stringify(d.log);
-        }
-        set(`ipv4-${name}`, d.ipv4);
-        set(`board-${name}`, d.board);
-        set(`uptime-${name}`, d.uptime);
-        set(`version-${name}`, d.version);
-        set(`iface-${name}`, d.iface);
-        set(`speed-${name}`, d.speed);
-
-        const tReconnects = document.getElementById(`reconnects-${name}`);
-        if (d.reconnects != null) {
-          tReconnects.textContent = `${d.reconnects}`;
-          tReconnects.className = "value " +
-            (d.reconnects < 10 ? "low" :
-             d.reconnects < 20 ? "normal" : "high");
-        }
+      const msg = JSON.parse(event.data);
+
+      if (msg.type === "full") {
+        // only the subscribed routers: cards of the others are hidden
+        state = msg.routers || {};
+        seq = msg.seq;
+        syncCards(msg.registry);
+        Object.keys(state).forEach(render);
+        return;
+      }
 
-        const tTemp = document.getElementById(`temperature-${name}`);
-        if (d.temperature != null) {
-          tTemp.textContent = `${d.temperature} °C`;
-          tTemp.className = "value " +
-            (d.temperature < 40 ? "low" :
-             d.temperature < 60 ? "normal" : "high");
-        }
+      if (msg.type !== "delta" || seq === null || msg.seq <= seq) return;
 
-        set(`cpu_load-${name}`, d.cpu_load, "%");
-        set(`cpu_freq-${name}`, d.cpu_freq, " MHz");
-        set(`memory-${name}`, d.free_memory && d.total_memory
-          ? `${d.free_memory} / ${d.total_memory} MiB` : "--");
-        set(`hdd-${name}`, d.free_hdd && d.total_hdd
-          ? `${d.free_hdd} / ${d.total_hdd} MiB` : "--");
-        set(`voltage-${name}`, d.voltage, " V");
-
-        const s = document.getElementById(`status-${name}`);
-        s.classList.toggle("online", d.status === "Yes");
-        s.classList.toggle("offline", d.status !== "Yes");
+      if (msg.prev > seq) {
+        // missed a delta for our routers: ask for the full state again
+        seq = null;
+        ws.send(JSON.stringify({ type: "resync" }));
+        return;
+      }
+
+      seq = msg.seq;
+      syncCards(msg.registry);
+      Object.entries(msg.routers).forEach(([name, fields]) => {
+        if (fields === null) {
+          delete state[name];
+        } else {
+          const d = state[name] || (state[name] = {});
+          Object.entries(fields).forEach(([k, v]) => {
+            if (v === null) delete d[k];
+            else d[k] = v;
+          });
+        }
+        render(name);
       });
     };
 
@@ -194,6 +286,7 @@ async function connectWS() {
     };
 
     ws.onclose = () => {
+      seq = null;
       showServerAlert();
       console.log("WebSocket disconnected. Reconnecting in 3s...");
       setTimeout(connectWS, 3000);
@@ -249,6 +342,10 @@ function openTerminal(router) {
     window.open(`/router/${router}/terminal`, "_blank");
 }
 
+function openChart(router) {
+    window.open(`/router/${encodeURIComponent(router)}`, "_blank");
+}
+
 function openLog(router) {
     const card = document.querySelector(`[data-name="${router.toLowerCase()}"]`);
     if (!card) {
@@ -0,0 +1,153 @@
+import { showToast } from "./toast.js";
+
+const router = window.ROUTER_NAME;
+const info = document.getElementById("chart-info");
+const rangeButtons = document.querySelectorAll(".btn.range");
+
+const CHARTS = [
+  { canvas: "chart-cpu", lines: [{ metric: "cpu_load", color: "#4ec9b0" }] },
+  { canvas: "chart-temperature", lines: [{ metric: "temperature", color: "#ffa000" }] },
+  {
+    canvas: "chart-wan",
+    scale: 1e-6, // bps -> Mbps
+    lines: [
+      { metric: "rx_bps", color: "#aaaaff" },
+      { metric: "tx_bps", color: "#f44336" },
+    ],
+  },
+];
+
+let range = 86400;
+let lastData = null;
+
+/* --- Data --- */
+async function load() {
+  const end = Date.now() / 1000;
+  const start = end - range;
+  const canvas = document.getElementById(CHARTS[0].canvas);
+  // about one point per two pixels is all a line chart can show
+  const points = Math.max(100, Math.round(canvas.clientWidth / 2));
+  const metrics = CHARTS.flatMap(c => c.lines.map(l => l.metric)).join(",");
+
+  const url = `/api/history/${encodeURIComponent(router)}/downsample` +
+    `?start=${start}&end=${end}&points=${points}&metrics=${metrics}&mode=lttb`;
+
+  try {
+    const r = await fetch(url);
+    if (!r.ok) throw new Error(`HTTP ${r.status}`);
+    lastData = await r.json();
+  } catch (err) {
+    console.error("History load failed:", err);
+    showToast("Failed to load history", "error");
+    return;
+  }
+
+  info.textContent = `${lastData.samples} samples in range`;
+  drawAll();
+}
+
+/* --- Drawing --- */
+function drawAll() {
+  if (!lastData) return;
+  const end = lastData.end;
+  const start = lastData.start;
+  CHARTS.forEach(chart => draw(chart, lastData.series, start, end));
+}
+
+function draw(chart, series, start, end) {
+  const canvas = document.getElementById(chart.canvas);
+  const dpr = window.devicePixelRatio || 1;
+  const width = canvas.clientWidth;
+  const height = canvas.clientHeight;
+  canvas.width = width * dpr;
+  canvas.height = height * dpr;
+
+  const ctx = canvas.getContext("2d");
+  ctx.scale(dpr, dpr);
+  ctx.clearRect(0, 0, width, height);
+
+  const scale = chart.scale || 1;
+  const pad = { left: 48, right: 10, top: 10, bottom: 22 };
+  const plotW = width - pad.left - pad.right;
+  const plotH = height - pad.top - pad.bottom;
+
+  let max = 0;
+  let min = Infinity;
+  chart.lines.forEach(line => {
+    (series[line.metric]?.v || []).forEach(v => {
+      if (v == null) return;
+      max = Math.max(max, v * scale);
+      min = Math.min(min, v * scale);
+    });
+  });
+  if (min === Infinity) {
+    ctx.fillStyle = "#777";
+    ctx.font = "13px sans-serif";
+    ctx.fillText("No data", pad.left + plotW / 2 - 24, pad.top + plotH / 2);
+    return;
+  }
+  min = Math.min(0, min);
+  if (max === min) max = min + 1;
+
+  const x = t => pad.left + (t - start) / (end - start) * plotW;
+  const y = v => pad.top + plotH - (v - min) / (max - min) * plotH;
+
+  // grid + labels
+  ctx.strokeStyle = "#2a2a2d";
+  ctx.fillStyle = "#8a8a8a";
+  ctx.font = "11px sans-serif";
+  ctx.lineWidth = 1;
+  for (let i = 0; i <= 4; i++) {
+    const v = min + (max - min) * i / 4;
+    const py = y(v);
+    ctx.beginPath();
+    ctx.moveTo(pad.left, py);
+    ctx.lineTo(width - pad.right, py);
+    ctx.stroke();
+    ctx.fillText(v.toFixed(v < 10 ? 1 : 0), 4, py + 4);
+  }
+  for (let i = 0; i <= 4; i++) {
+    const t = start + (end - start) * i / 4;
+    const label = new Date(t * 1000).toLocaleString([], range > 86400
+      ? { month: "2-digit", day: "2-digit" }
+      : { hour: "2-digit", minute: "2-digit" });
+    ctx.fillText(label, Math.min(x(t) - 14, width - pad.right - 40), height - 6);
+  }
+
+  // lines; a gap of more than 5 % of the range breaks the line
+  const maxGap = (end - start) / 20;
+  chart.lines.forEach(line => {
+    const s = series[line.metric];
+    if (!s) return;
+    ctx.strokeStyle = line.color;
+    ctx.lineWidth = 1.5;
+    ctx.beginPath();
+    let prevT = null;
+    s.t.forEach((t, i) => {
+      const v = s.v[i];
+      if (v == null) return;
+      if (prevT === null || t - prevT > maxGap) ctx.moveTo(x(t), y(v * scale));
+      else ctx.lineTo(x(t), y(v * scale));
+      prevT = t;
+    });
+    ctx.stroke();
+  });
+}
+
+/* --- Controls --- */
+rangeButtons.forEach(btn => {
+  btn.addEventListener("click", () => {
+    rangeButtons.forEach(b => b.classList.toggle("active", b === btn));
+    range = Number(btn.dataset.range);
+    load();
+  });
+});
+
+let resizeTimer = null;
+window.addEventListener("resize", () => {
+  clearTimeout(resizeTimer);
+  resizeTimer = setTimeout(drawAll, 150);
+});
+
+load();
+setInterval(load, 60000);
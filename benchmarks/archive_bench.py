@@ -0,0 +1,106 @@
+# benchmarks/archive_bench.py
+# Bytes per sample and decode throughput of the metric archive (app/archive.py)
+#
+#   python benchmarks/archive_bench.py [routers] [days]
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import archive  # noqa: E402
+from app.history import METRICS  # noqa: E402
+
+INTERVAL = 5  # seconds between polls
+RAW_BYTES = 8 + 8  # int64 timestamp + float64 value
+
+
+def synthetic_day(rng: np.random.Generator, start: int):
+    """One router, one day of 5 s polls that look like the real status fields."""
+    n = 86400 // INTERVAL
+    # Mostly regular polls with some jitter and a few gaps
+    steps = INTERVAL + rng.choice([-1, 0, 1], size=n, p=[0.01, 0.98, 0.01])
+    steps[rng.random(n) < 0.001] += 60
+    ts = (start + np.cumsum(steps) - steps[0]).astype(np.int64)
+    ts = ts[ts < start + 86400]
+    n = len(ts)
+
+    load = np.clip(np.round(20 + np.cumsum(rng.normal(0, 2, n))), 0, 100)
+    columns = {
+        "cpu_load": load,
+        "temperature": np.round(45 + load / 10 + rng.normal(0, 0.3, n)),
+        "voltage": np.round(24 + rng.normal(0, 0.05, n), 1),
+        "free_memory": np.round(180 + np.cumsum(rng.normal(0, 0.01, n)), 2),
+        "free_hdd": np.full(n, 12.45),
+        "rx_bps": np.abs(np.round(rng.lognormal(13, 1, n), 2)),
+        "tx_bps": np.abs(np.round(rng.lognormal(11, 1, n), 2)),
+    }
+    return ts.tolist(), {m: columns[m] for m in METRICS}
+
+
+def main():
+    routers = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    rng = np.random.default_rng(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive.ARCHIVE_DIR = Path(tmp)
+        samples = 0
+        size = 0
+        per_metric = {m: 0 for m in METRICS}
+        ts_bytes = 0
+
+        t0 = time.perf_counter()
+        for r in range(routers):
+            for d in range(days):
+                start = 1_700_000_000 // 86400 * 86400 + d * 86400
+                ts, columns = synthetic_day(rng, start)
+                size += archive.write_segment(
+                    archive.segment_path(f"router-{r}", start), start, start + 86400, ts, columns
+                )
+                samples += len(ts)
+        encode_s = time.perf_counter() - t0
+
+        # Stream sizes per metric from the block index
+        for path in Path(tmp).rglob("*.seg"):
+            with archive.Segment(path) as seg:
+                for _, _, _, streams in seg.blocks:
+                    ts_bytes += streams[0][1]
+                    for m, (_, length) in zip(seg.metrics, streams[1:]):
+                        per_metric[m] += length
+
+        values = samples * len(METRICS)
+        print(f"routers={routers} days={days} samples/metric={samples} values={values}")
+        print(f"total {size / values:.2f} bytes/value (raw {RAW_BYTES}), "
+              f"ratio {RAW_BYTES * values / size:.1f}x, file size {size / 1e6:.2f} MB")
+        print(f"  timestamps {ts_bytes * 8 / samples:.2f} bits/sample (shared by all metrics)")
+        for m in METRICS:
+            print(f"  {m:12s} {per_metric[m] * 8 / samples:6.2f} bits/sample")
+        print(f"encode {values / encode_s / 1e6:.2f} M values/s")
+
+        # Full decode of every segment, all metrics
+        t0 = time.perf_counter()
+        decoded = 0
+        for path in Path(tmp).rglob("*.seg"):
+            with archive.Segment(path) as seg:
+                ts, vals = seg.read(0, float("inf"))
+                decoded += len(ts) * len(vals)
+        full_s = time.perf_counter() - t0
+        print(f"decode (all metrics) {decoded / full_s / 1e6:.2f} M values/s")
+
+        # One hour of one metric: only the overlapping blocks are decoded
+        start = 1_700_000_000 // 86400 * 86400 + 12 * 3600
+        t0 = time.perf_counter()
+        reps = 200
+        for i in range(reps):
+            ts, vals = archive.query(f"router-{i % routers}", start, start + 3600, ["cpu_load"])
+        range_s = (time.perf_counter() - t0) / reps
+        print(f"1 h range query, 1 metric: {range_s * 1000:.2f} ms ({len(ts)} samples)")
+
+
+if __name__ == "__main__":
+    main()
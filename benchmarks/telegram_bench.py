@@ -0,0 +1,101 @@
+# benchmarks/telegram_bench.py
+# Throughput of the Telegram delivery path (app/notifications.py) against a local stand-in Bot API
+#
+#   python benchmarks/telegram_bench.py [messages] [chats] [latency_ms]
+
+import asyncio
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+
+from aiohttp import ClientSession, web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StandIn:
+    """sendMessage that answers after `latency`; counts requests and TCP connections."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+        self.connections = set()
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        await request.post()
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": {}})
+
+    def reset(self):
+        self.requests = 0
+        self.connections = set()
+
+
+async def baseline(url: str, messages: int, chats: list) -> None:
+    """The old path: a new session per message and chat, chats one after another."""
+    for i in range(messages):
+        for chat_id in chats:
+            async with ClientSession() as session:
+                async with session.post(url, data={"chat_id": chat_id, "text": f"message {i}"}) as resp:
+                    await resp.read()
+
+
+async def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    chats = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+
+    port = free_port()
+    os.environ.update({
+        "TELEGRAM_API_BASE": f"http://127.0.0.1:{port}",
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "TELEGRAM_CHAT_ID": ",".join(str(c) for c in range(1, chats + 1)),
+        # Measure the delivery path itself, not the limits or the digest window
+        "TELEGRAM_CHAT_RATE": "1000000",
+        "TELEGRAM_GLOBAL_RATE": "1000000",
+        "TELEGRAM_COALESCE_WINDOW": "0",
+    })
+    from app import notifications  # noqa: E402  (reads the environment on import)
+
+    stand_in = StandIn(latency)
+    app = web.Application()
+    app.router.add_post("/botbench/sendMessage", stand_in.send_message)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    total = messages * chats
+    print(f"{messages} messages x {chats} chats, {latency * 1000:g} ms per request")
+
+    t0 = time.perf_counter()
+    await baseline(f"{notifications.API_BASE}/botbench/sendMessage", messages, notifications.CHAT_IDS)
+    elapsed = time.perf_counter() - t0
+    print(f"session per message, chats in turn: {total / elapsed:8.1f} msg/s, "
+          f"{len(stand_in.connections)} connections")
+
+    stand_in.reset()
+    notifications.start_telegram_worker()
+    t0 = time.perf_counter()
+    for i in range(messages):
+        await notifications.send_telegram(f"message {i}")
+    await notifications.stop_telegram_worker()
+    elapsed = time.perf_counter() - t0
+    print(f"shared session, chats in parallel:  {total / elapsed:8.1f} msg/s, "
+          f"{len(stand_in.connections)} connections")
+
+    assert stand_in.requests == total, stand_in.requests
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,33 @@
+# tests/conftest.py
+# Shared fixtures: the app package on sys.path, history and archive in a temp dir
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# app.crypto refuses to import without a key
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+
+from app import archive, history  # noqa: E402
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """history.db and the archive directory under tmp_path."""
+    monkeypatch.setattr(history, "HISTORY_DB_PATH", tmp_path / "history.db")
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path / "archive")
+    return tmp_path
+
+
+def write_history(samples):
+    """[(router, ts, {metric: value})] straight through the history writer."""
+    store = history.HistoryStore()
+    try:
+        store._write_sync([(r, int(ts), history.sample_from_status(s)) for r, ts, s in samples], False)
+    finally:
+        store._close()
+        store._pool.shutdown()
@@ -0,0 +1,104 @@
+# tests/test_alerts.py
+# Rule parsing and the vectorized fire / clear logic of app/alerts.py
+
+import numpy as np
+import pytest
+
+from app.alerts import AlertEngine, parse_rule
+from app.models import Router
+
+METRICS = ("cpu_load", "temperature")
+
+
+def rule(**kw):
+    base = {"id": 1, "name": "cpu", "metric": "cpu_load", "op": ">", "threshold": 90,
+            "clear_threshold": 70, "duration": 0, "router": None, "group_name": None, "enabled": 1}
+    base.update(kw)
+    return base
+
+
+def routers(*names, group=None):
+    return {n: Router(name=n, host="h", username="u", password="p", port=8728, enabled=1,
+                     group_name=group) for n in names}
+
+
+def engine(rules, fleet):
+    e = AlertEngine(METRICS)
+    e.set_rules(rules)
+    e.set_routers(fleet, 5)
+    return e
+
+
+def step(e, now, **cpu):
+    """One cycle where every router in `cpu` reported just now."""
+    ts = np.array([now if n in cpu else np.nan for n in e.names])
+    values = np.array([[cpu.get(n, np.nan), np.nan] for n in e.names])
+    return [(r["name"], kind, items) for r, kind, items in e.evaluate(ts, values, now)]
+
+
+def test_hysteresis_between_threshold_and_clear_threshold():
+    e = engine([rule()], routers("r1", "r2"))
+    assert step(e, 100, r1=95, r2=50) == [("cpu", "fire", [("r1", 95.0)])]
+    # Back under the threshold but above clear_threshold: still active, no event
+    assert step(e, 105, r1=80, r2=50) == []
+    assert e.active() == {"cpu": ["r1"]}
+    assert step(e, 110, r1=70, r2=50) == [("cpu", "clear", [("r1", 70.0)])]
+    assert e.active() == {}
+
+
+def test_duration_needs_a_continuous_breach():
+    e = engine([rule(duration=10)], routers("r1"))
+    assert step(e, 100, r1=95) == []
+    assert step(e, 105, r1=95) == []
+    # Dipping under the threshold restarts the clock
+    assert step(e, 108, r1=85) == []
+    assert step(e, 110, r1=95) == []
+    assert step(e, 119, r1=95) == []
+    assert step(e, 120, r1=96) == [("cpu", "fire", [("r1", 96.0)])]
+    assert e.fired == 1
+
+
+def test_below_rule_and_scope():
+    fleet = {**routers("a1", "a2", group="core"), **routers("b1")}
+    e = engine([rule(id=1, name="cold", metric="cpu_load", op="<", threshold=10, clear_threshold=20,
+                     group_name="core"),
+                rule(id=2, name="b1 only", threshold=50, clear_threshold=50, router="b1")], fleet)
+    events = step(e, 100, a1=5, a2=15, b1=5)
+    assert events == [("cold", "fire", [("a1", 5.0)])]
+    assert step(e, 105, a1=15, a2=15, b1=60) == [("b1 only", "fire", [("b1", 60.0)])]
+    assert step(e, 110, a1=20, a2=15, b1=50) == [("cold", "clear", [("a1", 20.0)]),
+                                                ("b1 only", "clear", [("b1", 50.0)])]
+
+
+def test_stale_or_missing_samples_keep_the_alert():
+    e = engine([rule()], routers("r1"))
+    step(e, 100, r1=95)
+    # No fresh sample (router DOWN): neither cleared nor fired again
+    assert step(e, 200) == []
+    # A sample older than STALE_INTERVALS poll intervals does not clear it either
+    assert e.evaluate(np.array([100.0]), np.array([[10.0, np.nan]]), now=200) == []
+    assert e.active() == {"cpu": ["r1"]}
+
+
+def test_state_survives_router_list_changes_and_rule_edits():
+    e = engine([rule()], routers("r1", "r2"))
+    step(e, 100, r1=95, r2=95)
+    e.set_routers(routers("r0", "r2"), 5)
+    assert e.active() == {"cpu": ["r2"]}
+    # Same rule again: stays active; changed definition: starts over
+    e.set_rules([rule()])
+    assert e.active() == {"cpu": ["r2"]}
+    e.set_rules([rule(threshold=99)])
+    assert e.active() == {}
+
+
+def test_parse_rule():
+    parsed = parse_rule({"name": " hot ", "metric": "temperature", "threshold": "70", "clear_threshold": ""})
+    assert parsed["name"] == "hot" and parsed["clear_threshold"] == 70.0 and parsed["op"] == ">"
+    for bad in ([], {"name": "x", "metric": "nope", "threshold": 1},
+                {"name": "x", "metric": "cpu_load", "threshold": 50, "clear_threshold": 60},
+                {"name": "x", "metric": "cpu_load", "op": "<", "threshold": 50, "clear_threshold": 40},
+                {"name": "x", "metric": "cpu_load", "threshold": "nan"},
+                {"name": "x", "metric": "cpu_load", "threshold": 1, "duration": -1}):
+        with pytest.raises(ValueError):
+            parse_rule(bad)
@@ -0,0 +1,103 @@
+# tests/test_broadcast.py
+# Per-client queues and sender tasks of app/broadcast.py
+
+import asyncio
+import json
+
+from app import broadcast
+from app.broadcast import Broadcaster, Subscription
+
+
+class FakeSocket:
+    """Records what was sent and how many sends overlapped; `stuck` never completes a send."""
+
+    def __init__(self, stuck: bool = False):
+        self.client = ("test", 1)
+        self.stuck = stuck
+        self.sent = []
+        self.active = 0
+        self.max_active = 0
+        self.closed = None
+
+    async def send_text(self, text: str) -> None:
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if self.stuck:
+                await asyncio.Event().wait()
+            await asyncio.sleep(0)
+            self.sent.append(json.loads(text))
+        finally:
+            self.active -= 1
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed = code
+
+
+def _snapshot(state):
+    return lambda: {"type": "full", "seq": state["seq"], "routers": dict(state["routers"])}
+
+
+def test_error_reply_goes_through_the_sender_task():
+    async def run():
+        state = {"seq": 0, "routers": {"r1": {"status": "Yes"}}}
+        b = Broadcaster(_snapshot(state))
+        ws = FakeSocket()
+        b.add(ws)
+        # Queued while the full state is still waiting to be sent
+        b.send_error(ws, "invalid subscription")
+        b.send_error(FakeSocket(), "unknown client is ignored")
+        await asyncio.sleep(0.01)
+        await b.close()
+        return ws
+
+    ws = asyncio.run(run())
+    assert [m["type"] for m in ws.sent] == ["full", "error"]
+    assert ws.sent[1]["message"] == "invalid subscription"
+    assert ws.max_active == 1
+
+
+
+def test_stuck_client_outside_the_delta_is_dropped(monkeypatch):
+    monkeypatch.setattr(broadcast, "BROADCAST_MAX_LAG", 0.05)
+
+    async def run():
+        state = {"seq": 0, "routers": {"r1": {}, "r2": {}}}
+        b = Broadcaster(_snapshot(state))
+        stuck, healthy = FakeSocket(stuck=True), FakeSocket()
+        b.add(stuck, Subscription(names=frozenset({"r2"})))
+        b.add(healthy, Subscription(names=frozenset({"r1"})))
+        await asyncio.sleep(0.01)
+
+        # Only r1 keeps changing: the stuck client's group is never touched
+        for seq in range(1, 8):
+            state["seq"] = seq
+            b.publish({"type": "delta", "seq": seq, "routers": {"r1": {"cpu_load": seq}}})
+            await asyncio.sleep(0.02)
+        stats = b.stats()
+        await b.close()
+        return b, stuck, healthy, stats
+
+    b, stuck, healthy, stats = asyncio.run(run())
+    assert stuck.closed == broadcast.LAG_CLOSE_CODE
+    assert stats["clients"] == 1 and stats["lagged_out"] == 1
+    assert [m["seq"] for m in healthy.sent] == list(range(0, 8))
+
+
+def test_stuck_client_is_dropped_without_deltas(monkeypatch):
+    monkeypatch.setattr(broadcast, "BROADCAST_MAX_LAG", 0.05)
+
+    async def run():
+        b = Broadcaster(_snapshot({"seq": 0, "routers": {}}))
+        stuck = FakeSocket(stuck=True)
+        b.add(stuck)
+        await asyncio.sleep(0.01)
+        b.check_lag()
+        await asyncio.sleep(0.1)
+        b.check_lag()
+        await asyncio.sleep(0)
+        return b, stuck
+
+    b, stuck = asyncio.run(run())
+    assert len(b) == 0
+    assert stuck.closed == broadcast.LAG_CLOSE_CODE
@@ -0,0 +1,125 @@
+# tests/test_downsample.py
+# LTTB, min/max buckets and the SQLite / archive split of app/downsample.py
+
+from fractions import Fraction
+
+import numpy as np
+
+from app import archive
+from app.downsample import downsample, load_samples, lttb, minmax_buckets
+from app.history import METRICS
+from conftest import write_history
+
+DAY = archive.SEGMENT_SECONDS
+
+
+def reference_lttb(t, y, n):
+    """LTTB as published (Steinarsson 2013), bucket edges in exact arithmetic."""
+    size = len(t)
+    if n >= size or n < 3:
+        return list(range(size))
+    every = Fraction(size - 2, n - 2)
+    out, a = [0], 0
+    for i in range(n - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        nxt_lo, nxt_hi = hi, min(int((i + 2) * every) + 1, size)
+        avg_t = sum(t[nxt_lo:nxt_hi]) / (nxt_hi - nxt_lo)
+        avg_y = sum(y[nxt_lo:nxt_hi]) / (nxt_hi - nxt_lo)
+        best = -1.0
+        for j in range(lo, hi):
+            area = abs((t[a] - avg_t) * (y[j] - y[a]) - (t[a] - t[j]) * (avg_y - y[a]))
+            if area > best:
+                best, choice = area, j
+        out.append(choice)
+        a = choice
+    return out + [size - 1]
+
+
+# =========================
+# LTTB
+# =========================
+
+def test_lttb_known_series():
+    t = np.arange(10.0)
+    y = np.array([0, 1, 0, 5, 0, 1, 0, -4, 0, 1.0])
+    st, sy = lttb(t, y, 5)
+    assert st.tolist() == [0, 2, 3, 7, 9]
+    assert sy.tolist() == [0, 0, 5, -4, 1]
+
+
+def test_lttb_matches_reference():
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        size = int(rng.integers(10, 3000))
+        n = int(rng.integers(3, size))
+        t = np.sort(rng.uniform(0, 1e6, size))
+        y = rng.normal(0, 1, size)
+        st, _ = lttb(t, y, n)
+        assert st.tolist() == t[reference_lttb(t.tolist(), y.tolist(), n)].tolist(), (size, n)
+
+
+def test_lttb_drops_nan_and_keeps_short_series():
+    t = np.arange(6.0)
+    y = np.array([1, np.nan, 3, 4, np.nan, 6.0])
+    st, sy = lttb(t, y, 10)
+    assert st.tolist() == [0, 2, 3, 5]
+    assert sy.tolist() == [1, 3, 4, 6]
+    st, _ = lttb(t, y, 3)
+    assert st[0] == 0 and st[-1] == 5 and len(st) == 3
+
+
+# =========================
+# Min / max buckets
+# =========================
+
+def test_minmax_buckets():
+    t = np.array([0, 1, 2, 5, 6, 9, 10.0])
+    y = np.array([1, 3, 2, 7, np.nan, 4, 6.0])
+    b = minmax_buckets(t, y, 0, 10, 5)
+    # Bucket 3 only had a NaN and is left out; ts == end falls in the last bucket
+    assert b["t"].tolist() == [0, 2, 4, 8]
+    assert b["min"].tolist() == [1, 2, 7, 4]
+    assert b["max"].tolist() == [3, 2, 7, 6]
+    assert b["avg"].tolist() == [2, 2, 7, 5]
+    assert b["count"].tolist() == [2, 1, 1, 2]
+
+
+def test_minmax_buckets_empty():
+    b = minmax_buckets(np.array([1.0]), np.array([np.nan]), 0, 10, 5)
+    assert all(len(v) == 0 for v in b.values())
+
+
+# =========================
+# SQLite / archive split
+# =========================
+
+def test_load_samples_joins_archive_and_sqlite(storage):
+    # Archive: 10th 00:00-01:00; SQLite raw rows: from 00:30 on (the overlap
+    # must come from SQLite only) into the 11th
+    old_ts = list(range(10 * DAY, 10 * DAY + 3600, 60))
+    columns = {m: np.full(len(old_ts), np.nan) for m in METRICS}
+    columns["cpu_load"] = np.arange(len(old_ts), dtype=np.float64)
+    archive.write_segment(archive.segment_path("r1", 10 * DAY), 10 * DAY, 11 * DAY, old_ts, columns)
+
+    recent_ts = list(range(10 * DAY + 1800, 11 * DAY + 600, 300))
+    write_history([("r1", ts, {"cpu_load": 100 + i, "temperature": 40}) for i, ts in enumerate(recent_ts)])
+
+    t, values = load_samples("r1", 10 * DAY, 11 * DAY, ["cpu_load", "temperature"])
+    expected_ts = old_ts[:30] + [ts for ts in recent_ts if ts <= 11 * DAY]
+    assert t.tolist() == expected_ts
+    assert values["cpu_load"].tolist() == list(range(30)) + [100 + i for i in range(len(expected_ts) - 30)]
+    assert np.isnan(values["temperature"][:30]).all() and (values["temperature"][30:] == 40).all()
+
+
+def test_load_samples_archive_only_and_nothing(storage):
+    ts = list(range(10 * DAY, 10 * DAY + 600, 60))
+    columns = {m: np.arange(len(ts), dtype=np.float64) for m in METRICS}
+    archive.write_segment(archive.segment_path("r1", 10 * DAY), 10 * DAY, 11 * DAY, ts, columns)
+
+    t, values = load_samples("r1", 10 * DAY, 11 * DAY, ["rx_bps"])
+    assert t.tolist() == ts and values["rx_bps"].tolist() == list(range(len(ts)))
+    assert load_samples("r2", 10 * DAY, 11 * DAY, ["rx_bps"])[0].size == 0
+
+    result = downsample("r1", 10 * DAY, 11 * DAY, 3, ["rx_bps"])
+    assert result["samples"] == len(ts)
+    assert result["series"]["rx_bps"]["t"][0] == ts[0] and len(result["series"]["rx_bps"]["t"]) == 3
@@ -0,0 +1,40 @@
+# tests/test_history.py
+# Raw samples and 1m / 1h rollups of app/history.py
+
+import sqlite3
+
+from app import history
+from conftest import write_history
+
+
+def _rows(sql, *args):
+    conn = sqlite3.connect(history.HISTORY_DB_PATH)
+    try:
+        return conn.execute(sql, args).fetchall()
+    finally:
+        conn.close()
+
+
+def test_rollups_fold_every_sample(storage):
+    write_history([("r1", 3600 + i * 10, {"cpu_load": i}) for i in range(12)])
+
+    assert _rows("SELECT COUNT(*) FROM samples_raw") == [(12,)]
+    assert _rows("SELECT ts, cpu_load_n, cpu_load_sum, cpu_load_min, cpu_load_max FROM samples_1m") == [
+        (3600, 6, 15.0, 0.0, 5.0), (3660, 6, 51.0, 6.0, 11.0)]
+    assert _rows("SELECT cpu_load_n, cpu_load_sum, temperature_n FROM samples_1h") == [(12, 66.0, 0)]
+
+
+def test_same_second_is_stored_and_folded_once(storage):
+    # Twice in one batch, and again in a later batch (e.g. a repeated flush)
+    write_history([("r1", 3600, {"cpu_load": 10}), ("r1", 3600, {"cpu_load": 90}),
+                   ("r2", 3600, {"cpu_load": 50})])
+    write_history([("r1", 3600, {"cpu_load": 70}), ("r1", 3601, {"cpu_load": 20})])
+
+    assert _rows("SELECT router, ts, cpu_load FROM samples_raw ORDER BY router, ts") == [
+        ("r1", 3600, 10.0), ("r1", 3601, 20.0), ("r2", 3600, 50.0)]
+    for table in ("samples_1m", "samples_1h"):
+        assert _rows(f"SELECT router, cpu_load_n, cpu_load_sum, cpu_load_max FROM {table} ORDER BY router") == [
+            ("r1", 2, 30.0, 20.0), ("r2", 1, 50.0, 50.0)]
+
+    series = history.query_series("r1", 0, 7200, "1m", ["cpu_load"])
+    assert series["avg"]["cpu_load"] == [15.0]
@@ -0,0 +1,89 @@
+# tests/test_mikrotik.py
+# Pure helpers of app/mikrotik.py: WAN rate, counters, query words
+
+import pytest
+
+from app import mikrotik
+from app.mikrotik import counter_delta, query_words, wan_rate
+
+
+@pytest.fixture(autouse=True)
+def clean_counters():
+    mikrotik.WAN_COUNTERS.clear()
+    yield
+    mikrotik.WAN_COUNTERS.clear()
+
+
+# =========================
+# WAN rate
+# =========================
+
+def test_wan_rate_between_polls():
+    assert wan_rate("r1", "ether1", 1000, 500, now=100.0) == (None, None)
+    assert wan_rate("r1", "ether1", 3500, 1500, now=105.0) == (4000, 1600)
+
+
+def test_wan_rate_fast_repoll_keeps_last_rate_and_baseline():
+    wan_rate("r1", "ether1", 1000, 500, now=100.0)
+    assert wan_rate("r1", "ether1", 3500, 1500, now=105.0) == (4000, 1600)
+    # Too close to measure: the last rate again, baseline stays at 105 s
+    assert wan_rate("r1", "ether1", 3600, 1600, now=105.2) == (4000, 1600)
+    assert wan_rate("r1", "ether1", 6000, 2500, now=110.0) == (4000, 1600)
+    # Before any rate exists there is nothing to repeat
+    wan_rate("r2", "ether1", 0, 0, now=100.0)
+    assert wan_rate("r2", "ether1", 10, 10, now=100.1) == (None, None)
+
+
+def test_wan_rate_interface_change_and_reset_start_over():
+    wan_rate("r1", "ether1", 1000, 1000, now=100.0)
+    assert wan_rate("r1", "ether2", 5000, 5000, now=105.0) == (None, None)
+    assert wan_rate("r1", "ether2", 10000, 10000, now=110.0) == (8000, 8000)
+    # Counter reset (reboot): no rate, and a fast re-poll does not bring the old one back
+    assert wan_rate("r1", "ether2", 100, 100, now=115.0) == (None, None)
+    assert wan_rate("r1", "ether2", 200, 200, now=115.1) == (None, None)
+
+
+# =========================
+# Interface counters
+# =========================
+
+@pytest.mark.parametrize("prev, curr, expected", [
+    (1000, 1000, 0),
+    (1000, 5000, 4000),
+    # 64-bit counters past 2^32 simply grow
+    (2 ** 40, 2 ** 40 + 7, 7),
+    # 32-bit counter wrapped: it was in its upper half and came back round
+    (2 ** 32 - 100, 50, 150),
+    (2 ** 31, 0, 2 ** 31),
+    # Went backwards from the lower half: reset, not a wrap
+    (2 ** 31 - 1, 10, None),
+    (5000, 100, None),
+    # A 64-bit counter above 2^32 cannot wrap at 32 bits
+    (2 ** 33, 100, None),
+])
+def test_counter_delta(prev, curr, expected):
+    assert counter_delta(prev, curr) == expected
+
+
+def test_wan_rate_across_32_bit_wrap():
+    wan_rate("r1", "ether1", 2 ** 32 - 1000, 10, now=100.0)
+    assert wan_rate("r1", "ether1", 4000, 10, now=105.0) == (8000, 0)
+
+
+# =========================
+# Query words
+# =========================
+
+def test_query_words_filter_and_proplist():
+    assert query_words({"name": "ether1"}) == ("?name=ether1",)
+    assert query_words(props=("name", "rx-byte")) == ("=.proplist=name,rx-byte",)
+    assert query_words({"name": "ether1"}, ("name", "rx-byte")) == ("?name=ether1", "=.proplist=name,rx-byte")
+    assert query_words() == ()
+
+
+def test_query_words_or_alternatives_and_values():
+    # n alternatives need n - 1 "?#|" to be OR-ed; other keys stay AND-ed
+    assert query_words({"name": ("www", "www-ssl", "api"), "disabled": False, "mtu": 1500}) == (
+        "?name=www", "?name=www-ssl", "?name=api", "?#|", "?#|", "?disabled=no", "?mtu=1500")
+    assert query_words({"name": ("www",)}) == ("?name=www",)
+    assert query_words({"dst-address": "0.0.0.0/0", "active": True}) == ("?dst-address=0.0.0.0/0", "?active=yes")
@@ -0,0 +1,158 @@
+# tests/test_notifications.py
+# Event coalescing and delivery of the Telegram worker in app/notifications.py
+
+import asyncio
+import socket
+
+import pytest
+from aiohttp import web
+
+from app import notifications
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """Worker state for one event loop, two chats."""
+    monkeypatch.setattr(notifications, "TELEGRAM_ENABLED", True)
+    monkeypatch.setattr(notifications, "CHAT_IDS", ["1", "2"])
+    monkeypatch.setattr(notifications, "COALESCE_WINDOW", 0.1)
+    monkeypatch.setattr(notifications, "STATS", dict.fromkeys(notifications.STATS, 0))
+    monkeypatch.setattr(notifications, "_message_queue", asyncio.Queue())
+    monkeypatch.setattr(notifications, "_worker_shutdown", asyncio.Event())
+    monkeypatch.setattr(notifications, "_worker_task", None)
+    monkeypatch.setattr(notifications, "_chats", {})
+    monkeypatch.setattr(notifications, "_session", None)
+
+
+@pytest.fixture
+def telegram(worker, monkeypatch):
+    """Sends are recorded, not made."""
+    sent = []
+
+    async def record(chat_id, text, bucket=None):
+        sent.append((chat_id, text))
+
+    monkeypatch.setattr(notifications, "_send_with_retry", record)
+    return sent
+
+
+def _run(events, pause=0.3):
+    """Sends `events` as one burst, waits out the window and stops the worker."""
+    async def run():
+        notifications.start_telegram_worker()
+        for kind, name in events:
+            await notifications.send_event(kind, name)
+        await asyncio.sleep(pause)
+        await notifications.stop_telegram_worker()
+
+    asyncio.run(run())
+
+
+# =========================
+# Coalescing
+# =========================
+
+def test_burst_becomes_one_digest_per_chat(telegram):
+    _run([("down", f"r{i}") for i in range(5)] + [("up", "r1"), ("up", "r9")])
+
+    # r1 DOWN then UP cancels out; r9 UP alone is a plain message
+    digest = notifications.fmt_digest("down", [("r0", None), ("r2", None), ("r3", None), ("r4", None)])
+    assert sorted(telegram) == sorted(
+        (chat, text) for chat in ("1", "2") for text in (digest, notifications.fmt_up("r9")))
+    assert "4 routers DOWN" in digest
+    assert notifications.STATS["digests"] == 1 and notifications.STATS["cancelled"] == 1
+    assert notifications.STATS["events"] == 7
+
+
+def test_down_cancelled_by_up_is_not_sent(telegram):
+    _run([("down", "r1"), ("up", "r1")])
+    assert telegram == []
+    assert notifications.STATS["cancelled"] == 1
+
+
+def test_events_in_separate_windows_are_not_merged(telegram):
+    async def run():
+        notifications.start_telegram_worker()
+        await notifications.send_event("down", "r1")
+        await asyncio.sleep(0.3)
+        await notifications.send_event("up", "r1")
+        await asyncio.sleep(0.3)
+        await notifications.stop_telegram_worker()
+
+    asyncio.run(run())
+    assert [text for chat, text in telegram if chat == "1"] == [
+        notifications.fmt_down("r1"), notifications.fmt_up("r1")]
+    assert notifications.STATS["cancelled"] == 0
+
+
+def test_coalesce_keeps_ready_texts_and_latest_detail(telegram):
+    texts = notifications._coalesce([(None, None, "hello"), ("reconnects", "r1", 3),
+                                     ("reconnects", "r1", 5), ("reconnects", "r2", 4)])
+    assert texts == ["hello", notifications.fmt_reconnect_alert("r1", 5),
+                     notifications.fmt_reconnect_alert("r2", 4)]
+
+
+# =========================
+# Delivery
+# =========================
+
+class StandIn:
+    """sendMessage that answers after `latency`; records overlap and TCP connections."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.chats = []
+        self.connections = set()
+        self.active = 0
+        self.max_active = 0
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        self.chats.append(form["chat_id"])
+        self.connections.add(request.transport.get_extra_info("peername"))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.active -= 1
+        return web.json_response({"ok": True, "result": {}})
+
+
+def test_chats_are_sent_concurrently_over_one_session(worker, monkeypatch):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    chats = ["1", "2", "3"]
+    monkeypatch.setattr(notifications, "API_BASE", f"http://127.0.0.1:{port}")
+    monkeypatch.setattr(notifications, "BOT_TOKEN", "test")
+    monkeypatch.setattr(notifications, "CHAT_IDS", chats)
+    monkeypatch.setattr(notifications, "CHAT_RATE", 1000)
+    monkeypatch.setattr(notifications, "_global_bucket", notifications.TokenBucket(1000, 1000))
+    stand_in = StandIn(latency=0.2)
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/bottest/sendMessage", stand_in.send_message)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        try:
+            notifications.start_telegram_worker()
+            session = notifications._session
+            for name in ("r1", "r2"):
+                await notifications.send_event("down", name)
+            await asyncio.sleep(0.15)
+            await notifications.stop_telegram_worker()
+            return session
+        finally:
+            await runner.cleanup()
+
+    session = asyncio.run(run())
+    assert sorted(stand_in.chats) == sorted(chats * 2)
+    assert notifications.STATS["sent"] == 6
+    # Chats side by side, not one after another
+    assert stand_in.max_active == len(chats)
+    # One kept-alive connection per chat, reused for the second message
+    assert len(stand_in.connections) == len(chats)
+    assert session.closed and notifications._session is None
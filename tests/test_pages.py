@@ -0,0 +1,82 @@
+# tests/test_pages.py
+# Access rules of the router export in app/pages.py
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from app import auth, pages
+from app.auth import PASSWORDS
+
+
+class FakeDB:
+    """DB.run without the worker thread."""
+
+    @staticmethod
+    async def run(fn, *args):
+        return fn(*args)
+
+
+@pytest.fixture
+def export(monkeypatch):
+    """(GET endpoint, POST endpoint, exported (format, passwords) calls) with one admin, "admin" / "secret"."""
+    calls = []
+    password_hash = asyncio.run(PASSWORDS.hash("secret"))
+
+    async def rows():
+        yield "name\n"
+
+    def fake_export(fmt, passwords=False):
+        calls.append((fmt, passwords))
+        return rows()
+
+    monkeypatch.setattr(pages, "DB", FakeDB)
+    monkeypatch.setattr(pages, "get_user", lambda name: {"username": name, "password_hash": password_hash,
+                                                          "role": "admin"} if name == "admin" else None)
+    monkeypatch.setattr(pages, "export_routers", fake_export)
+    monkeypatch.setattr(pages, "LOGIN_THROTTLE", auth.LoginThrottle())
+
+    app = FastAPI()
+    pages.register_pages(app, templates=None)
+    endpoints = {(r.path, m): r.endpoint for r in app.routes for m in getattr(r, "methods", ())}
+    return endpoints[("/admin/routers/export", "GET")], endpoints[("/admin/routers/export", "POST")], calls
+
+
+def _request(user="admin", role="admin"):
+    session = {"user": user, "role": role} if user else {}
+    return Request({"type": "http", "method": "POST", "headers": [], "session": session,
+                    "client": ("10.0.0.9", 50000)})
+
+
+def test_get_export_never_has_passwords(export):
+    get, _, calls = export
+    response = asyncio.run(get(_request(), format="json"))
+    assert isinstance(response, StreamingResponse)
+    assert asyncio.run(get(_request(role="viewer"), format="csv")).status_code == 401
+    assert asyncio.run(get(_request(), format="xml")).status_code == 400
+    assert calls == [("json", False)]
+
+
+def test_password_export_needs_the_admin_password(export):
+    _, post, calls = export
+    assert asyncio.run(post(_request(user=None), format="csv", admin_password="secret")).status_code == 401
+    assert asyncio.run(post(_request(), format="csv", admin_password="")).status_code == 403
+    assert asyncio.run(post(_request(), format="csv", admin_password="wrong")).status_code == 403
+    assert calls == []
+
+    response = asyncio.run(post(_request(), format="csv", admin_password="secret"))
+    assert isinstance(response, StreamingResponse)
+    assert calls == [("csv", True)]
+
+
+def test_wrong_passwords_are_throttled(export, monkeypatch):
+    _, post, calls = export
+    monkeypatch.setattr(auth, "LOGIN_MAX_FAILURES_USER", 2)
+    for _ in range(2):
+        assert asyncio.run(post(_request(), format="csv", admin_password="wrong")).status_code == 403
+    # Locked out, even with the right password
+    assert asyncio.run(post(_request(), format="csv", admin_password="secret")).status_code == 429
+    assert calls == []
@@ -0,0 +1,134 @@
+# tests/test_router_manager.py
+# Registry snapshots of app/router_manager.py
+
+import asyncio
+
+import pytest
+
+from app import mikrotik, router_manager
+from app.crypto import encrypt_password
+from app.router_manager import RouterManager
+
+
+class FakeDB:
+    """DB.run without the worker thread."""
+
+    @staticmethod
+    async def run(fn, *args):
+        return fn(*args)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    """name -> stored row, read like the routers table (ORDER BY name)."""
+    rows = {}
+    monkeypatch.setattr(router_manager, "DB", FakeDB)
+    monkeypatch.setattr(router_manager, "get_routers", lambda: [rows[n] for n in sorted(rows)])
+    monkeypatch.setattr(router_manager, "get_router_row", lambda name: rows.get(name))
+    return rows
+
+
+def _row(name, host="10.0.0.1"):
+    return {"name": name, "host": host, "username": "admin", "password": encrypt_password("secret"),
+            "port": 8728, "enabled": 1, "poll_interval": None, "group_name": None}
+
+
+def test_snapshot_is_ordered_by_name(table):
+    async def run():
+        manager = RouterManager()
+        for name in ("charlie", "echo", "alpha"):
+            table[name] = _row(name)
+        await manager.load()
+        orders = [list(manager.routers)]
+
+        # Added one at a time: sorted in, not appended
+        table["bravo"] = _row("bravo")
+        await manager.refresh("bravo")
+        orders.append(list(manager.routers))
+
+        # Full reload with an add, an edit and a removal
+        table["delta"] = _row("delta")
+        table["alpha"] = _row("alpha", host="10.0.0.2")
+        del table["echo"]
+        await manager.load()
+        orders.append(list(manager.routers))
+        return manager, orders
+
+    manager, orders = asyncio.run(run())
+    assert orders == [["alpha", "charlie", "echo"],
+                      ["alpha", "bravo", "charlie", "echo"],
+                      ["alpha", "bravo", "charlie", "delta"]]
+    assert manager.routers["alpha"].host == "10.0.0.2"
+    assert manager.routers["alpha"].password == "secret"
+    assert manager.version == 3
+
+
+def test_unchanged_load_keeps_the_snapshot(table):
+    async def run():
+        manager = RouterManager()
+        table["r1"] = _row("r1")
+        await manager.load()
+        before = manager.snapshot()
+        await manager.load()
+        await manager.refresh("r1")
+        return before, manager.snapshot()
+
+    before, after = asyncio.run(run())
+    assert after is before
+
+
+# =========================
+# Connection pool
+# =========================
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_only_lost_connections_count_as_reconnects(table, monkeypatch):
+    async def connect(api):
+        api.api = FakeConnection()
+
+    monkeypatch.setattr(router_manager.RouterAPI, "connect", connect)
+    monkeypatch.setattr(router_manager, "POOL_IDLE_TIMEOUT", 0)
+    monkeypatch.setattr(mikrotik, "ROUTER_RECONNECTS", {})
+
+    async def run():
+        manager = RouterManager()
+        table["r1"] = _row("r1")
+        await manager.load()
+        counts = []
+
+        # First connect, then a second pooled connection next to the poller's
+        async with manager.lease("r1") as poller:
+            await poller.ensure_connected()
+            async with manager.lease("r1") as viewer:
+                await viewer.ensure_connected()
+        counts.append(poller.reconnects)
+
+        # Idle connections closed by the pool and opened again
+        manager.evict_idle()
+        async with manager.lease("r1") as api:
+            await api.ensure_connected()
+        counts.append(api.reconnects)
+
+        # Dropped by the router: on checkout, and while leased
+        api.api.closed = True
+        async with manager.lease("r1") as api:
+            await api.ensure_connected()
+            api.api.closed = True
+            await api.ensure_connected()
+        counts.append(api.reconnects)
+
+        # Failed while in use
+        async with manager.lease("r1") as api:
+            await api.ensure_connected()
+            api.close()
+        counts.append(api.reconnects)
+        return counts
+
+    assert asyncio.run(run()) == [0, 0, 2, 3]
@@ -0,0 +1,282 @@
+# tests/test_routeros.py
+# Word encoding, reply routing and login of the native client in app/routeros.py
+
+import asyncio
+import hashlib
+
+import pytest
+from librouteros.exceptions import ConnectionClosed, FatalError, MultiTrapError, ProtocolError, TrapError
+
+from app.routeros import (
+    RouterOSClient, encode_length, encode_sentence, encode_word, parse_sentence, read_length,
+    read_sentence,
+)
+
+
+def _read(coro_fn, data: bytes):
+    """Runs coro_fn(reader) over `data` (then EOF); returns its result and the unread rest."""
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await coro_fn(reader), await reader.read()
+
+    return asyncio.run(run())
+
+
+# =========================
+# Length prefix
+# =========================
+
+@pytest.mark.parametrize("length, size", [
+    (0, 1), (0x7F, 1),
+    (0x80, 2), (0x3FFF, 2),
+    (0x4000, 3), (0x1FFFFF, 3),
+    (0x200000, 4), (0xFFFFFFF, 4),
+    (0x10000000, 5), (0xFFFFFFFF, 5),
+])
+def test_length_round_trip_at_width_boundaries(length, size):
+    prefix = encode_length(length)
+    assert len(prefix) == size
+    # Trailing bytes belong to the word and must be left unread
+    assert _read(read_length, prefix + b"\x01\x02") == (length, b"\x01\x02")
+
+
+def test_length_prefix_bytes():
+    assert encode_length(0x7F) == b"\x7f"
+    assert encode_length(0x80) == b"\x80\x80"
+    assert encode_length(0x3FFF) == b"\xbf\xff"
+    assert encode_length(0x4000) == b"\xc0\x40\x00"
+    assert encode_length(0x1FFFFF) == b"\xdf\xff\xff"
+    assert encode_length(0x200000) == b"\xe0\x20\x00\x00"
+    assert encode_length(0xFFFFFFF) == b"\xef\xff\xff\xff"
+    assert encode_length(0x10000000) == b"\xf0\x10\x00\x00\x00"
+
+
+def test_unknown_control_byte():
+    with pytest.raises(ProtocolError):
+        _read(read_length, b"\xf8\x00\x00\x00\x00")
+
+
+def test_sentence_round_trip():
+    words = ["/interface/print", "?name=ether1", "=comment=" + "é" * 100, "x" * 0x4000]
+    assert _read(read_sentence, encode_sentence(*words) + encode_sentence("!done")) == (
+        words, encode_sentence("!done"))
+    # Length counts bytes, not characters
+    assert encode_word("é" * 64)[:2] == encode_length(128)
+
+
+def test_parse_sentence_casts_like_librouteros():
+    words = ["!re", ".tag=7", "=name=ether1", "=mtu=1500", "=disabled=false", "=running=yes",
+             "=comment=a=b", "=empty="]
+    assert parse_sentence(words) == ("!re", "7", {
+        "name": "ether1", "mtu": 1500, "disabled": False, "running": True, "comment": "a=b", "empty": ""})
+    assert parse_sentence([]) == ("", None, {})
+
+
+# =========================
+# Client over an in-memory stream
+# =========================
+
+class FakeWriter:
+    """Hands what the client writes to the fake router."""
+
+    def __init__(self, to_router: asyncio.StreamReader):
+        self.to_router = to_router
+        self.closed = False
+
+    def write(self, data: bytes) -> None:
+        self.to_router.feed_data(data)
+
+    async def drain(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeRouter:
+    """
+    Reads the client's sentences and answers through `handler(words) -> [sentence words]`.
+    Answers can also be pushed at any time with send().
+    """
+
+    def __init__(self, handler=None):
+        self.handler = handler
+        self.to_client = asyncio.StreamReader()
+        self.to_router = asyncio.StreamReader()
+        self.received = []
+        self._task = asyncio.create_task(self._serve())
+
+    async def _serve(self):
+        while True:
+            words = await read_sentence(self.to_router)
+            self.received.append(words)
+            tag = next(w[5:] for w in words if w.startswith(".tag="))
+            for reply in (self.handler(words) if self.handler else []):
+                self.send(*[w.format(tag=tag) for w in reply])
+
+    def send(self, *words):
+        self.to_client.feed_data(encode_sentence(*words))
+
+    def client(self, timeout: float = 1) -> RouterOSClient:
+        client = RouterOSClient("test", timeout=timeout)
+        client._reader = self.to_client
+        client._writer = FakeWriter(self.to_router)
+        client._closed = False
+        client._reader_task = asyncio.create_task(client._read_loop())
+        return client
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+def test_replies_are_routed_by_tag():
+    async def run():
+        router = FakeRouter()
+        client = router.client()
+        first = asyncio.create_task(client.call("/interface/print"))
+        second = asyncio.create_task(client.call("/ip/address/print"))
+        await asyncio.sleep(0.01)
+        tags = [w[5:] for words in router.received for w in words if w.startswith(".tag=")]
+
+        # Interleaved, second request first; untagged and unknown tags are ignored
+        router.send("!re", f".tag={tags[1]}", "=address=10.0.0.1/24")
+        router.send("!re", f".tag={tags[0]}", "=name=ether1")
+        router.send("!re", "=name=stray")
+        router.send("!re", ".tag=999", "=name=stray")
+        router.send("!empty", f".tag={tags[1]}")
+        router.send("!done", f".tag={tags[1]}")
+        router.send("!re", f".tag={tags[0]}", "=name=ether2")
+        router.send("!done", f".tag={tags[0]}", "=ret=*1")
+        result = await asyncio.gather(first, second)
+        await router.stop()
+        client.close()
+        return tags, result
+
+    tags, (first, second) = asyncio.run(run())
+    assert len(set(tags)) == 2
+    assert first == [{"name": "ether1"}, {"name": "ether2"}, {"ret": "*1"}]
+    assert second == [{"address": "10.0.0.1/24"}]
+
+
+def test_trap_fails_only_its_request():
+    def handler(words):
+        if words[0] == "/bad":
+            return [["!trap", ".tag={tag}", "=category=0", "=message=no such command"], ["!done", ".tag={tag}"]]
+        if words[0] == "/worse":
+            return [["!trap", ".tag={tag}", "=message=one"], ["!trap", ".tag={tag}", "=message=two"],
+                    ["!done", ".tag={tag}"]]
+        return [["!re", ".tag={tag}", "=ok=yes"], ["!done", ".tag={tag}"]]
+
+    async def run():
+        router = FakeRouter(handler)
+        client = router.client()
+        results = await asyncio.gather(client.call("/bad"), client.call("/worse"), client.call("/good"),
+                                       return_exceptions=True)
+        after = await client.call("/good")
+        await router.stop()
+        client.close()
+        return results, after
+
+    (bad, worse, good), after = asyncio.run(run())
+    assert isinstance(bad, TrapError) and bad.message == "no such command" and bad.category == 0
+    assert isinstance(worse, MultiTrapError) and str(worse) == "one, two"
+    assert good == after == [{"ok": True}]
+
+
+def test_fatal_fails_pending_requests_and_closes():
+    async def run():
+        router = FakeRouter()
+        client = router.client()
+        pending = asyncio.create_task(client.call("/interface/print"))
+        await asyncio.sleep(0.01)
+        router.send("!fatal", "session terminated on request")
+        error = await asyncio.gather(pending, return_exceptions=True)
+        await router.stop()
+        return client, error[0]
+
+    client, error = asyncio.run(run())
+    assert isinstance(error, FatalError) and str(error) == "session terminated on request"
+    assert client.closed
+    with pytest.raises(ConnectionClosed):
+        asyncio.run(client.call("/interface/print"))
+
+
+def test_lost_connection_and_timeout_close_the_client():
+    async def run():
+        router = FakeRouter()
+        lost = router.client()
+        pending = asyncio.create_task(lost.call("/interface/print"))
+        await asyncio.sleep(0.01)
+        router.to_client.feed_eof()
+        error = (await asyncio.gather(pending, return_exceptions=True))[0]
+
+        quiet = FakeRouter()
+        silent = quiet.client(timeout=0.05)
+        try:
+            await silent.call("/interface/print")
+        except asyncio.TimeoutError:
+            timed_out = True
+        await router.stop()
+        await quiet.stop()
+        return lost, error, silent, timed_out
+
+    lost, error, silent, timed_out = asyncio.run(run())
+    assert isinstance(error, ConnectionClosed) and lost.closed
+    assert timed_out and silent.closed
+
+
+# =========================
+# Login
+# =========================
+
+def test_plain_login():
+    async def run():
+        router = FakeRouter(lambda words: [["!done", ".tag={tag}"]])
+        client = router.client()
+        await client.login("admin", "secret")
+        await router.stop()
+        client.close()
+        return router.received
+
+    (login,) = asyncio.run(run())
+    assert login[:3] == ["/login", "=name=admin", "=password=secret"]
+
+
+def test_md5_challenge_login():
+    token = "ebddd18303a54111e2dea05a92ab46b4"
+
+    def handler(words):
+        if "=password=secret" in words:
+            return [["!done", ".tag={tag}", f"=ret={token}"]]
+        return [["!done", ".tag={tag}"]]
+
+    async def run():
+        router = FakeRouter(handler)
+        client = router.client()
+        await client.login("admin", "secret")
+        await router.stop()
+        client.close()
+        return router.received
+
+    plain, challenge = asyncio.run(run())
+    response = "00" + hashlib.md5(b"\x00secret" + bytes.fromhex(token)).hexdigest()
+    assert plain[:3] == ["/login", "=name=admin", "=password=secret"]
+    assert challenge[:3] == ["/login", "=name=admin", f"=response={response}"]
+
+
+def test_failed_login_is_a_trap():
+    async def run():
+        router = FakeRouter(lambda words: [["!trap", ".tag={tag}", "=message=invalid user name or password (6)"],
+                                           ["!done", ".tag={tag}"]])
+        client = router.client()
+        try:
+            await client.login("admin", "wrong")
+        finally:
+            await router.stop()
+            client.close()
+
+    with pytest.raises(TrapError):
+        asyncio.run(run())